@@ -0,0 +1,307 @@
+"""
+Custo dos Adiantamentos (juros Vinci) - taxa efetiva de cada antecipação
+No adiantamento a nota é recebida antes (valor_liquido_vinci na data_adiantamento) em
+troca do desconto valor_retido_vinci sobre o que seria recebido no vencimento. A taxa do
+período é retido / líquido; as taxas mensal e anual são a sua equivalente em juros
+compostos pelos dias entre adiantamento e vencimento (mês de 30 e ano de 365 dias).
+
+As taxas são calculadas no adiantamento e gravadas na nota (dias_antecipacao,
+taxa_efetiva_mensal, taxa_efetiva_anual); resumo_adiantamentos (mês do adiantamento x
+tomador) é mantido por triggers, como os resumos de recebíveis.
+"""
+import sqlite3
+from datetime import datetime, timedelta
+
+from armazenamento import criar_gatilho
+from resumos import VALOR_ESPERADO
+
+# Janela de histórico usada para estimar a taxa de cada tomador no otimizador
+MESES_HISTORICO_TAXA = 12
+
+LIMITE_SUGESTOES = 20
+
+
+def _data(texto):
+    return datetime.strptime(str(texto)[:10], '%Y-%m-%d').date()
+
+
+def calcular_custo(valor_liquido, valor_retido, data_adiantamento, data_vencimento):
+    """Dias antecipados e taxas efetivas (% ao mês e % ao ano) de um adiantamento
+
+    Returns:
+        (dias, taxa_mensal, taxa_anual); taxas None sem dados suficientes ou com
+        adiantamento no dia do vencimento (ou depois)
+    """
+    if not valor_liquido or valor_liquido <= 0 or valor_retido is None:
+        return None, None, None
+    if not data_adiantamento or not data_vencimento:
+        return None, None, None
+
+    try:
+        dias = (_data(data_vencimento) - _data(data_adiantamento)).days
+    except ValueError:
+        return None, None, None
+    if dias <= 0:
+        return dias, None, None
+
+    fator_periodo = 1 + valor_retido / valor_liquido
+    if fator_periodo <= 0:
+        return dias, None, None
+    try:
+        taxa_mensal = (fator_periodo ** (30 / dias) - 1) * 100
+        taxa_anual = (fator_periodo ** (365 / dias) - 1) * 100
+    except OverflowError:
+        return dias, None, None
+    return dias, round(taxa_mensal, 4), round(taxa_anual, 4)
+
+
+def _sql_somar(p, sinal):
+    """Contribuição da nota (NEW/OLD) para a linha mês x tomador, se ela estiver adiantada"""
+    com_taxa = f'CASE WHEN {p}.taxa_efetiva_anual IS NOT NULL THEN COALESCE({p}.valor_liquido_vinci, 0) ELSE 0 END'
+    return f'''
+        INSERT INTO resumo_adiantamentos (mes, tomador, qtd, valor_liquido, valor_retido,
+                                          liquido_com_taxa, liquido_x_dias, liquido_x_taxa_anual)
+        SELECT
+            COALESCE(substr({p}.data_adiantamento, 1, 7), ''), COALESCE({p}.tomador, ''), {sinal}1,
+            {sinal}COALESCE({p}.valor_liquido_vinci, 0), {sinal}COALESCE({p}.valor_retido_vinci, 0),
+            {sinal}({com_taxa}),
+            {sinal}({com_taxa}) * COALESCE({p}.dias_antecipacao, 0),
+            {sinal}({com_taxa}) * COALESCE({p}.taxa_efetiva_anual, 0)
+        WHERE {p}.foi_adiantado = 1
+        ON CONFLICT (mes, tomador) DO UPDATE SET
+            qtd = resumo_adiantamentos.qtd + excluded.qtd,
+            valor_liquido = resumo_adiantamentos.valor_liquido + excluded.valor_liquido,
+            valor_retido = resumo_adiantamentos.valor_retido + excluded.valor_retido,
+            liquido_com_taxa = resumo_adiantamentos.liquido_com_taxa + excluded.liquido_com_taxa,
+            liquido_x_dias = resumo_adiantamentos.liquido_x_dias + excluded.liquido_x_dias,
+            liquido_x_taxa_anual = resumo_adiantamentos.liquido_x_taxa_anual + excluded.liquido_x_taxa_anual;
+    '''
+
+
+def _sql_limpar(p):
+    return f'''
+        DELETE FROM resumo_adiantamentos
+        WHERE mes = COALESCE(substr({p}.data_adiantamento, 1, 7), '') AND tomador = COALESCE({p}.tomador, '')
+        AND qtd <= 0;
+    '''
+
+
+def criar_estrutura(cursor):
+    """Resumo mês x tomador, triggers de manutenção e cálculo das taxas das notas já adiantadas
+
+    Requer as colunas dias_antecipacao, taxa_efetiva_mensal e taxa_efetiva_anual em notas_fiscais.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS resumo_adiantamentos (
+            mes TEXT NOT NULL,
+            tomador TEXT NOT NULL,
+            qtd INTEGER NOT NULL DEFAULT 0,
+            valor_liquido REAL NOT NULL DEFAULT 0,
+            valor_retido REAL NOT NULL DEFAULT 0,
+            liquido_com_taxa REAL NOT NULL DEFAULT 0,
+            liquido_x_dias REAL NOT NULL DEFAULT 0,
+            liquido_x_taxa_anual REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (mes, tomador)
+        ) WITHOUT ROWID
+    ''')
+
+    # Notas adiantadas antes das taxas existirem (planilha importada, adiantamentos antigos);
+    # calculadas antes dos triggers, que somariam ao resumo uma nota que ele ainda não tem
+    cursor.execute('''
+        SELECT id, valor_liquido_vinci, valor_retido_vinci, data_adiantamento, data_vencimento
+        FROM notas_fiscais
+        WHERE foi_adiantado = 1 AND dias_antecipacao IS NULL
+    ''')
+    calculadas = [(*calcular_custo(*row[1:]), row[0]) for row in cursor.fetchall()]
+    cursor.executemany('''
+        UPDATE notas_fiscais SET dias_antecipacao = ?, taxa_efetiva_mensal = ?, taxa_efetiva_anual = ?
+        WHERE id = ?
+    ''', calculadas)
+    if calculadas:
+        print(f"   💸 Taxa efetiva calculada para {len(calculadas)} adiantamentos")
+
+    cursor.execute('SELECT EXISTS (SELECT 1 FROM resumo_adiantamentos)')
+    if not cursor.fetchone()[0]:
+        reconstruir(cursor)
+
+    criar_gatilho(cursor, 'trg_resumo_adiantamentos_insert', 'AFTER INSERT ON notas_fiscais',
+                  _sql_somar('NEW', ''), quando='NEW.foi_adiantado = 1')
+    criar_gatilho(cursor, 'trg_resumo_adiantamentos_delete', 'AFTER DELETE ON notas_fiscais', f'''
+        {_sql_somar('OLD', '-')}
+        {_sql_limpar('OLD')}
+    ''', quando='OLD.foi_adiantado = 1')
+    colunas = ('foi_adiantado, data_adiantamento, tomador, valor_liquido_vinci, valor_retido_vinci, '
+               'dias_antecipacao, taxa_efetiva_anual')
+    criar_gatilho(cursor, 'trg_resumo_adiantamentos_update', f'AFTER UPDATE OF {colunas} ON notas_fiscais', f'''
+        {_sql_somar('OLD', '-')}
+        {_sql_limpar('OLD')}
+        {_sql_somar('NEW', '')}
+    ''', quando='OLD.foi_adiantado = 1 OR NEW.foi_adiantado = 1')
+
+
+def reconstruir(cursor):
+    """Recalcula resumo_adiantamentos do zero a partir das notas adiantadas"""
+    com_taxa = 'CASE WHEN taxa_efetiva_anual IS NOT NULL THEN COALESCE(valor_liquido_vinci, 0) ELSE 0 END'
+    cursor.execute('DELETE FROM resumo_adiantamentos')
+    cursor.execute(f'''
+        INSERT INTO resumo_adiantamentos (mes, tomador, qtd, valor_liquido, valor_retido,
+                                          liquido_com_taxa, liquido_x_dias, liquido_x_taxa_anual)
+        SELECT COALESCE(substr(data_adiantamento, 1, 7), ''), COALESCE(tomador, ''), COUNT(*),
+            SUM(COALESCE(valor_liquido_vinci, 0)), SUM(COALESCE(valor_retido_vinci, 0)),
+            SUM({com_taxa}),
+            SUM(({com_taxa}) * COALESCE(dias_antecipacao, 0)),
+            SUM(({com_taxa}) * COALESCE(taxa_efetiva_anual, 0))
+        FROM notas_fiscais
+        WHERE foi_adiantado = 1
+        GROUP BY 1, 2
+    ''')
+
+
+class CustoAdiantamentos:
+    """Tendência do custo dos adiantamentos e sugestão das notas mais baratas de adiantar"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def tendencia(self, agrupar='mes', de=None, ate=None):
+        """Custo por mês do adiantamento, por tomador ou por ambos (de/ate em YYYY-MM)
+
+        Taxa e prazo médios são ponderados pelo valor líquido adiantado.
+        """
+        grupos = {'mes': 'mes', 'tomador': 'tomador', 'mes_tomador': 'mes, tomador'}
+        if agrupar not in grupos:
+            raise ValueError(f"Agrupamento inválido: {agrupar} (use {', '.join(grupos)})")
+
+        filtros = []
+        params = []
+        if de:
+            filtros.append('mes >= ?')
+            params.append(de)
+        if ate:
+            filtros.append('mes <= ?')
+            params.append(ate)
+        where = f"WHERE {' AND '.join(filtros)}" if filtros else ''
+
+        conn = self.db._conectar()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {grupos[agrupar]},
+                SUM(qtd) as qtd,
+                SUM(valor_liquido) as valor_liquido,
+                SUM(valor_retido) as valor_retido,
+                SUM(liquido_x_taxa_anual) / NULLIF(SUM(liquido_com_taxa), 0) as taxa_media_anual,
+                SUM(liquido_x_dias) / NULLIF(SUM(liquido_com_taxa), 0) as prazo_medio_dias
+            FROM resumo_adiantamentos
+            {where}
+            GROUP BY {grupos[agrupar]}
+            ORDER BY {'valor_retido DESC' if agrupar == 'tomador' else grupos[agrupar]}
+        ''', params)
+
+        linhas = []
+        for row in cursor.fetchall():
+            linha = dict(row)
+            nominal = linha['valor_liquido'] + linha['valor_retido']
+            linha['desconto_percentual'] = round(linha['valor_retido'] / nominal * 100, 4) if nominal else None
+            for campo in ('valor_liquido', 'valor_retido'):
+                linha[campo] = round(linha[campo], 2)
+            for campo in ('taxa_media_anual', 'prazo_medio_dias'):
+                if linha[campo] is not None:
+                    linha[campo] = round(linha[campo], 2)
+            linhas.append(linha)
+        conn.close()
+        return linhas
+
+    def _taxas_por_tomador(self, cursor, hoje):
+        """Taxa anual média (ponderada) de cada tomador nos últimos meses, e a geral"""
+        desde = (_data(hoje) - timedelta(days=30 * MESES_HISTORICO_TAXA)).strftime('%Y-%m')
+        cursor.execute('''
+            SELECT tomador, SUM(liquido_x_taxa_anual), SUM(liquido_com_taxa)
+            FROM resumo_adiantamentos
+            WHERE mes >= ?
+            GROUP BY tomador
+        ''', (desde,))
+        taxas = {}
+        soma_taxa = soma_liquido = 0
+        for tomador, liquido_x_taxa, liquido in cursor.fetchall():
+            if liquido:
+                taxas[tomador] = liquido_x_taxa / liquido
+                soma_taxa += liquido_x_taxa
+                soma_liquido += liquido
+        return taxas, (soma_taxa / soma_liquido if soma_liquido else None)
+
+    def otimizar(self, data_referencia=None, valor_necessario=None, taxa_anual=None, limite=LIMITE_SUGESTOES):
+        """Notas pendentes e ainda não adiantadas, da mais barata para a mais cara de adiantar
+
+        O custo estimado usa a taxa histórica do tomador (ou a geral, ou taxa_anual se
+        informada) pelos dias até o vencimento. Com valor_necessario, sugere as mais
+        baratas até cobrir o valor; sem ele, as `limite` primeiras.
+
+        Raises:
+            ValueError: data inválida ou nenhuma taxa disponível
+        """
+        hoje = self.db._data_referencia(data_referencia)
+
+        conn = self.db._conectar()
+        cursor = conn.cursor()
+        taxas, taxa_geral = self._taxas_por_tomador(cursor, hoje)
+        if taxa_anual is None and taxa_geral is None:
+            conn.close()
+            raise ValueError('Sem histórico de adiantamentos nos últimos meses: informe taxa_anual')
+
+        # Faixa do índice (status_recebimento, data_vencimento): só notas ainda a vencer
+        cursor.execute(f'''
+            SELECT id, numero_nf, tomador, tipo, data_vencimento, {VALOR_ESPERADO.format(p='notas_fiscais')}
+            FROM notas_fiscais
+            WHERE status_recebimento = 'PENDENTE' AND data_vencimento > ?
+            AND COALESCE(foi_adiantado, 0) = 0
+        ''', (hoje,))
+        notas = cursor.fetchall()
+        conn.close()
+
+        data_hoje = _data(hoje)
+        candidatas = []
+        for nota_id, numero_nf, tomador, tipo, data_vencimento, valor_esperado in notas:
+            if not valor_esperado or valor_esperado <= 0:
+                continue
+            taxa = taxa_anual if taxa_anual is not None else taxas.get(tomador or '', taxa_geral)
+            dias = (_data(data_vencimento) - data_hoje).days
+            valor_liquido = valor_esperado / (1 + taxa / 100) ** (dias / 365)
+            candidatas.append({
+                'id': nota_id,
+                'numero_nf': numero_nf,
+                'tomador': tomador,
+                'tipo': tipo,
+                'data_vencimento': data_vencimento,
+                'dias_antecipados': dias,
+                'valor_esperado': round(valor_esperado, 2),
+                'taxa_anual_estimada': round(taxa, 2),
+                'valor_liquido_estimado': round(valor_liquido, 2),
+                'custo_estimado': round(valor_esperado - valor_liquido, 2),
+                'custo_percentual': round((1 - valor_liquido / valor_esperado) * 100, 4)
+            })
+
+        # Menor custo por real antecipado primeiro; no empate, a nota maior
+        candidatas.sort(key=lambda nota: (nota['custo_percentual'], -nota['valor_esperado']))
+
+        if valor_necessario is not None:
+            sugeridas = []
+            acumulado = 0
+            for nota in candidatas:
+                if acumulado >= valor_necessario:
+                    break
+                sugeridas.append(nota)
+                acumulado += nota['valor_liquido_estimado']
+        else:
+            sugeridas = candidatas[:limite]
+
+        total_liquido = sum(nota['valor_liquido_estimado'] for nota in sugeridas)
+        return {
+            'data_referencia': hoje,
+            'taxa_geral_anual': round(taxa_geral, 2) if taxa_geral is not None else None,
+            'candidatas': len(candidatas),
+            'notas': sugeridas,
+            'total_liquido_estimado': round(total_liquido, 2),
+            'total_custo_estimado': round(sum(nota['custo_estimado'] for nota in sugeridas), 2),
+            'cobre_valor_necessario': (total_liquido >= valor_necessario) if valor_necessario is not None else None
+        }
@@ -0,0 +1,262 @@
+"""
+Análises - tabelas dinâmicas (pivot) sobre as notas fiscais em um motor colunar
+Com o DuckDB instalado, as consultas rodam nele: o banco é anexado somente leitura
+(extensões sqlite ou postgres do DuckDB) ou, se configurado, lidas de um snapshot Parquet
+exportado periodicamente. Sem o DuckDB, o mesmo SQL roda no próprio banco.
+Resultados ficam no cache de consultas de Database (chave inclui versao_dados).
+
+Uso:
+    python analises.py pivot --linhas tomador --metrica valor_bruto --periodo mes --de 2023-01 --ate 2024-12
+    python analises.py parquet --saida notas.parquet    # snapshot para as análises (agendar no cron)
+"""
+import argparse
+import os
+import threading
+from datetime import datetime
+
+from resumos import VALOR_ESPERADO
+
+DIMENSOES = ('tomador', 'localidade', 'tipo', 'status_recebimento')
+
+# Agregações disponíveis (sobre a relação de notas com alias n)
+METRICAS = {
+    'qtd': 'COUNT(*)',
+    'valor_bruto': 'SUM(n.valor_bruto)',
+    'valor_esperado': f"SUM({VALOR_ESPERADO.format(p='n')})",
+    'inss': 'SUM(COALESCE(n.inss, 0))',
+    'iss': 'SUM(COALESCE(n.iss, 0))',
+    'retencao_equatorial': 'SUM(COALESCE(n.retencao_equatorial, 0))',
+    'pis_cofins_csll': 'SUM(COALESCE(n.pis_cofins_csll, 0))',
+    'retencoes': ('SUM(COALESCE(n.inss, 0) + COALESCE(n.iss, 0) + COALESCE(n.retencao_equatorial, 0) '
+                  '+ COALESCE(n.pis_cofins_csll, 0))'),
+    # Juros do adiantamento (coluna R da planilha)
+    'custo_adiantamento': 'SUM(CASE WHEN n.foi_adiantado = 1 THEN COALESCE(n.valor_retido_vinci, 0) ELSE 0 END)',
+}
+
+# Período pela data de emissão; só funções de texto comuns ao SQLite, ao PostgreSQL e ao DuckDB
+PERIODOS = {
+    'mes': 'substr(n.data_emissao, 1, 7)',
+    'trimestre': ("substr(n.data_emissao, 1, 4) || '-T' || CASE WHEN substr(n.data_emissao, 6, 2) <= '03' THEN '1' "
+                  "WHEN substr(n.data_emissao, 6, 2) <= '06' THEN '2' "
+                  "WHEN substr(n.data_emissao, 6, 2) <= '09' THEN '3' ELSE '4' END"),
+    'ano': 'substr(n.data_emissao, 1, 4)',
+    'total': "'total'",
+}
+
+# Linhas além das maiores agrupadas em OUTROS
+LIMITE_LINHAS = 50
+
+
+def _inicio_mes(texto, campo):
+    """'YYYY-MM' -> 'YYYY-MM-01' (ValueError se inválido)"""
+    try:
+        return datetime.strptime(texto, '%Y-%m').strftime('%Y-%m-01')
+    except (TypeError, ValueError):
+        raise ValueError(f'{campo} inválido: {texto} (use YYYY-MM)')
+
+
+def _inicio_mes_seguinte(texto, campo):
+    ano, mes = map(int, _inicio_mes(texto, campo)[:7].split('-'))
+    return f'{ano + mes // 12:04d}-{mes % 12 + 1:02d}-01'
+
+
+class Analises:
+    """Pivots de faturamento; o motor (DuckDB ou o próprio banco) é escolhido na primeira consulta"""
+
+    def __init__(self, db, parquet=None):
+        """
+        Args:
+            db: Database (fonte dos dados e do cache de consultas)
+            parquet: Snapshot Parquet das notas; quando existe, o DuckDB lê dele em vez do SQLite
+        """
+        self.db = db
+        self.parquet = parquet
+        self._duckdb = None
+        self._motor = None
+        self._trava = threading.Lock()
+
+    @property
+    def motor(self):
+        if self._motor is None:
+            with self._trava:
+                if self._motor is None:
+                    self._motor = self._abrir_duckdb()
+        return self._motor
+
+    def _abrir_duckdb(self):
+        """Conexão DuckDB com o banco anexado; o nome do backend se o DuckDB não estiver disponível"""
+        backend = self.db.armazenamento.nome
+        try:
+            import duckdb
+        except ImportError:
+            return backend
+
+        extensao = 'postgres' if backend == 'postgresql' else 'sqlite'
+        try:
+            conn = duckdb.connect()
+            conn.execute(f'INSTALL {extensao}')
+            conn.execute(f'LOAD {extensao}')
+            conn.execute(f"ATTACH '{self.db.db_path}' AS faturamento (TYPE {extensao.upper()}, READ_ONLY)")
+        except Exception as e:
+            print(f"   ⚠️  DuckDB indisponível ({str(e)}); análises no {backend}")
+            return backend
+
+        self._duckdb = conn
+        return 'duckdb'
+
+    def _origem(self):
+        """Relação das notas no motor atual e a versão dos dados que ela reflete"""
+        if self.motor != 'duckdb':
+            return 'notas_fiscais', None
+        if self.parquet and os.path.exists(self.parquet):
+            # O snapshot tem a sua própria versão: a do arquivo, não a do banco
+            return f"read_parquet('{self.parquet}')", os.path.getmtime(self.parquet)
+        return 'faturamento.notas_fiscais', None
+
+    def _executar(self, sql, parametros):
+        if self.motor == 'duckdb':
+            # Um cursor por consulta: a conexão é compartilhada entre as threads do servidor
+            cursor = self._duckdb.cursor()
+            try:
+                return cursor.execute(sql, parametros).fetchall()
+            finally:
+                cursor.close()
+
+        conn = self.db._conectar()
+        try:
+            return conn.execute(sql, parametros).fetchall()
+        finally:
+            conn.close()
+
+    def pivot(self, linhas, metrica='valor_bruto', periodo='mes', de=None, ate=None, filtros=None,
+              limite=LIMITE_LINHAS):
+        """Tabela dinâmica: uma linha por valor da dimensão, uma coluna por período de emissão
+
+        Args:
+            linhas: tomador, localidade, tipo ou status_recebimento
+            metrica: Chave de METRICAS
+            periodo: mes, trimestre, ano ou total
+            de, ate: Intervalo de emissão em YYYY-MM (inclusivo)
+            filtros: {dimensão: valor} para restringir as notas
+            limite: Máximo de linhas; as demais são somadas em OUTROS
+
+        Raises:
+            ValueError: dimensão, métrica, período ou datas inválidos
+        """
+        if linhas not in DIMENSOES:
+            raise ValueError(f"Dimensão inválida: {linhas} (use {', '.join(DIMENSOES)})")
+        if metrica not in METRICAS:
+            raise ValueError(f"Métrica inválida: {metrica} (use {', '.join(METRICAS)})")
+        if periodo not in PERIODOS:
+            raise ValueError(f"Período inválido: {periodo} (use {', '.join(PERIODOS)})")
+
+        condicoes = []
+        parametros = []
+        if de:
+            condicoes.append('n.data_emissao >= ?')
+            parametros.append(_inicio_mes(de, 'de'))
+        if ate:
+            condicoes.append('n.data_emissao < ?')
+            parametros.append(_inicio_mes_seguinte(ate, 'ate'))
+        for dimensao, valor in sorted((filtros or {}).items()):
+            if dimensao not in DIMENSOES:
+                raise ValueError(f'Filtro inválido: {dimensao}')
+            condicoes.append(f"COALESCE(n.{dimensao}, '') = ?")
+            parametros.append(valor)
+
+        origem, versao_snapshot = self._origem()
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ''
+        sql = f'''
+            SELECT COALESCE(n.{linhas}, '') as linha, {PERIODOS[periodo]} as periodo, {METRICAS[metrica]} as valor
+            FROM {origem} n
+            {where}
+            GROUP BY 1, 2
+        '''
+
+        def carregar():
+            return self._montar(self._executar(sql, parametros), limite)
+
+        chave = (linhas, metrica, periodo, tuple(parametros), limite, self.motor, versao_snapshot)
+        resultado = self.db._em_cache('pivot', chave, carregar)
+        resultado.update({'linhas_por': linhas, 'metrica': metrica, 'periodo': periodo, 'motor': self.motor})
+        return resultado
+
+    @staticmethod
+    def _montar(registros, limite):
+        """Linhas (dimensão, período, valor) -> matriz com totais por linha e por período"""
+        por_linha = {}
+        periodos = set()
+        for linha, periodo, valor in registros:
+            por_linha.setdefault(linha, {})[periodo] = valor or 0
+            periodos.add(periodo)
+
+        ordenadas = sorted(por_linha.items(), key=lambda item: -sum(item[1].values()))
+        if limite and len(ordenadas) > limite:
+            outros = {}
+            for _, valores in ordenadas[limite:]:
+                for periodo, valor in valores.items():
+                    outros[periodo] = outros.get(periodo, 0) + valor
+            ordenadas = ordenadas[:limite] + [('OUTROS', outros)]
+
+        periodos = sorted(periodos)
+        totais_periodo = {periodo: 0 for periodo in periodos}
+        dados = []
+        for linha, valores in ordenadas:
+            for periodo, valor in valores.items():
+                totais_periodo[periodo] += valor
+            dados.append({
+                'linha': linha,
+                'valores': {periodo: round(valor, 2) for periodo, valor in valores.items()},
+                'total': round(sum(valores.values()), 2)
+            })
+
+        return {
+            'periodos': periodos,
+            'dados': dados,
+            'totais_periodo': {periodo: round(valor, 2) for periodo, valor in totais_periodo.items()},
+            'total': round(sum(totais_periodo.values()), 2)
+        }
+
+    def exportar_parquet(self, destino):
+        """Grava o snapshot Parquet das notas (requer DuckDB); devolve a quantidade de notas"""
+        if self.motor != 'duckdb':
+            raise RuntimeError('Snapshot Parquet requer o DuckDB (pip install duckdb)')
+
+        temporario = f'{destino}.tmp'
+        self._duckdb.execute(f"COPY (SELECT * FROM faturamento.notas_fiscais) TO '{temporario}' (FORMAT PARQUET)")
+        # Troca atômica: quem está lendo o snapshot anterior não vê um arquivo pela metade
+        os.replace(temporario, destino)
+        return self._duckdb.execute(f"SELECT COUNT(*) FROM read_parquet('{destino}')").fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Análises de faturamento (DuckDB ou SQLite)')
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+    pivot = subcomandos.add_parser('pivot', help='Tabela dinâmica por dimensão e período')
+    pivot.add_argument('--linhas', default='tomador', choices=DIMENSOES)
+    pivot.add_argument('--metrica', default='valor_bruto', choices=sorted(METRICAS))
+    pivot.add_argument('--periodo', default='mes', choices=sorted(PERIODOS))
+    pivot.add_argument('--de', help='YYYY-MM')
+    pivot.add_argument('--ate', help='YYYY-MM')
+    parquet = subcomandos.add_parser('parquet', help='Exporta o snapshot Parquet das notas')
+    parquet.add_argument('--saida', default='notas.parquet')
+    parser.add_argument('--db', default='sistema_nf.db')
+    args = parser.parse_args()
+
+    from database import Database
+    analises = Analises(Database(args.db))
+
+    if args.comando == 'parquet':
+        total = analises.exportar_parquet(args.saida)
+        print(f'✅ {total:,} notas exportadas para {args.saida}')
+        return
+
+    resultado = analises.pivot(args.linhas, args.metrica, args.periodo, args.de, args.ate)
+    print(f"📊 {args.metrica} por {args.linhas} e {args.periodo} (motor: {resultado['motor']})")
+    for item in resultado['dados']:
+        print(f"   {item['linha'][:40]:<40} {item['total']:>18,.2f}")
+    print(f"   {'TOTAL':<40} {resultado['total']:>18,.2f}")
+
+
+if __name__ == '__main__':
+    main()
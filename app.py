@@ -1,39 +1,176 @@
-from flask import Flask, render_template, request, jsonify, send_file
+"""
+Aplicação web de faturamento (Flask)
+
+Uso:
+    flask --app app migrar                      # cria/atualiza o esquema do banco (uma vez por deploy)
+    flask --app app run                         # desenvolvimento
+    gunicorn -w 4 -k gthread --threads 32 'app:create_app()'   # produção
+    python app.py                               # desenvolvimento (migra e sobe o servidor)
+
+Importar este módulo não abre o banco nem carrega bibliotecas pesadas: o banco é
+aberto em create_app() e pandas/pdfplumber só são importados pelas rotas que os usam.
+
+Cada dashboard aberto mantém uma conexão SSE (/api/dashboard-stream) ocupando uma thread
+do worker: use workers com threads (gthread) ou gevent, nunca o worker sync padrão, em que
+um único dashboard prende o processo inteiro. MAX_CONEXOES_SSE (por processo) deve ficar
+abaixo de --threads para sobrar thread para as demais requisições; acima do limite o
+dashboard volta a se atualizar por consulta periódica.
+"""
+from flask import Flask, Blueprint, current_app, render_template, request, jsonify, send_file, g, Response, stream_with_context
 import os
-import sqlite3
+import time
+from werkzeug.local import LocalProxy
 from werkzeug.utils import secure_filename
-from ocr_extractor import NFExtractor
 from calculadora_retencoes import CalculadoraRetencoes
 from database import Database
-import pandas as pd
+from idempotencia import ChaveIdempotenciaReutilizada
+from respostas import configurar_json, responder_lista
+from eventos import canal
+from resumos import ResumoRecebiveis
+from busca import BuscaTextual
+from ledger import Ledger
+from fechamento import Fechamento
+from analises import Analises, DIMENSOES as DIMENSOES_ANALISE, LIMITE_LINHAS
+from adiantamentos import CustoAdiantamentos, LIMITE_SUGESTOES
+from arquivo_pdf import ArquivoPDF
+from conciliacao_automatica import TOLERANCIA_PADRAO, sugerir_combinacoes
+import instrumentacao
+from instrumentacao import medir
 from datetime import datetime
 import tempfile
 
-app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
+ALLOWED_EXTENSIONS = {'pdf', 'xml'}
+
+bp = Blueprint('faturamento', __name__)
+
+# Banco e arquivo de PDFs da aplicação atendendo a requisição (criados em create_app)
+db = LocalProxy(lambda: current_app.extensions['faturamento_db'])
+arquivo = LocalProxy(lambda: current_app.extensions['faturamento_arquivo_pdf'])
+
+
+def create_app(config=None):
+    """Cria a aplicação: configuração, banco (sem rodar DDL) e rotas
+
+    Args:
+        config: Dict sobrescrevendo a configuração padrão (ex.: {'DATABASE': 'teste.db'})
+    """
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = 'uploads'
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
+    app.config['ARQUIVO_PDF'] = os.environ.get('ARQUIVO_PDF', 'arquivo_pdfs')
+    # Caminho do SQLite ou endereço do banco (sqlite:///..., postgresql://...)
+    app.config['DATABASE'] = os.environ.get('DATABASE', 'sistema_nf.db')
+    # Migração é um passo explícito (`flask --app app migrar`); True só para desenvolvimento
+    app.config['MIGRAR_NA_INICIALIZACAO'] = False
+    # Snapshot Parquet das notas para as análises no DuckDB (gerado por `python analises.py parquet`)
+    app.config['ANALISES_PARQUET'] = os.environ.get('ANALISES_PARQUET')
+    # Conexões SSE simultâneas por processo (cada uma ocupa uma thread do worker)
+    app.config['MAX_CONEXOES_SSE'] = int(os.environ.get('MAX_CONEXOES_SSE', 16))
+    if config:
+        app.config.update(config)
+    configurar_json(app)
+
+    # Cria diretório de uploads se não existir
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    db_app = Database(app.config['DATABASE'], migrar=app.config['MIGRAR_NA_INICIALIZACAO'])
+    if not db_app.esquema_atualizado():
+        print(f"⚠️  Esquema do banco {app.config['DATABASE']} desatualizado: rode `flask --app app migrar`")
+    # Várias threads atendendo requisições: escritas serializadas em uma thread com group commit
+    db_app.ativar_fila_escrita()
+    app.extensions['faturamento_db'] = db_app
+    app.extensions['faturamento_arquivo_pdf'] = ArquivoPDF(db_app, raiz=app.config['ARQUIVO_PDF'])
+    # Conexão DuckDB aberta na primeira análise, não na inicialização
+    app.extensions['faturamento_analises'] = Analises(db_app, parquet=app.config['ANALISES_PARQUET'])
 
-# Cria diretório de uploads se não existir
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    app.register_blueprint(bp)
+    app.cli.command('migrar')(migrar)
+    return app
 
-ALLOWED_EXTENSIONS = {'pdf'}
 
-# Inicializa banco de dados
-db = Database()
+def migrar():
+    """Cria ou atualiza o esquema do banco (tabelas, índices, triggers)"""
+    db_app = current_app.extensions['faturamento_db']
+    inicio = time.perf_counter()
+    db_app.init_database()
+    print(f"✅ Banco {db_app.db_path} migrado em {time.perf_counter() - inicio:.2f}s")
 
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-@app.route('/')
+@bp.before_app_request
+def iniciar_medicao():
+    """Marca o início da requisição e zera o contador de consultas"""
+    g.inicio_requisicao = time.perf_counter()
+    instrumentacao.iniciar_requisicao()
+
+
+@bp.after_app_request
+def registrar_medicao(response):
+    """Registra latência e consultas ao banco da requisição (inclusive as escritas da fila)"""
+    inicio = g.pop('inicio_requisicao', None)
+    if inicio is None:
+        return response
+
+    duracao = time.perf_counter() - inicio
+    consultas, tempo_consultas = instrumentacao.finalizar_requisicao()
+    rota = request.url_rule.rule if request.url_rule else 'nao_encontrada'
+
+    if rota != '/metrics':
+        registro = instrumentacao.registro
+        registro.observar('faturamento_http_requisicao_segundos', duracao,
+                          rota=rota, metodo=request.method, status=response.status_code)
+        registro.observar('faturamento_db_consultas_por_requisicao', consultas,
+                          buckets=instrumentacao.BUCKETS_CONSULTAS, rota=rota)
+        registro.observar('faturamento_db_tempo_por_requisicao_segundos', tempo_consultas, rota=rota)
+
+    response.headers['Server-Timing'] = (
+        f'app;dur={duracao * 1000:.1f}, sql;desc="{consultas} consultas";dur={tempo_consultas * 1000:.1f}'
+    )
+    return response
+
+
+def publicar_alteracao(nota_ids, incluir_analise=False):
+    """Envia aos dashboards conectados as linhas alteradas e os novos totais"""
+    if not canal.tem_assinantes():
+        return
+
+    try:
+        nota_ids = list(nota_ids)
+        pendentes = db.listar_pendentes(ids=nota_ids)
+        ainda_pendentes = {nota['id'] for nota in pendentes}
+
+        delta = {
+            'pendentes': pendentes,
+            'removidos': [nota_id for nota_id in nota_ids if nota_id not in ainda_pendentes],
+            'dashboard': db.dashboard_recebimentos()
+        }
+        if incluir_analise:
+            delta['analise_financeira'] = db.analise_financeira()
+
+        canal.publicar('delta', delta)
+    except Exception as e:
+        print(f"   ⚠️  Falha ao publicar atualização do dashboard: {str(e)}")
+
+
+@bp.route('/metrics')
+def metrics():
+    """Métricas no formato texto do Prometheus"""
+    return instrumentacao.registro.exportar_prometheus(), 200, {
+        'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'
+    }
+
+
+@bp.route('/')
 def index():
     return render_template('index.html')
 
 
-@app.route('/upload', methods=['POST'])
+@bp.route('/upload', methods=['POST'])
 def upload_file():
-    """Recebe PDF e extrai dados via OCR"""
+    """Recebe PDF (ou XML da NF-e/CT-e/NFS-e) e extrai os dados"""
     if 'file' not in request.files:
         return jsonify({'error': 'Nenhum arquivo enviado'}), 400
 
@@ -43,32 +180,44 @@ def upload_file():
         return jsonify({'error': 'Arquivo vazio'}), 400
 
     if not allowed_file(file.filename):
-        return jsonify({'error': 'Apenas arquivos PDF são permitidos'}), 400
+        return jsonify({'error': 'Apenas arquivos PDF ou XML são permitidos'}), 400
 
     try:
         # Salva arquivo temporariamente
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
         file.save(filepath)
 
-        # Extrai dados via OCR
-        extractor = NFExtractor(filepath)
-        dados_extraidos = extractor.extract()
+        # Importado aqui: a extração (e o pdfplumber) só é usada nesta rota
+        from xml_extractor import extrair_documento
+
+        # XML é a fonte oficial (leitura direta); PDF cai na extração por texto
+        if filename.lower().endswith('.xml'):
+            pdf_sha256 = None
+            with medir('xml_extractor'):
+                dados_extraidos, _ = extrair_documento(filepath)
+        else:
+            # Guarda o PDF original no arquivo; o hash fica em nf_metadados ao salvar a nota
+            pdf_sha256 = arquivo.guardar(filepath, nome_original=file.filename)
+            with medir('nf_extractor'):
+                dados_extraidos, _ = extrair_documento(filepath)
 
         # Calcula retenções e valores usando a calculadora independente
         calc = CalculadoraRetencoes()
-        retencoes = calc.calcular_retencoes(
-            dados_extraidos['tipo'],
-            dados_extraidos['valor_bruto'],
-            pis_cofins_retido=False
-        )
-        valor_nominal = calc.calcular_valor_nominal(dados_extraidos['valor_bruto'], retencoes)
+        with medir('calculadora_retencoes'):
+            retencoes = calc.calcular_retencoes(
+                dados_extraidos['tipo'],
+                dados_extraidos['valor_bruto'],
+                pis_cofins_retido=False
+            )
+            valor_nominal = calc.calcular_valor_nominal(dados_extraidos['valor_bruto'], retencoes)
 
         # Adiciona cálculos aos dados extraídos
         dados_extraidos['retencoes'] = retencoes
+        dados_extraidos['pdf_sha256'] = pdf_sha256
         dados_extraidos['valor_nominal_calculado'] = round(valor_nominal, 2)
 
-        # Remove arquivo temporário
+        # Remove arquivo temporário (a cópia fica no arquivo de PDFs)
         os.remove(filepath)
 
         return jsonify({
@@ -80,7 +229,7 @@ def upload_file():
         return jsonify({'error': f'Erro ao processar arquivo: {str(e)}'}), 500
 
 
-@app.route('/salvar', methods=['POST'])
+@bp.route('/salvar', methods=['POST'])
 def salvar_nota():
     """Salva nota fiscal no banco de dados"""
     try:
@@ -101,18 +250,21 @@ def salvar_nota():
         dados_db['valor_nominal_conferencia'] = dados.get('valor_nominal_conferencia', 0)
 
         # Insere no banco
-        db.inserir_nota(dados_db)
+        nf_id = db.inserir_nota(dados_db, chave_idempotencia=request.headers.get('Idempotency-Key'))
+        publicar_alteracao([nf_id])
 
         return jsonify({
             'success': True,
             'message': f'Nota fiscal {dados["numero_nf"]} salva com sucesso!'
         })
 
+    except ChaveIdempotenciaReutilizada as e:
+        return jsonify({'error': str(e)}), 422
     except Exception as e:
         return jsonify({'error': f'Erro ao salvar: {str(e)}'}), 500
 
 
-@app.route('/calcular', methods=['POST'])
+@bp.route('/calcular', methods=['POST'])
 def calcular_valores():
     """Calcula valores baseado no tipo e valor bruto"""
     try:
@@ -123,8 +275,9 @@ def calcular_valores():
 
         # Usa calculadora independente
         calc = CalculadoraRetencoes()
-        retencoes = calc.calcular_retencoes(tipo, valor_bruto, pis_cofins_retido)
-        valor_nominal = calc.calcular_valor_nominal(valor_bruto, retencoes)
+        with medir('calculadora_retencoes'):
+            retencoes = calc.calcular_retencoes(tipo, valor_bruto, pis_cofins_retido)
+            valor_nominal = calc.calcular_valor_nominal(valor_bruto, retencoes)
 
         return jsonify({
             'success': True,
@@ -141,24 +294,25 @@ def calcular_valores():
         return jsonify({'error': f'Erro ao calcular: {str(e)}'}), 500
 
 
-@app.route('/dashboard')
+@bp.route('/dashboard')
 def dashboard():
     """Página do dashboard de recebimentos"""
     return render_template('dashboard.html')
 
 
-@app.route('/extrato')
+@bp.route('/extrato')
 def extrato():
     """Página de gerenciamento de extrato"""
     return render_template('extrato.html')
 
 
-@app.route('/api/dashboard-data')
+@bp.route('/api/dashboard-data')
 def dashboard_data():
-    """Retorna dados para o dashboard"""
+    """Retorna dados para o dashboard (?data_referencia=YYYY-MM-DD para outra data base)"""
     try:
-        data = db.dashboard_recebimentos()
-        pendentes = db.listar_pendentes()
+        data_referencia = request.args.get('data_referencia')
+        data = db.dashboard_recebimentos(data_referencia)
+        pendentes = db.listar_pendentes(data_referencia=data_referencia)
         analise = db.analise_financeira()
 
         return jsonify({
@@ -167,37 +321,243 @@ def dashboard_data():
             'pendentes': pendentes,
             'analise_financeira': analise
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/api/dashboard-stream')
+def dashboard_stream():
+    """Canal SSE com deltas do dashboard (notas alteradas e totais por situação)
+
+    Acima de MAX_CONEXOES_SSE responde 503 e o dashboard passa a consultar periodicamente.
+    """
+    fila = canal.assinar(limite=current_app.config['MAX_CONEXOES_SSE'])
+    if fila is None:
+        return jsonify({'error': 'Limite de conexões de atualização atingido'}), 503
+    return Response(
+        stream_with_context(canal.transmitir(fila)),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+@bp.route('/api/recebiveis/aging')
+def recebiveis_aging():
+    """Recebíveis em aberto por faixa de atraso (opcionalmente por tomador/tipo/localidade)"""
+    try:
+        resumo = ResumoRecebiveis(db)
+        dados = resumo.aging(dimensao=request.args.get('dimensao'))
+        return jsonify({'success': True, 'aging': dados})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/api/recebiveis/previsao')
+def recebiveis_previsao():
+    """Previsão mensal de recebimentos pela data de vencimento"""
+    try:
+        resumo = ResumoRecebiveis(db)
+        dados = resumo.previsao_mensal(
+            meses=request.args.get('meses', 12, type=int),
+            dimensao=request.args.get('dimensao')
+        )
+        return jsonify({'success': True, 'previsao': dados})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/api/recebiveis/por/<dimensao>')
+def recebiveis_por_dimensao(dimensao):
+    """Totais por tomador, tipo ou localidade e status (filtro opcional ?inicio=YYYY-MM&fim=YYYY-MM)"""
+    try:
+        resumo = ResumoRecebiveis(db)
+        dados = resumo.por_dimensao(dimensao, request.args.get('inicio'), request.args.get('fim'))
+        return jsonify({'success': True, 'dimensao': dimensao, 'linhas': dados})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/api/recebiveis/posicao-caixa')
+def recebiveis_posicao_caixa():
+    """Entradas previstas por dia até ?ate=YYYY-MM-DD (opcional data_referencia e saldo_inicial)"""
+    try:
+        ate = request.args.get('ate')
+        if not ate:
+            return jsonify({'error': 'Informe a data final (ate=YYYY-MM-DD)'}), 400
+        dados = db.posicao_caixa(
+            ate,
+            data_referencia=request.args.get('data_referencia'),
+            saldo_inicial=request.args.get('saldo_inicial', 0, type=float)
+        )
+        return jsonify({'success': True, 'posicao': dados})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/api/recebiveis/posicao-historica')
+def recebiveis_posicao_historica():
+    """Posição dos recebíveis como registrada em uma data (?data=YYYY-MM-DD&dimensao=tomador|tipo)"""
+    try:
+        data = request.args.get('data') or datetime.now().strftime('%Y-%m-%d')
+        dados = Ledger(db).posicao_em(data, dimensao=request.args.get('dimensao'))
+        return jsonify({'success': True, 'posicao': dados})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/api/fechamentos', methods=['GET', 'POST'])
+def fechamentos():
+    """Lista os fechamentos (GET) ou gera o de uma data (POST {data_referencia, substituir})"""
+    try:
+        fechamento = Fechamento(db)
+        if request.method == 'GET':
+            return jsonify({'success': True, 'fechamentos': fechamento.listar()})
+
+        dados = request.json or {}
+        resultado = fechamento.gerar(dados.get('data_referencia'), substituir=bool(dados.get('substituir')))
+        return jsonify({'success': True, 'fechamento': resultado})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Erro no fechamento: {str(e)}'}), 500
+
+
+@bp.route('/api/fechamentos/comparar')
+def comparar_fechamentos():
+    """Diferenças entre dois fechamentos (?de=YYYY-MM-DD&ate=YYYY-MM-DD)"""
+    try:
+        resultado = Fechamento(db).comparar(request.args.get('de'), request.args.get('ate'),
+                                            limite=request.args.get('limite', 200, type=int))
+        return jsonify({'success': True, 'comparacao': resultado})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/api/fechamentos/<data_referencia>')
+def relatorio_fechamento(data_referencia):
+    """Totais de um fechamento (opcional ?dimensao=tomador|tipo|localidade)"""
+    try:
+        resultado = Fechamento(db).relatorio(data_referencia, dimensao=request.args.get('dimensao'))
+        if resultado is None:
+            return jsonify({'error': f'Fechamento de {data_referencia} não encontrado'}), 404
+        return jsonify({'success': True, **resultado})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/api/analises/pivot')
+def analise_pivot():
+    """Tabela dinâmica das notas por dimensão e período de emissão
+
+    ?linhas=tomador&metrica=valor_bruto&periodo=mes&de=YYYY-MM&ate=YYYY-MM&limite=50
+    e filtros opcionais por dimensão (?tipo=CONSTRUCAO&localidade=...)
+    """
+    try:
+        analises = current_app.extensions['faturamento_analises']
+        filtros = {dimensao: request.args[dimensao] for dimensao in DIMENSOES_ANALISE if dimensao in request.args}
+        resultado = analises.pivot(
+            request.args.get('linhas', 'tomador'),
+            metrica=request.args.get('metrica', 'valor_bruto'),
+            periodo=request.args.get('periodo', 'mes'),
+            de=request.args.get('de'),
+            ate=request.args.get('ate'),
+            filtros=filtros,
+            limite=request.args.get('limite', LIMITE_LINHAS, type=int)
+        )
+        return jsonify({'success': True, **resultado})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/notas-pendentes')
+@bp.route('/api/adiantamentos/custo')
+def custo_adiantamentos():
+    """Custo efetivo dos adiantamentos (?agrupar=mes|tomador|mes_tomador&de=YYYY-MM&ate=YYYY-MM)"""
+    try:
+        agrupar = request.args.get('agrupar', 'mes')
+        linhas = CustoAdiantamentos(db).tendencia(agrupar, request.args.get('de'), request.args.get('ate'))
+        return jsonify({'success': True, 'agrupar': agrupar, 'linhas': linhas})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/api/adiantamentos/otimizar')
+def otimizar_adiantamentos():
+    """Notas pendentes mais baratas de adiantar
+
+    ?valor=necessário para cobrir&taxa_anual=% (padrão: histórico do tomador)&data_referencia=YYYY-MM-DD&limite=20
+    """
+    try:
+        resultado = CustoAdiantamentos(db).otimizar(
+            data_referencia=request.args.get('data_referencia'),
+            valor_necessario=request.args.get('valor', type=float),
+            taxa_anual=request.args.get('taxa_anual', type=float),
+            limite=request.args.get('limite', LIMITE_SUGESTOES, type=int)
+        )
+        return jsonify({'success': True, **resultado})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/api/notas/<int:nota_id>/historico')
+def historico_nota(nota_id):
+    """Eventos do ledger de uma nota: criação, alterações, adiantamento e conciliações"""
+    try:
+        return jsonify({'success': True, 'eventos': Ledger(db).historico_nota(nota_id)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/api/notas-pendentes')
 def notas_pendentes():
     """Lista notas pendentes de recebimento"""
     try:
-        notas = db.listar_pendentes()
-        return jsonify({
-            'success': True,
-            'notas': notas
-        })
+        versao, atualizado_em = db.versao_dados()
+        # Situação (ATRASADO/A_RECEBER) depende da data base, então o ETag também
+        hoje = db._data_referencia(request.args.get('data_referencia'))
+        return responder_lista('notas', lambda: db.listar_pendentes(data_referencia=hoje),
+                               versao, atualizado_em, variante=hoje)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/todas-notas')
+@bp.route('/api/todas-notas')
 def todas_notas():
     """Lista todas as notas fiscais"""
     try:
-        notas = db.listar_todas_notas()
-        return jsonify({
-            'success': True,
-            'notas': notas
-        })
+        versao, atualizado_em = db.versao_dados()
+        return responder_lista('notas', db.listar_todas_notas, versao, atualizado_em)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/extrato')
+@bp.route('/api/extrato')
 def listar_extrato():
     """Lista lançamentos do extrato com filtro opcional"""
     try:
@@ -205,21 +565,132 @@ def listar_extrato():
         filtro = request.args.get('filtro_adiantamento')
 
         if filtro == 'adiantados':
-            extrato = db.listar_extrato(filtro_adiantamento=True)
+            filtro_adiantamento = True
         elif filtro == 'normais':
-            extrato = db.listar_extrato(filtro_adiantamento=False)
+            filtro_adiantamento = False
         else:
-            extrato = db.listar_extrato()
+            filtro_adiantamento = None
+
+        versao, atualizado_em = db.versao_dados()
+        return responder_lista(
+            'extrato',
+            lambda: db.listar_extrato(filtro_adiantamento=filtro_adiantamento),
+            versao,
+            atualizado_em
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/api/busca')
+def buscar():
+    """Busca textual em notas (NF, tomador, localidade, contrato, STM, requisição) e extrato"""
+    try:
+        texto = request.args.get('q', '')
+        limite = min(request.args.get('limite', 50, type=int), 500)
+        escopo = request.args.get('escopo', 'tudo')
+
+        if escopo not in ('tudo', 'notas', 'extrato'):
+            return jsonify({'error': 'Escopo inválido (use tudo, notas ou extrato)'}), 400
+
+        resultado = BuscaTextual(db).buscar(texto, limite=limite, escopo=escopo)
+        return jsonify({
+            'success': True,
+            'q': texto,
+            **resultado
+        })
+    except Exception as e:
+        return jsonify({'error': f'Erro na busca: {str(e)}'}), 500
+
+
+@bp.route('/api/relatorios/<any(contrato, stm):campo>')
+def relatorio_por_metadado(campo):
+    """Totais de faturamento por contrato ou por STM"""
+    try:
+        resumo = db.resumo_por_metadado(campo)
+        return jsonify({
+            'success': True,
+            'campo': campo,
+            'resumo': resumo
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/api/relatorios/<any(contrato, stm):campo>/<path:valor>')
+def relatorio_de_metadado(campo, valor):
+    """Totais e notas de um contrato ou STM específico"""
+    try:
+        resumo = db.resumo_por_metadado(campo, valor)
+        notas = db.notas_por_metadado(campo, valor)
+        return jsonify({
+            'success': True,
+            'campo': campo,
+            campo: valor,
+            'resumo': resumo[0] if resumo else None,
+            'notas': notas
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
+
+@bp.route('/api/nf/<numero_nf>/recebimentos')
+def recebimentos_da_nf(numero_nf):
+    """Lista os recebimentos (lançamentos do extrato) de uma NF"""
+    try:
+        recebimentos = db.recebimentos_da_nf(numero_nf)
         return jsonify({
             'success': True,
-            'extrato': extrato
+            'numero_nf': numero_nf,
+            'recebimentos': recebimentos
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/registrar-recebimento', methods=['POST'])
+@bp.route('/api/notas/<int:nota_id>/pdf')
+def baixar_pdf_nota(nota_id):
+    """Download (streaming) do PDF original de uma nota"""
+    try:
+        pdf = db.pdf_da_nota(nota_id)
+        if not pdf or not arquivo.existe(pdf['pdf_sha256']):
+            return jsonify({'error': 'PDF não encontrado para esta nota'}), 404
+
+        # Conteúdo endereçado por hash: o ETag nunca muda
+        if request.if_none_match.contains(pdf['pdf_sha256']):
+            return Response(status=304)
+
+        nome = secure_filename(pdf['nome_original'] or f"NF_{pdf['numero_nf']}.pdf")
+        response = Response(
+            stream_with_context(arquivo.ler_em_blocos(pdf['pdf_sha256'])),
+            mimetype='application/pdf'
+        )
+        response.set_etag(pdf['pdf_sha256'])
+        response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+        response.headers['Content-Disposition'] = f'inline; filename="{nome}"'
+        if pdf['tamanho']:
+            response.headers['Content-Length'] = str(pdf['tamanho'])
+        return response
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/api/extrato/<int:extrato_id>/nfs')
+def nfs_do_recebimento(extrato_id):
+    """Lista as NFs de um lançamento do extrato"""
+    try:
+        nfs = db.nfs_do_recebimento(extrato_id)
+        return jsonify({
+            'success': True,
+            'extrato_id': extrato_id,
+            'nfs': nfs
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/api/registrar-recebimento', methods=['POST'])
 def registrar_recebimento():
     """Registra um novo recebimento no extrato"""
     try:
@@ -229,7 +700,8 @@ def registrar_recebimento():
         data_parts = dados['data_recebimento'].split('/')
         dados['data_recebimento'] = f"{data_parts[2]}-{data_parts[1]}-{data_parts[0]}"
 
-        extrato_id = db.inserir_recebimento(dados)
+        extrato_id = db.inserir_recebimento(dados, chave_idempotencia=request.headers.get('Idempotency-Key'))
+        publicar_alteracao(db.notas_do_recebimento(extrato_id))
 
         return jsonify({
             'success': True,
@@ -237,17 +709,91 @@ def registrar_recebimento():
             'extrato_id': extrato_id
         })
 
+    except ChaveIdempotenciaReutilizada as e:
+        return jsonify({'error': str(e)}), 422
     except Exception as e:
         return jsonify({'error': f'Erro ao registrar recebimento: {str(e)}'}), 500
 
 
-@app.route('/importar')
+@bp.route('/api/importar-extrato-bancario', methods=['POST'])
+def importar_extrato_bancario():
+    """Importa extrato bancário (OFX, CNAB 240/400, CSV) sugerindo as NFs de cada crédito
+
+    Com previa=1 só devolve as sugestões, sem gravar.
+    """
+    if 'file' not in request.files:
+        return jsonify({'error': 'Nenhum arquivo enviado'}), 400
+
+    file = request.files['file']
+
+    if file.filename == '':
+        return jsonify({'error': 'Arquivo vazio'}), 400
+
+    try:
+        from importar_extrato_bancario import ExtratoBancarioImporter
+
+        previa = request.form.get('previa') in ('1', 'true')
+        tolerancia = float(request.form.get('tolerancia', TOLERANCIA_PADRAO))
+
+        # Mantém a extensão: ela decide o formato (OFX/CSV)
+        extensao = os.path.splitext(secure_filename(file.filename))[1]
+        with tempfile.NamedTemporaryFile(delete=False, suffix=extensao) as tmp:
+            file.save(tmp.name)
+            tmp_path = tmp.name
+
+        try:
+            importer = ExtratoBancarioImporter(tmp_path, db=db, tolerancia=tolerancia,
+                                               nome_arquivo=file.filename)
+            resultado = importer.importar(aplicar=not previa)
+        finally:
+            os.remove(tmp_path)
+
+        if resultado['aplicado'] and resultado['notas_ids']:
+            publicar_alteracao(resultado['notas_ids'])
+
+        return jsonify({
+            'success': True,
+            **resultado
+        })
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Erro ao importar extrato bancário: {str(e)}'}), 500
+
+
+@bp.route('/api/sugerir-combinacoes')
+def api_sugerir_combinacoes():
+    """Combinações de NFs pendentes que somam o valor de um recebimento"""
+    try:
+        valor = request.args.get('valor', type=float)
+        if not valor or valor <= 0:
+            return jsonify({'error': 'Informe o valor recebido'}), 400
+
+        resultado = sugerir_combinacoes(
+            db.listar_pendentes(),
+            valor,
+            data_recebimento=request.args.get('data') or None,
+            tomador=request.args.get('tomador') or None,
+            tolerancia=request.args.get('tolerancia', TOLERANCIA_PADRAO, type=float)
+        )
+
+        return jsonify({
+            'success': True,
+            **resultado
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/importar')
 def importar_page():
     """Página de importação"""
     return render_template('importar.html')
 
 
-@app.route('/upload-excel', methods=['POST'])
+@bp.route('/upload-excel', methods=['POST'])
 def upload_excel():
     """Recebe arquivo Excel e importa dados"""
     if 'file' not in request.files:
@@ -270,7 +816,7 @@ def upload_excel():
 
         # Importa dados
         from importar_planilha import PlanilhaImporter
-        importer = PlanilhaImporter(tmp_path)
+        importer = PlanilhaImporter(tmp_path, db=db)
         resultado = importer.importar_tudo()
 
         # Remove arquivo temporário
@@ -303,19 +849,50 @@ def upload_excel():
         return jsonify({'error': f'Erro ao importar: {str(e)}'}), 500
 
 
-@app.route('/adiantar')
+@bp.route('/api/importar-planilhas', methods=['POST'])
+def importar_planilhas():
+    """Importa várias planilhas (campo 'files') em paralelo; relatório consolidado de rejeitadas/duplicadas"""
+    arquivos = [file for file in request.files.getlist('files') if file.filename]
+    if not arquivos:
+        return jsonify({'error': 'Nenhum arquivo enviado'}), 400
+    if not all(file.filename.endswith(('.xlsx', '.xlsm')) for file in arquivos):
+        return jsonify({'error': 'Apenas arquivos Excel (.xlsx, .xlsm) são permitidos'}), 400
+
+    caminhos = []
+    try:
+        from importar_lote import importar_planilhas as importar
+
+        for file in arquivos:
+            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as tmp:
+                file.save(tmp.name)
+                caminhos.append(tmp.name)
+
+        relatorio = importar(caminhos, db, processos=request.form.get('processos', type=int),
+                             nomes=[file.filename for file in arquivos])
+        return jsonify({'success': True, **relatorio})
+
+    except Exception as e:
+        return jsonify({'error': f'Erro ao importar planilhas: {str(e)}'}), 500
+    finally:
+        for caminho in caminhos:
+            os.remove(caminho)
+
+
+@bp.route('/adiantar')
 def adiantar_page():
     """Página de adiantamento de NFs"""
     return render_template('adiantar_nf.html')
 
 
-@app.route('/api/adiantar-nota', methods=['POST'])
+@bp.route('/api/adiantar-nota', methods=['POST'])
 def adiantar_nota():
     """Registra adiantamento de uma nota fiscal"""
     try:
         dados = request.json
 
-        resultado = db.adiantar_nota(dados['nota_id'], dados)
+        resultado = db.adiantar_nota(dados['nota_id'], dados,
+                                     chave_idempotencia=request.headers.get('Idempotency-Key'))
+        publicar_alteracao([dados['nota_id']], incluir_analise=True)
 
         return jsonify({
             'success': True,
@@ -323,25 +900,29 @@ def adiantar_nota():
             'dados': resultado
         })
 
+    except ChaveIdempotenciaReutilizada as e:
+        return jsonify({'error': str(e)}), 422
     except Exception as e:
         return jsonify({'error': f'Erro ao registrar adiantamento: {str(e)}'}), 500
 
 
-@app.route('/api/exportar/<tipo_relatorio>')
+@bp.route('/api/exportar/<tipo_relatorio>')
 def exportar_relatorio(tipo_relatorio):
     """Exporta relatório para Excel"""
     try:
         # Obtém dados do banco
-        dados = db.exportar_para_excel(tipo_relatorio)
+        dados = db.exportar_para_excel(tipo_relatorio, data_referencia=request.args.get('data'))
 
         if not dados:
             return jsonify({'error': 'Nenhum dado para exportar'}), 400
 
+        import pandas as pd
+
         # Cria DataFrame
         df = pd.DataFrame(dados)
 
         # Cria arquivo temporário
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp:
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp, medir('exportar_excel'):
             # Salva Excel
             with pd.ExcelWriter(tmp.name, engine='openpyxl') as writer:
                 df.to_excel(writer, index=False, sheet_name='Dados')
@@ -380,7 +961,8 @@ def exportar_relatorio(tipo_relatorio):
         return jsonify({'error': f'Erro ao exportar: {str(e)}'}), 500
 
 
-@app.route('/api/exportar-completo')
+@bp.route('/api/exportar-completo')
+@medir('exportar_completo')
 def exportar_completo():
     """Exporta planilha completa com abas NF'S e Extrato (formato original)"""
     try:
@@ -425,23 +1007,8 @@ def exportar_completo():
             cell.fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
             cell.alignment = Alignment(horizontal='center', vertical='center')
 
-        # Busca dados do banco
-        conn = sqlite3.connect(db.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            SELECT 
-                data_emissao, numero_nf, tipo, valor_bruto, localidade,
-                inss, iss, retencao_equatorial, tomador, pis_cofins_csll,
-                valor_nominal_conferencia, valor_nominal_calculado, 
-                valor_liquido_vinci, foi_adiantado, data_adiantamento,
-                percentual_adiantamento, valor_retido_vinci
-            FROM notas_fiscais
-            ORDER BY data_emissao, numero_nf
-        ''')
-
-        notas = cursor.fetchall()
+        # Busca dados do banco (em lotes, direto para a planilha)
+        notas = db.exportar_notas_completo()
 
         # Preenche dados
         for row_idx, nota in enumerate(notas, 2):
@@ -545,15 +1112,7 @@ def exportar_completo():
             cell.alignment = Alignment(horizontal='center', vertical='center')
 
         # Busca dados do extrato
-        cursor.execute('''
-            SELECT 
-                data_recebimento, valor_recebido, nfs_referentes,
-                tipo_recebimento, complemento
-            FROM extrato
-            ORDER BY data_recebimento
-        ''')
-
-        extratos = cursor.fetchall()
+        extratos = db.exportar_extrato_completo()
 
         # Preenche dados
         for row_idx, extrato in enumerate(extratos, 2):
@@ -571,8 +1130,6 @@ def exportar_completo():
         ws_extrato.column_dimensions['D'].width = 18
         ws_extrato.column_dimensions['E'].width = 50
 
-        conn.close()
-
         # Salva arquivo
         with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp:
             wb.save(tmp.name)
@@ -595,7 +1152,5 @@ def exportar_completo():
 
 
 if __name__ == '__main__':
-    # Cria pasta de uploads se não existir
-    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
+    app = create_app({'MIGRAR_NA_INICIALIZACAO': True})
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,279 @@
+"""
+Arquivo de PDFs - armazenamento endereçado por conteúdo (SHA-256)
+Arquivos comprimidos (zstd, ou gzip se zstandard não estiver instalado),
+distribuídos em subdiretórios e deduplicados; vinculados às notas por nf_metadados.pdf_sha256
+
+Uso:
+    python arquivo_pdf.py compactar --dias 30
+    python arquivo_pdf.py estatisticas
+"""
+import gzip
+import hashlib
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+TAMANHO_BLOCO = 64 * 1024
+RAIZ_PADRAO = 'arquivo_pdfs'
+
+
+def criar_estrutura(cursor):
+    """Cria a tabela de controle do arquivo de PDFs"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS arquivo_pdf (
+            sha256 TEXT PRIMARY KEY,
+            tamanho INTEGER NOT NULL,
+            tamanho_armazenado INTEGER NOT NULL,
+            compressao TEXT NOT NULL,
+            nome_original TEXT,
+            criado_em TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+class ArquivoPDF:
+    """Blob store local de PDFs, deduplicado pelo hash do conteúdo"""
+
+    EXTENSOES = {'zstd': '.pdf.zst', 'gzip': '.pdf.gz'}
+
+    def __init__(self, db, raiz=RAIZ_PADRAO):
+        self.db = db
+        self.raiz = raiz
+        self.compressao = 'zstd' if zstandard is not None else 'gzip'
+        os.makedirs(os.path.join(self.raiz, 'tmp'), exist_ok=True)
+
+    # ------------------------------------------------------------
+    # Caminhos e compressão
+    # ------------------------------------------------------------
+    def _caminho(self, sha256, compressao):
+        return os.path.join(self.raiz, sha256[:2], sha256[2:4], sha256 + self.EXTENSOES[compressao])
+
+    def localizar(self, sha256):
+        """Retorna (caminho, compressao) do blob ou (None, None) se não existir"""
+        for compressao in ('zstd', 'gzip'):
+            caminho = self._caminho(sha256, compressao)
+            if os.path.exists(caminho):
+                return caminho, compressao
+        return None, None
+
+    def existe(self, sha256):
+        return self.localizar(sha256)[0] is not None
+
+    def _escritor(self, destino, compressao):
+        if compressao == 'zstd':
+            return zstandard.ZstdCompressor(level=10).stream_writer(destino, closefd=False)
+        return gzip.GzipFile(fileobj=destino, mode='wb', compresslevel=9)
+
+    def _comprimir(self, origem, destino, compressao):
+        """Copia origem -> destino comprimindo; retorna (sha256, tamanho original)"""
+        sha = hashlib.sha256()
+        tamanho = 0
+        escritor = self._escritor(destino, compressao)
+        while True:
+            bloco = origem.read(TAMANHO_BLOCO)
+            if not bloco:
+                break
+            sha.update(bloco)
+            tamanho += len(bloco)
+            escritor.write(bloco)
+        escritor.close()
+        return sha.hexdigest(), tamanho
+
+    # ------------------------------------------------------------
+    # Escrita / leitura
+    # ------------------------------------------------------------
+    def guardar(self, caminho_pdf, nome_original=None):
+        """Guarda o PDF no arquivo (sem duplicar) e retorna o SHA-256 do conteúdo"""
+        with open(caminho_pdf, 'rb') as origem, tempfile.NamedTemporaryFile(
+                dir=os.path.join(self.raiz, 'tmp'), delete=False) as temporario:
+            sha256, tamanho = self._comprimir(origem, temporario, self.compressao)
+
+        # Mesmo conteúdo já arquivado: renova criado_em (a compactação não o trata como órfão
+        # antigo) e descarta a cópia. Sem registro, a compactação acabou de removê-lo: grava de novo
+        if self.existe(sha256) and self._renovar(sha256) and self.existe(sha256):
+            os.remove(temporario.name)
+            return sha256
+
+        destino = self._caminho(sha256, self.compressao)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.replace(temporario.name, destino)
+
+        self._registrar(sha256, tamanho, os.path.getsize(destino), self.compressao,
+                        nome_original or os.path.basename(caminho_pdf))
+        return sha256
+
+    def _registrar(self, sha256, tamanho, tamanho_armazenado, compressao, nome_original):
+        def gravar(cursor):
+            cursor.execute(f'''
+                INSERT INTO arquivo_pdf (sha256, tamanho, tamanho_armazenado, compressao, nome_original)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (sha256) DO UPDATE SET
+                    tamanho_armazenado = excluded.tamanho_armazenado,
+                    compressao = excluded.compressao,
+                    criado_em = {self.db.armazenamento.AGORA_UTC}
+            ''', (sha256, tamanho, tamanho_armazenado, compressao, nome_original))
+
+        self.db._executar_escrita(gravar)
+
+    def _renovar(self, sha256):
+        """Atualiza criado_em do PDF; False se ele não está registrado"""
+        def gravar(cursor):
+            cursor.execute(f'''
+                UPDATE arquivo_pdf SET criado_em = {self.db.armazenamento.AGORA_UTC} WHERE sha256 = ?
+            ''', (sha256,))
+            return cursor.rowcount > 0
+
+        return self.db._executar_escrita(gravar)
+
+    def abrir(self, sha256):
+        """Abre o PDF arquivado para leitura (stream já descomprimido)"""
+        caminho, compressao = self.localizar(sha256)
+        if caminho is None:
+            raise FileNotFoundError(f'PDF {sha256} não está no arquivo')
+
+        if compressao == 'zstd':
+            if zstandard is None:
+                raise RuntimeError('PDF comprimido com zstd, mas o pacote zstandard não está instalado')
+            return zstandard.ZstdDecompressor().stream_reader(open(caminho, 'rb'), closefd=True)
+        return gzip.open(caminho, 'rb')
+
+    def ler_em_blocos(self, sha256, tamanho_bloco=TAMANHO_BLOCO):
+        """Gerador para respostas em streaming (download)"""
+        with self.abrir(sha256) as arquivo:
+            while True:
+                bloco = arquivo.read(tamanho_bloco)
+                if not bloco:
+                    break
+                yield bloco
+
+    def ler(self, sha256):
+        with self.abrir(sha256) as arquivo:
+            return arquivo.read()
+
+    def listar(self):
+        """Itera os hashes de todos os PDFs arquivados"""
+        for raiz, _, arquivos in os.walk(self.raiz):
+            if os.path.basename(raiz) == 'tmp':
+                continue
+            for nome in arquivos:
+                if nome.endswith(('.pdf.zst', '.pdf.gz')):
+                    yield nome.split('.', 1)[0]
+
+    # ------------------------------------------------------------
+    # Retenção / compactação
+    # ------------------------------------------------------------
+    def compactar(self, dias_retencao=30):
+        """Remove órfãos antigos, recomprime gzip -> zstd e limpa temporários
+
+        Órfão = PDF sem nota vinculada (upload que nunca foi salvo) há mais de `dias_retencao` dias.
+        Seleção, exclusão dos registros e dos arquivos acontecem na mesma escrita, serializada
+        com o guardar() que renova criado_em de um PDF reenviado.
+        """
+        resultado = {'removidos': 0, 'recomprimidos': 0, 'temporarios': 0, 'bytes_liberados': 0}
+        limite = (datetime.utcnow() - timedelta(days=dias_retencao)).strftime('%Y-%m-%d %H:%M:%S')
+
+        def remover_orfaos(cursor):
+            cursor.execute('''
+                SELECT a.sha256
+                FROM arquivo_pdf a
+                WHERE a.criado_em < ?
+                AND NOT EXISTS (SELECT 1 FROM nf_metadados m WHERE m.pdf_sha256 = a.sha256)
+            ''', (limite,))
+            for (sha256,) in cursor.fetchall():
+                cursor.execute('DELETE FROM arquivo_pdf WHERE sha256 = ?', (sha256,))
+                caminho, _ = self.localizar(sha256)
+                if caminho:
+                    resultado['bytes_liberados'] += os.path.getsize(caminho)
+                    os.remove(caminho)
+                resultado['removidos'] += 1
+
+        self.db._executar_escrita(remover_orfaos)
+
+        if zstandard is not None:
+            conn = self.db._conectar()
+            cursor = conn.cursor()
+            cursor.execute("SELECT sha256 FROM arquivo_pdf WHERE compressao = 'gzip'")
+            gzipados = [row[0] for row in cursor.fetchall()]
+            conn.close()
+
+            recomprimidos = []
+            for sha256 in gzipados:
+                origem_caminho, compressao = self.localizar(sha256)
+                if compressao != 'gzip':
+                    continue
+                destino = self._caminho(sha256, 'zstd')
+                with gzip.open(origem_caminho, 'rb') as origem, open(destino, 'wb') as saida:
+                    self._comprimir(origem, saida, 'zstd')
+                tamanho_destino = os.path.getsize(destino)
+                resultado['bytes_liberados'] += os.path.getsize(origem_caminho) - tamanho_destino
+                os.remove(origem_caminho)
+                recomprimidos.append((tamanho_destino, sha256))
+
+            if recomprimidos:
+                self.db._executar_escrita(lambda cursor: cursor.executemany(
+                    "UPDATE arquivo_pdf SET compressao = 'zstd', tamanho_armazenado = ? WHERE sha256 = ?",
+                    recomprimidos
+                ))
+            resultado['recomprimidos'] = len(recomprimidos)
+
+        # Temporários de uploads interrompidos (mais de 1 hora)
+        pasta_tmp = os.path.join(self.raiz, 'tmp')
+        for nome in os.listdir(pasta_tmp):
+            caminho = os.path.join(pasta_tmp, nome)
+            if time.time() - os.path.getmtime(caminho) > 3600:
+                os.remove(caminho)
+                resultado['temporarios'] += 1
+
+        return resultado
+
+    def estatisticas(self):
+        conn = self.db._conectar()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT
+                COUNT(*) as arquivos,
+                COALESCE(SUM(tamanho), 0) as bytes_originais,
+                COALESCE(SUM(tamanho_armazenado), 0) as bytes_armazenados,
+                SUM(CASE WHEN EXISTS (SELECT 1 FROM nf_metadados m WHERE m.pdf_sha256 = a.sha256)
+                    THEN 0 ELSE 1 END) as sem_nota
+            FROM arquivo_pdf a
+        ''')
+        stats = dict(cursor.fetchone())
+        conn.close()
+
+        return stats
+
+
+if __name__ == '__main__':
+    import argparse
+    from database import Database
+
+    parser = argparse.ArgumentParser(description='Manutenção do arquivo de PDFs')
+    parser.add_argument('comando', choices=['compactar', 'estatisticas'])
+    parser.add_argument('--dias', type=int, default=30, help='Retenção de PDFs sem nota vinculada')
+    parser.add_argument('--raiz', default=RAIZ_PADRAO)
+    parser.add_argument('--db', default='sistema_nf.db')
+    args = parser.parse_args()
+
+    arquivo = ArquivoPDF(Database(args.db), raiz=args.raiz)
+
+    if args.comando == 'compactar':
+        resultado = arquivo.compactar(dias_retencao=args.dias)
+        print(f"🗑️  {resultado['removidos']} PDFs órfãos removidos")
+        print(f"🗜️  {resultado['recomprimidos']} PDFs recomprimidos com zstd")
+        print(f"🧹 {resultado['temporarios']} temporários removidos")
+        print(f"💾 {resultado['bytes_liberados'] / 1024 / 1024:.1f} MB liberados")
+    else:
+        stats = arquivo.estatisticas()
+        print(f"📄 {stats['arquivos']} PDFs arquivados ({stats['sem_nota'] or 0} sem nota)")
+        print(f"💾 {stats['bytes_originais'] / 1024 / 1024:.1f} MB originais -> "
+              f"{stats['bytes_armazenados'] / 1024 / 1024:.1f} MB armazenados")
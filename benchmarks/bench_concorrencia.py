@@ -0,0 +1,143 @@
+"""
+Benchmark de escritas concorrentes no SQLite
+
+Uso:
+    python benchmarks/bench_concorrencia.py --clientes 50 --operacoes 20 --notas 5000
+
+N clientes (threads) registram recebimentos ao mesmo tempo em três modos:
+    sem_espera  uma conexão por operação, sem busy timeout (disputa crua pela trava)
+    direto      uma conexão por operação, BEGIN IMMEDIATE + busy timeout
+    fila        fila de escrita (thread única, group commit) + pool de leitura
+Mede vazão (escritas/s), latência p50/p95/p99 por operação e erros ('database is locked').
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import gerar_dados
+from executar import silenciar
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+def executar_modo(modo, db_path, numeros_nf, clientes, operacoes):
+    import database
+    from database import Database
+
+    espera_original = database.TEMPO_ESPERA_TRAVA
+    if modo == 'sem_espera':
+        database.TEMPO_ESPERA_TRAVA = 0
+
+    db = Database(db_path)
+    if modo == 'fila':
+        db.ativar_fila_escrita()
+
+    latencias = []
+    erros = []
+    trava = threading.Lock()
+    largada = threading.Barrier(clientes)
+
+    def cliente(indice):
+        rnd = random.Random(indice)
+        minhas = []
+        meus_erros = []
+        largada.wait()
+        for _ in range(operacoes):
+            dados = {
+                'data_recebimento': '2024-06-10',
+                'valor_recebido': round(rnd.uniform(500, 50000), 2),
+                'nfs_referentes': rnd.choice(numeros_nf),
+                'tipo_recebimento': 'Integral',
+                'complemento': f'bench cliente {indice}'
+            }
+            inicio = time.perf_counter()
+            try:
+                db.inserir_recebimento(dados)
+            except Exception as e:
+                meus_erros.append(str(e))
+            minhas.append(time.perf_counter() - inicio)
+        with trava:
+            latencias.extend(minhas)
+            erros.extend(meus_erros)
+
+    threads = [threading.Thread(target=cliente, args=(i,)) for i in range(clientes)]
+    with silenciar():
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duracao = time.perf_counter() - inicio
+
+    lotes = db.fila_escrita.lotes if db.fila_escrita else None
+    db.encerrar_fila_escrita()
+    database.TEMPO_ESPERA_TRAVA = espera_original
+
+    total = clientes * operacoes
+    return {
+        'modo': modo,
+        'clientes': clientes,
+        'operacoes': total,
+        'gravadas': total - len(erros),
+        'erros': len(erros),
+        'exemplo_erro': erros[0] if erros else None,
+        'escritas_s': (total - len(erros)) / duracao,
+        'p50_ms': percentil(latencias, 50) * 1000,
+        'p95_ms': percentil(latencias, 95) * 1000,
+        'p99_ms': percentil(latencias, 99) * 1000,
+        'max_ms': max(latencias) * 1000,
+        'media_ms': statistics.mean(latencias) * 1000,
+        'lotes': lotes
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Escritas concorrentes: conexão por operação x fila de escrita')
+    parser.add_argument('--clientes', type=int, default=50)
+    parser.add_argument('--operacoes', type=int, default=20, help='Recebimentos registrados por cliente')
+    parser.add_argument('--notas', type=int, default=5000, help='Notas no banco antes do teste')
+    parser.add_argument('--modos', nargs='+', default=['sem_espera', 'direto', 'fila'])
+    args = parser.parse_args()
+
+    from database import Database
+
+    diretorio = tempfile.mkdtemp(prefix='bench_concorrencia_')
+    try:
+        base = os.path.join(diretorio, 'base.db')
+        print(f'📦 Gerando banco com {args.notas:,} notas...')
+        Database(base)
+        notas = gerar_dados.gerar_notas(args.notas)
+        gerar_dados.popular_banco(base, notas, gerar_dados.gerar_extrato(notas))
+        numeros_nf = [nota['numero_nf'] for nota in notas]
+
+        print(f'\n⚡ {args.clientes} clientes x {args.operacoes} recebimentos\n')
+        print(f"{'modo':<12} {'gravadas':>9} {'erros':>6} {'escritas/s':>11} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'lotes':>6}")
+        for modo in args.modos:
+            # Cada modo parte de uma cópia do mesmo banco
+            db_path = os.path.join(diretorio, f'{modo}.db')
+            shutil.copy(base, db_path)
+            r = executar_modo(modo, db_path, numeros_nf, args.clientes, args.operacoes)
+            print(f"{r['modo']:<12} {r['gravadas']:>9} {r['erros']:>6} {r['escritas_s']:>11.0f} "
+                  f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['max_ms']:>8.1f} "
+                  f"{r['lotes'] if r['lotes'] is not None else '-':>6}")
+            if r['exemplo_erro']:
+                print(f"             ❌ {r['exemplo_erro']}")
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
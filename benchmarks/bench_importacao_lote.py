@@ -0,0 +1,66 @@
+"""
+Benchmark da importação em lote de várias planilhas
+
+Uso:
+    python benchmarks/bench_importacao_lote.py --planilhas 4 --notas 5000 --processos 1 2 4
+
+Gera N planilhas regionais (números de NF distintos por planilha) e mede o tempo de
+importar_planilhas com cada quantidade de processos de leitura, sempre em um banco novo.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import gerar_dados
+from executar import silenciar
+
+
+def gerar_planilhas(diretorio, quantidade, notas_por_planilha):
+    caminhos = []
+    for indice in range(quantidade):
+        notas = gerar_dados.gerar_notas(notas_por_planilha, seed=100 + indice)
+        # Cada região com a sua faixa de números de NF
+        deslocamento = (indice + 1) * 1000000
+        for nota in notas:
+            nota['numero_nf'] = str(int(nota['numero_nf']) + deslocamento)
+        extrato = gerar_dados.gerar_extrato(notas, seed=100 + indice)
+        caminho = os.path.join(diretorio, f'regiao_{indice + 1}.xlsm')
+        gerar_dados.gerar_planilha(caminho, notas, extrato)
+        caminhos.append(caminho)
+    return caminhos
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Importação de várias planilhas: tempo por processos de leitura')
+    parser.add_argument('--planilhas', type=int, default=4)
+    parser.add_argument('--notas', type=int, default=5000, help='Notas por planilha')
+    parser.add_argument('--processos', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    from database import Database
+    from importar_lote import importar_planilhas
+
+    diretorio = tempfile.mkdtemp(prefix='bench_importacao_lote_')
+    try:
+        print(f'📥 Gerando {args.planilhas} planilhas com {args.notas:,} notas cada (núcleos: {os.cpu_count()})...')
+        caminhos = gerar_planilhas(diretorio, args.planilhas, args.notas)
+
+        print(f"\n{'processos':>9} {'leitura s':>10} {'escrita s':>10} {'total s':>9} {'notas':>8} {'receb.':>8}")
+        for processos in args.processos:
+            db_path = os.path.join(diretorio, f'lote_{processos}.db')
+            db = Database(db_path)
+            with silenciar():
+                r = importar_planilhas(caminhos, db, processos=processos)
+            print(f"{r['processos']:>9} {r['segundos_leitura']:>10.2f} {r['segundos_escrita']:>10.2f} "
+                  f"{r['segundos_total']:>9.2f} {r['notas_importadas']:>8,} {r['recebimentos_importados']:>8,}")
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark de inicialização a frio da aplicação Flask
+
+Uso:
+    python benchmarks/bench_startup.py --repeticoes 10
+
+Cada repetição roda em um processo Python novo (como um worker recém-criado) e mede:
+    importar       tempo de `import app`
+    criar_app      tempo de create_app() (banco já migrado)
+    1a_requisicao  tempo do primeiro POST /calcular
+    rss_mb         memória residente do processo depois da primeira requisição
+Também mostra quais bibliotecas pesadas (pandas, pdfplumber, openpyxl) ficaram carregadas.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BIBLIOTECAS_PESADAS = ('pandas', 'pdfplumber', 'openpyxl')
+
+# Roda no processo filho; imprime uma linha JSON com as medições
+WORKER = '''
+import json, sys, time
+sys.path.insert(0, {raiz!r})
+inicio = time.perf_counter()
+import app as app_module
+importar = time.perf_counter() - inicio
+
+inicio = time.perf_counter()
+if hasattr(app_module, 'create_app'):
+    aplicacao = app_module.create_app({{'DATABASE': {db_path!r}}})
+else:
+    aplicacao = app_module.app
+criar_app = time.perf_counter() - inicio
+
+inicio = time.perf_counter()
+resposta = aplicacao.test_client().post('/calcular', json={{'tipo': 'CONSTRUCAO', 'valor_bruto': 1000}})
+assert resposta.status_code == 200, resposta.data[:200]
+primeira = time.perf_counter() - inicio
+
+rss_kb = 0
+with open('/proc/self/status') as status:
+    for linha in status:
+        if linha.startswith('VmRSS:'):
+            rss_kb = int(linha.split()[1])
+
+print(json.dumps({{
+    'importar': importar,
+    'criar_app': criar_app,
+    '1a_requisicao': primeira,
+    'rss_mb': rss_kb / 1024,
+    'carregadas': [nome for nome in {pesadas!r} if nome in sys.modules]
+}}))
+'''
+
+
+def medir_worker(diretorio, db_path):
+    codigo = WORKER.format(raiz=RAIZ, db_path=db_path, pesadas=BIBLIOTECAS_PESADAS)
+    resultado = subprocess.run([sys.executable, '-c', codigo], cwd=diretorio,
+                               capture_output=True, text=True, check=True)
+    return json.loads(resultado.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tempo de inicialização e memória por worker')
+    parser.add_argument('--repeticoes', type=int, default=10)
+    args = parser.parse_args()
+
+    sys.path.insert(0, RAIZ)
+    from database import Database
+
+    diretorio = tempfile.mkdtemp(prefix='bench_startup_')
+    try:
+        # Banco migrado antes, como em produção (os workers só abrem o banco)
+        db_path = os.path.join(diretorio, 'sistema_nf.db')
+        Database(db_path)
+
+        # Primeira execução aquece o cache de bytecode e do sistema de arquivos
+        medir_worker(diretorio, db_path)
+        medicoes = [medir_worker(diretorio, db_path) for _ in range(args.repeticoes)]
+
+        print(f'\n🚀 Inicialização a frio ({args.repeticoes} processos)\n')
+        print(f"{'etapa':<14} {'mediana':>10} {'min':>10} {'max':>10}")
+        for etapa in ('importar', 'criar_app', '1a_requisicao'):
+            valores = [m[etapa] * 1000 for m in medicoes]
+            print(f'{etapa:<14} {statistics.median(valores):>8.1f}ms {min(valores):>8.1f}ms {max(valores):>8.1f}ms')
+        rss = [m['rss_mb'] for m in medicoes]
+        print(f"{'rss_mb':<14} {statistics.median(rss):>10.1f} {min(rss):>10.1f} {max(rss):>10.1f}")
+        carregadas = medicoes[-1]['carregadas']
+        print(f"\n📚 Bibliotecas pesadas carregadas: {', '.join(carregadas) if carregadas else 'nenhuma'}")
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+"""
+Suíte de benchmarks do pipeline de faturamento
+
+Uso:
+    python benchmarks/executar.py --tamanhos 10000 100000 1000000 --saida resultados.json
+    python benchmarks/executar.py --comparar resultados_anterior.json
+
+Os tempos são gravados em JSON (com o commit atual) para comparar regressões entre commits.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import gerar_dados
+
+
+def cronometrar(funcao, repeticoes):
+    """Executa `funcao` N vezes e retorna estatísticas dos tempos (segundos)"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+
+    return {
+        'repeticoes': repeticoes,
+        'min_s': min(tempos),
+        'mediana_s': statistics.median(tempos),
+        'media_s': statistics.mean(tempos),
+        'max_s': max(tempos)
+    }
+
+
+@contextlib.contextmanager
+def silenciar():
+    """Descarta os prints de progresso do código medido"""
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        yield
+
+
+def commit_atual():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_consultas(tamanho, repeticoes, diretorio, resultados):
+    """Consultas do dashboard, conciliação e exportação sobre um banco com `tamanho` notas"""
+    from database import Database
+
+    db_path = os.path.join(diretorio, f'bench_{tamanho}.db')
+    print(f'\n📦 Gerando banco com {tamanho:,} notas...')
+    db = Database(db_path)
+    notas = gerar_dados.gerar_notas(tamanho)
+    extrato = gerar_dados.gerar_extrato(notas)
+    gerar_dados.popular_banco(db_path, notas, extrato)
+    print(f'   {len(extrato):,} lançamentos de extrato')
+
+    def registrar(nome, medida, **extra):
+        medida.update({'nome': nome, 'tamanho': tamanho, **extra})
+        resultados.append(medida)
+        print(f'   ⏱️  {nome:<32} mediana {medida["mediana_s"] * 1000:10.1f} ms')
+
+    registrar('dashboard_recebimentos', cronometrar(db.dashboard_recebimentos, repeticoes))
+    registrar('listar_pendentes', cronometrar(db.listar_pendentes, repeticoes))
+
+    # Concilia lotes de recebimentos contra NFs aleatórias (desfeito com rollback)
+    rnd = random.Random(7)
+    lote = 100
+    amostra = [rnd.choice(notas)['numero_nf'] for _ in range(lote)]
+
+    def conciliar_lote():
+        conn = db._conectar()
+        cursor = conn.cursor()
+        with silenciar():
+            for numero_nf in amostra:
+                db._conciliar_recebimento(cursor, 0, {
+                    'nfs_referentes': numero_nf,
+                    'valor_recebido': 1000.0,
+                    'tipo_recebimento': 'Integral'
+                })
+        conn.rollback()
+        conn.close()
+
+    registrar('_conciliar_recebimento', cronometrar(conciliar_lote, repeticoes), operacoes=lote)
+
+    import app as app_module
+    cliente = app_module.create_app({'DATABASE': db_path}).test_client()
+
+    def exportar():
+        resposta = cliente.get('/api/exportar-completo')
+        assert resposta.status_code == 200, resposta.data[:200]
+        resposta.close()
+
+    registrar('exportar_completo', cronometrar(exportar, repeticoes))
+
+    os.remove(db_path)
+
+
+def bench_importacao(linhas, repeticoes, diretorio, resultados):
+    """PlanilhaImporter.importar_tudo sobre uma planilha .xlsm sintética"""
+    from database import Database
+    from importar_planilha import PlanilhaImporter
+
+    print(f'\n📥 Gerando planilha com {linhas:,} notas...')
+    notas = gerar_dados.gerar_notas(linhas, seed=11)
+    extrato = gerar_dados.gerar_extrato(notas, seed=11)
+    caminho = os.path.join(diretorio, 'bench.xlsm')
+    gerar_dados.gerar_planilha(caminho, notas, extrato)
+
+    def importar():
+        db_path = os.path.join(diretorio, 'bench_import.db')
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        importer = PlanilhaImporter(caminho)
+        importer.db = Database(db_path)
+        with silenciar():
+            importer.importar_tudo()
+
+    medida = cronometrar(importar, repeticoes)
+    medida.update({'nome': 'importar_tudo', 'tamanho': linhas})
+    resultados.append(medida)
+    print(f'   ⏱️  {"importar_tudo":<32} mediana {medida["mediana_s"] * 1000:10.1f} ms')
+
+
+def bench_extracao(quantidade, repeticoes, diretorio, resultados):
+    """NFExtractor (texto do PDF) x XMLExtractor sobre os mesmos documentos sintéticos (NFS-e e CT-e)"""
+    from ocr_extractor import NFExtractor
+    from xml_extractor import XMLExtractor
+
+    print(f'\n📄 Gerando {quantidade} PDFs e XMLs sintéticos...')
+    notas = gerar_dados.gerar_notas(quantidade, seed=3)
+    pdfs, xmls = [], []
+    for i, nota in enumerate(notas):
+        pdf = os.path.join(diretorio, f'nf_{i}.pdf')
+        xml = os.path.join(diretorio, f'nf_{i}.xml')
+        if i % 2:
+            gerar_dados.gerar_pdf_dacte(pdf, nota)
+            gerar_dados.gerar_xml_cte(xml, nota)
+        else:
+            gerar_dados.gerar_pdf_nfe(pdf, nota)
+            gerar_dados.gerar_xml_nfse(xml, nota)
+        pdfs.append(pdf)
+        xmls.append(xml)
+
+    medidas = {}
+    for nome, extractor, caminhos in (('NFExtractor.extract', NFExtractor, pdfs),
+                                      ('XMLExtractor.extract', XMLExtractor, xmls)):
+        def extrair():
+            for caminho in caminhos:
+                extractor(caminho).extract()
+
+        medida = cronometrar(extrair, repeticoes)
+        medida.update({'nome': nome, 'tamanho': quantidade, 'operacoes': quantidade})
+        resultados.append(medida)
+        medidas[nome] = medida
+        print(f'   ⏱️  {nome:<32} mediana {medida["mediana_s"] * 1000:10.1f} ms '
+              f'({quantidade / medida["mediana_s"]:.1f} docs/s)')
+
+    ganho = medidas['NFExtractor.extract']['mediana_s'] / medidas['XMLExtractor.extract']['mediana_s']
+    print(f'   🚀 XML {ganho:.0f}x mais rápido que o texto do PDF')
+
+
+def bench_combinacoes(pendentes, repeticoes, resultados, depositos=20):
+    """sugerir_combinacoes: depósitos que pagam 2 a 5 NFs do mesmo tomador, vencidas há até 30 dias"""
+    from conciliacao_automatica import sugerir_combinacoes
+
+    rnd = random.Random(pendentes)
+    notas = []
+    for i, nota in enumerate(gerar_dados.gerar_notas(pendentes, seed=pendentes, dias=180)):
+        vencimento = datetime.strptime(nota['data_emissao'], '%Y-%m-%d') + \
+            timedelta(days=gerar_dados.PRAZOS[nota['tipo']])
+        notas.append({
+            'id': i + 1,
+            'numero_nf': nota['numero_nf'],
+            'valor_liquido': nota['valor_liquido_vinci'] or nota['valor_nominal_calculado'],
+            'data_vencimento': vencimento.strftime('%Y-%m-%d'),
+            'tomador': nota['tomador']
+        })
+
+    # Cada depósito: data = vencimento da nota mais recente do grupo
+    casos = []
+    while len(casos) < depositos:
+        base = rnd.choice(notas)
+        limite = (datetime.strptime(base['data_vencimento'], '%Y-%m-%d') - timedelta(days=30)).strftime('%Y-%m-%d')
+        grupo = [n for n in notas if n['tomador'] == base['tomador']
+                 and limite <= n['data_vencimento'] <= base['data_vencimento'] and n is not base]
+        if len(grupo) < 4:
+            continue
+        pagas = [base] + rnd.sample(grupo, rnd.randint(1, 4))
+        casos.append((round(sum(n['valor_liquido'] for n in pagas), 2), base['data_vencimento'],
+                      {n['id'] for n in pagas}))
+
+    acertos = []
+
+    def sugerir():
+        acertos.clear()
+        for valor, data, ids in casos:
+            resultado = sugerir_combinacoes(notas, valor, data_recebimento=data)
+            acertos.append(any({n['id'] for n in c['notas']} == ids for c in resultado['combinacoes']))
+
+    medida = cronometrar(sugerir, repeticoes)
+    medida.update({'nome': 'sugerir_combinacoes', 'tamanho': pendentes, 'operacoes': depositos,
+                   'taxa_acerto': sum(acertos) / depositos})
+    resultados.append(medida)
+    print(f'   ⏱️  {"sugerir_combinacoes":<32} mediana {medida["mediana_s"] * 1000 / depositos:10.1f} ms/depósito '
+          f'({pendentes:,} pendentes, combinação certa no top 5 em {medida["taxa_acerto"]:.0%})')
+
+
+def bench_calculadora(operacoes, repeticoes, resultados):
+    """CalculadoraRetencoes.calcular_completo em laço"""
+    from calculadora_retencoes import CalculadoraRetencoes
+
+    tipos = gerar_dados.TIPOS
+
+    def calcular():
+        for i in range(operacoes):
+            CalculadoraRetencoes.calcular_completo(tipos[i % 4], 1000.0 + i, i % 3 == 0)
+
+    medida = cronometrar(calcular, repeticoes)
+    medida.update({'nome': 'CalculadoraRetencoes', 'tamanho': operacoes, 'operacoes': operacoes})
+    resultados.append(medida)
+    print(f'   ⏱️  {"CalculadoraRetencoes":<32} mediana {medida["mediana_s"] * 1000:10.1f} ms')
+
+
+def comparar(atual, caminho_base):
+    """Imprime a variação da mediana em relação a um arquivo de resultados anterior"""
+    with open(caminho_base, encoding='utf-8') as arquivo:
+        base = json.load(arquivo)
+
+    anteriores = {(r['nome'], r['tamanho']): r for r in base['resultados']}
+    print(f"\n{'=' * 60}")
+    print(f"COMPARAÇÃO COM {base.get('commit') or caminho_base}")
+    print(f"{'=' * 60}")
+    for r in atual['resultados']:
+        anterior = anteriores.get((r['nome'], r['tamanho']))
+        if not anterior:
+            continue
+        variacao = (r['mediana_s'] / anterior['mediana_s'] - 1) * 100 if anterior['mediana_s'] else 0
+        marcador = '🔴' if variacao > 10 else ('🟢' if variacao < -10 else '⚪')
+        print(f"{marcador} {r['nome']:<28} {r['tamanho']:>9,}  "
+              f"{anterior['mediana_s'] * 1000:10.1f} ms → {r['mediana_s'] * 1000:10.1f} ms ({variacao:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks do pipeline de faturamento')
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=[10000],
+                        help='Quantidade de notas no banco (ex.: 10000 100000 1000000)')
+    parser.add_argument('--linhas-planilha', type=int, default=2000,
+                        help='Notas na planilha usada em importar_tudo')
+    parser.add_argument('--pdfs', type=int, default=20, help='Quantidade de PDFs (e XMLs) sintéticos')
+    parser.add_argument('--pendentes', type=int, nargs='+', default=[200, 1000, 5000],
+                        help='Tamanhos do conjunto de notas pendentes para a busca de combinações')
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--saida', default=os.path.join(RAIZ, 'benchmarks', 'resultados.json'))
+    parser.add_argument('--comparar', help='Arquivo JSON de uma execução anterior')
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix='bench_nf_')
+    # app.py e PlanilhaImporter criam sistema_nf.db/uploads no diretório corrente
+    diretorio_original = os.getcwd()
+    os.chdir(diretorio)
+
+    resultados = []
+    try:
+        for tamanho in args.tamanhos:
+            bench_consultas(tamanho, args.repeticoes, diretorio, resultados)
+        bench_importacao(args.linhas_planilha, args.repeticoes, diretorio, resultados)
+        bench_extracao(args.pdfs, args.repeticoes, diretorio, resultados)
+        print('\n🧩 Combinações de NFs por depósito...')
+        for pendentes in args.pendentes:
+            bench_combinacoes(pendentes, args.repeticoes, resultados)
+        bench_calculadora(100000, args.repeticoes, resultados)
+    finally:
+        os.chdir(diretorio_original)
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    saida = {
+        'commit': commit_atual(),
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'resultados': resultados
+    }
+
+    with open(args.saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(saida, arquivo, indent=2, ensure_ascii=False)
+    print(f'\n💾 Resultados gravados em {args.saida}')
+
+    if args.comparar:
+        comparar(saida, args.comparar)
+
+
+if __name__ == '__main__':
+    main()
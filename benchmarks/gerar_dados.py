@@ -0,0 +1,348 @@
+"""
+Geradores de dados sintéticos para os benchmarks
+Notas fiscais, extrato, conciliação, PDFs (NF-e / DACTE), XMLs (NFS-e / CT-e) e planilhas .xlsm
+"""
+import os
+import random
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calculadora_retencoes import CalculadoraRetencoes
+
+TIPOS = ['CONSTRUCAO', 'ENSAIO DIELETRICO', 'TRANSPORTE', 'TRANSPORTE_CTE']
+PRAZOS = {'TRANSPORTE': 60, 'TRANSPORTE_CTE': 60, 'ENSAIO DIELETRICO': 30, 'CONSTRUCAO': 30}
+TOMADORES = ['CELPA', 'EQUATORIAL', 'CONECTA']
+LOCALIDADES = ['BELEM', 'ANANINDEUA', 'MARABA', 'SANTAREM', 'CASTANHAL', 'PARAGOMINAS', 'ALTAMIRA']
+
+# Nomes exatos das colunas da planilha original (com espaços à direita)
+COLUNA_VALOR_EXTRATO = 'Valor            '
+COLUNA_COMPLEMENTO_EXTRATO = 'Complemento' + ' ' * 139
+
+COLUNAS_NFS = [
+    'Data Emissão', 'Nº NF', 'Tipo', 'Valor Bruto', 'Localidade',
+    'Retenções Federais (INSS)', 'Alíquota INSS', 'ISS', 'Alíquota ISS',
+    'Retenção Equatorial', 'Tomador do Serviço', 'PIS/COFINS/CSLL',
+    'Valor Nominal Conferência', 'Valor Nominal (Vinci)', 'Valor Líquido Vinci',
+    'Data do adiantamento', '% de Adiantamento', 'Valor retido Vinci'
+]
+
+
+def gerar_notas(quantidade, seed=42, data_inicial=None, dias=1460):
+    """Gera notas fiscais sintéticas no formato aceito por Database.inserir_nota
+
+    Por padrão as emissões cobrem os últimos `dias` dias, para existirem notas
+    a receber, atrasadas e recebidas.
+    """
+    rnd = random.Random(seed)
+    if data_inicial:
+        inicio = datetime.strptime(data_inicial, '%Y-%m-%d')
+    else:
+        inicio = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=dias)
+    notas = []
+
+    for i in range(quantidade):
+        tipo = rnd.choice(TIPOS)
+        valor_bruto = round(rnd.uniform(500, 80000), 2)
+        pis_cofins_retido = rnd.random() < 0.3
+        calculo = CalculadoraRetencoes.calcular_completo(tipo, valor_bruto, pis_cofins_retido)
+        retencoes = calculo['retencoes']
+        data_emissao = inicio + timedelta(days=rnd.randrange(dias))
+
+        foi_adiantado = rnd.random() < 0.15
+        valor_liquido_vinci = None
+        valor_retido_vinci = None
+        percentual = None
+        data_adiantamento = None
+        if foi_adiantado:
+            percentual = rnd.uniform(1.5, 6.0)
+            valor_retido_vinci = round(calculo['valor_nominal'] * percentual / 100, 2)
+            valor_liquido_vinci = round(calculo['valor_nominal'] - valor_retido_vinci, 2)
+            data_adiantamento = (data_emissao + timedelta(days=rnd.randrange(1, 10))).strftime('%Y-%m-%d')
+
+        notas.append({
+            'data_emissao': data_emissao.strftime('%Y-%m-%d'),
+            'numero_nf': str(100000 + i),
+            'tipo': tipo,
+            'valor_bruto': valor_bruto,
+            'localidade': rnd.choice(LOCALIDADES),
+            'tomador': rnd.choice(TOMADORES),
+            'inss': round(retencoes['inss'], 2),
+            'iss': round(retencoes['iss'], 2),
+            'retencao_equatorial': round(retencoes['retencao_equatorial'], 2),
+            'pis_cofins_retido': pis_cofins_retido,
+            'pis_cofins_csll': round(retencoes['pis_cofins_csll'], 2),
+            'valor_nominal_conferencia': calculo['valor_nominal'],
+            'valor_nominal_calculado': calculo['valor_nominal'],
+            'valor_liquido_vinci': valor_liquido_vinci,
+            'foi_adiantado': foi_adiantado,
+            'data_adiantamento': data_adiantamento,
+            'valor_retido_vinci': valor_retido_vinci,
+            'percentual_adiantamento': percentual
+        })
+
+    return notas
+
+
+def gerar_extrato(notas, fracao_recebida=0.7, seed=42):
+    """Gera lançamentos de extrato para parte das notas (alguns agrupando várias NFs)"""
+    rnd = random.Random(seed)
+    recebidas = [n for n in notas if rnd.random() < fracao_recebida]
+    extrato = []
+
+    i = 0
+    while i < len(recebidas):
+        grupo = recebidas[i:i + rnd.choice([1, 1, 1, 2, 3])]
+        i += len(grupo)
+
+        valor = sum(n['valor_liquido_vinci'] or n['valor_nominal_conferencia'] for n in grupo)
+        ultima_emissao = max(n['data_emissao'] for n in grupo)
+        data = datetime.strptime(ultima_emissao, '%Y-%m-%d') + timedelta(days=rnd.randrange(20, 90))
+
+        extrato.append({
+            'data_recebimento': data.strftime('%Y-%m-%d'),
+            'valor_recebido': round(valor, 2),
+            'nfs_referentes': ', '.join(n['numero_nf'] for n in grupo),
+            'tipo_recebimento': 'Integral',
+            'complemento': f'TED {rnd.randrange(10 ** 8):08d} {grupo[0]["tomador"]}'
+        })
+
+    return extrato
+
+
+def popular_banco(db_path, notas, extrato):
+    """Carrega notas, extrato e conciliação diretamente via executemany
+
+    Muito mais rápido que Database.inserir_nota/inserir_recebimento para milhões de linhas;
+    o schema é criado antes por Database(db_path).
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    linhas_notas = []
+    for n in notas:
+        data_vencimento = (datetime.strptime(n['data_emissao'], '%Y-%m-%d')
+                           + timedelta(days=PRAZOS[n['tipo']])).strftime('%Y-%m-%d')
+        linhas_notas.append((
+            n['data_emissao'], n['numero_nf'], n['tipo'], n['valor_bruto'], n['localidade'], n['tomador'],
+            n['inss'], n['iss'], n['retencao_equatorial'], 1 if n['pis_cofins_retido'] else 0,
+            n['pis_cofins_csll'], n['valor_nominal_conferencia'], n['valor_nominal_calculado'],
+            n['valor_liquido_vinci'], 1 if n['foi_adiantado'] else 0, n['data_adiantamento'],
+            data_vencimento, PRAZOS[n['tipo']], n['valor_retido_vinci'], n['percentual_adiantamento']
+        ))
+
+    cursor.executemany('''
+        INSERT INTO notas_fiscais (
+            data_emissao, numero_nf, tipo, valor_bruto, localidade, tomador,
+            inss, iss, retencao_equatorial, pis_cofins_retido, pis_cofins_csll,
+            valor_nominal_conferencia, valor_nominal_calculado, valor_liquido_vinci,
+            foi_adiantado, data_adiantamento, data_vencimento, dias_para_receber,
+            valor_retido_vinci, percentual_adiantamento
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', linhas_notas)
+
+    # numero_nf é sequencial a partir de 100000, então o id é previsível
+    cursor.execute('SELECT MIN(id) FROM notas_fiscais WHERE numero_nf = ?', (notas[0]['numero_nf'],))
+    primeiro_id = cursor.fetchone()[0]
+    valores = {n['numero_nf']: (primeiro_id + i, n['valor_liquido_vinci'] or n['valor_nominal_conferencia'])
+               for i, n in enumerate(notas)}
+
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM extrato')
+    extrato_id = cursor.fetchone()[0]
+    linhas_extrato = []
+    linhas_conciliacao = []
+    linhas_vinculo = []
+    recebidas = []
+    for e in extrato:
+        extrato_id += 1
+        linhas_extrato.append((extrato_id, e['data_recebimento'], e['valor_recebido'], e['nfs_referentes'],
+                               e['tipo_recebimento'], e['complemento']))
+        for nf in e['nfs_referentes'].split(', '):
+            nota_id, valor = valores[nf]
+            linhas_conciliacao.append((nota_id, extrato_id, valor, e['tipo_recebimento']))
+            linhas_vinculo.append((extrato_id, nf, nota_id))
+            recebidas.append((nota_id,))
+
+    cursor.executemany('''
+        INSERT INTO extrato (id, data_recebimento, valor_recebido, nfs_referentes, tipo_recebimento, complemento)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', linhas_extrato)
+    cursor.executemany('''
+        INSERT INTO conciliacao (nota_fiscal_id, extrato_id, valor_conciliado, tipo_recebimento)
+        VALUES (?, ?, ?, ?)
+    ''', linhas_conciliacao)
+    cursor.executemany('''
+        INSERT INTO extrato_nf (extrato_id, numero_nf, nota_fiscal_id) VALUES (?, ?, ?)
+    ''', linhas_vinculo)
+    cursor.executemany("UPDATE notas_fiscais SET status_recebimento = 'RECEBIDO' WHERE id = ?", recebidas)
+
+    conn.commit()
+    conn.close()
+
+
+def gerar_planilha(caminho, notas, extrato):
+    """Gera uma planilha no layout da original (abas NF'S e Extrato)"""
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "NF'S"
+    ws.append(COLUNAS_NFS)
+    for n in notas:
+        ws.append([
+            datetime.strptime(n['data_emissao'], '%Y-%m-%d'), int(n['numero_nf']), n['tipo'], n['valor_bruto'],
+            n['localidade'], n['inss'], None, n['iss'], None, n['retencao_equatorial'], n['tomador'],
+            n['pis_cofins_csll'], n['valor_nominal_conferencia'], n['valor_nominal_calculado'],
+            n['valor_liquido_vinci'],
+            datetime.strptime(n['data_adiantamento'], '%Y-%m-%d') if n['data_adiantamento'] else None,
+            n['percentual_adiantamento'] / 100 if n['percentual_adiantamento'] else None,
+            n['valor_retido_vinci']
+        ])
+
+    ws_extrato = wb.create_sheet('Extrato')
+    ws_extrato.append(['Data', COLUNA_VALOR_EXTRATO, "NF'S", 'Tipo', COLUNA_COMPLEMENTO_EXTRATO])
+    for e in extrato:
+        ws_extrato.append([
+            datetime.strptime(e['data_recebimento'], '%Y-%m-%d'), e['valor_recebido'],
+            e['nfs_referentes'], e['tipo_recebimento'], e['complemento']
+        ])
+
+    wb.save(caminho)
+
+
+def _formatar_valor(valor):
+    """Formata 1234.5 como 1.234,50"""
+    return f'{valor:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.')
+
+
+def _escrever_pdf(caminho, linhas):
+    """Escreve um PDF mínimo (uma página, Helvetica) com as linhas de texto informadas"""
+    conteudo = ['BT', '/F1 10 Tf', '14 TL', '40 800 Td']
+    for linha in linhas:
+        texto = linha.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+        conteudo.append(f'({texto}) Tj T*')
+    conteudo.append('ET')
+    stream = '\n'.join(conteudo).encode('cp1252')
+
+    objetos = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+        b'/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        b'<< /Length ' + str(len(stream)).encode() + b' >>\nstream\n' + stream + b'\nendstream',
+    ]
+
+    saida = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for numero, objeto in enumerate(objetos, 1):
+        offsets.append(len(saida))
+        saida += f'{numero} 0 obj\n'.encode() + objeto + b'\nendobj\n'
+
+    inicio_xref = len(saida)
+    saida += f'xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n'.encode()
+    for offset in offsets:
+        saida += f'{offset:010d} 00000 n \n'.encode()
+    saida += f'trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n'.encode()
+
+    with open(caminho, 'wb') as arquivo:
+        arquivo.write(saida)
+
+
+def gerar_pdf_nfe(caminho, nota):
+    """PDF sintético de NFS-e (construção) com os campos que o NFExtractor procura"""
+    data = datetime.strptime(nota['data_emissao'], '%Y-%m-%d').strftime('%d/%m/%Y')
+    _escrever_pdf(caminho, [
+        'PREFEITURA MUNICIPAL DE BELEM',
+        'NOTA FISCAL DE SERVIÇOS ELETRÔNICA - NFS-e',
+        f'Nº {nota["numero_nf"]}',
+        f'emitida em: {data} 10:15:00',
+        'PRESTADOR: REZENDE ENERGIA LTDA',
+        'TOMADOR DE SERVIÇOS',
+        'Nome/Razão: CENTRAIS ELETRICAS DO PARA S.A.',
+        f'MUNICIPIO: {nota["localidade"]}',
+        'DISCRIMINAÇÃO DOS SERVIÇOS',
+        'CONSTRUÇÃO DE REDE DE DISTRIBUIÇÃO - PLPT',
+        'CONTRATO Nº 4600012345/2024',
+        'FOLHA DE REGISTRO 1234567890',
+        f'Valor dos serviços R$ {_formatar_valor(nota["valor_bruto"])}',
+        f'INSS R$ {_formatar_valor(nota["inss"])}',
+        f'Valor do imposto(ISS) R$ {_formatar_valor(nota["iss"])}',
+    ])
+
+
+def gerar_pdf_dacte(caminho, nota):
+    """PDF sintético de DACTE (CT-e) com os campos que o NFExtractor procura"""
+    data = datetime.strptime(nota['data_emissao'], '%Y-%m-%d').strftime('%d/%m/%Y')
+    _escrever_pdf(caminho, [
+        'DACTE - DOCUMENTO AUXILIAR DO CONHECIMENTO DE TRANSPORTE ELETRÔNICO',
+        'MODAL RODOVIARIO',
+        f'CT-E Nº DOCUMENTO: {nota["numero_nf"]}',
+        f'DATA E HORA DE EMISSÃO {data} 08:30:00',
+        'TOMADOR DO SERVIÇO EQUATORIAL PARA DISTRIBUIDORA DE ENERGIA S.A.',
+        f'MUNICÍPIO: {nota["localidade"]}',
+        f'VALOR TOTAL DO SERVIÇO R$ {_formatar_valor(nota["valor_bruto"])}',
+        f'VALOR TOTAL A RECEBER R$ {_formatar_valor(nota["valor_bruto"])}',
+    ])
+
+
+def gerar_xml_nfse(caminho, nota):
+    """XML sintético de NFS-e (layout ABRASF) equivalente ao PDF de gerar_pdf_nfe"""
+    conteudo = f'''<?xml version="1.0" encoding="UTF-8"?>
+<CompNfse xmlns="http://www.abrasf.org.br/nfse.xsd">
+  <Nfse versao="2.03">
+    <InfNfse Id="nfse{nota["numero_nf"]}">
+      <Numero>{nota["numero_nf"]}</Numero>
+      <DataEmissao>{nota["data_emissao"]}T10:15:00</DataEmissao>
+      <ValoresNfse><BaseCalculo>{nota["valor_bruto"]:.2f}</BaseCalculo></ValoresNfse>
+      <DeclaracaoPrestacaoServico>
+        <InfDeclaracaoPrestacaoServico>
+          <Servico>
+            <Valores>
+              <ValorServicos>{nota["valor_bruto"]:.2f}</ValorServicos>
+              <ValorInss>{nota["inss"]:.2f}</ValorInss>
+              <ValorIss>{nota["iss"]:.2f}</ValorIss>
+            </Valores>
+            <Discriminacao>CONSTRUÇÃO DE REDE DE DISTRIBUIÇÃO - PLPT CONTRATO Nº 4600012345/2024 FOLHA DE REGISTRO 1234567890</Discriminacao>
+          </Servico>
+          <Prestador><RazaoSocial>REZENDE ENERGIA LTDA</RazaoSocial></Prestador>
+          <TomadorServico>
+            <RazaoSocial>CENTRAIS ELETRICAS DO PARA S.A.</RazaoSocial>
+            <Endereco><Cidade>{nota["localidade"]}</Cidade></Endereco>
+          </TomadorServico>
+        </InfDeclaracaoPrestacaoServico>
+      </DeclaracaoPrestacaoServico>
+    </InfNfse>
+  </Nfse>
+</CompNfse>
+'''
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        arquivo.write(conteudo)
+
+
+def gerar_xml_cte(caminho, nota):
+    """XML sintético de CT-e equivalente ao PDF de gerar_pdf_dacte"""
+    conteudo = f'''<?xml version="1.0" encoding="UTF-8"?>
+<cteProc xmlns="http://www.portalfiscal.inf.br/cte" versao="4.00">
+  <CTe>
+    <infCte Id="CTe{nota["numero_nf"]}" versao="4.00">
+      <ide>
+        <nCT>{nota["numero_nf"]}</nCT>
+        <dhEmi>{nota["data_emissao"]}T08:30:00-03:00</dhEmi>
+        <xMunIni>{nota["localidade"]}</xMunIni>
+        <toma3><toma>3</toma></toma3>
+      </ide>
+      <emit><xNome>REZENDE ENERGIA LTDA</xNome></emit>
+      <dest><xNome>EQUATORIAL PARA DISTRIBUIDORA DE ENERGIA S.A.</xNome></dest>
+      <vPrest>
+        <vTPrest>{nota["valor_bruto"]:.2f}</vTPrest>
+        <vRec>{nota["valor_bruto"]:.2f}</vRec>
+      </vPrest>
+    </infCte>
+  </CTe>
+</cteProc>
+'''
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        arquivo.write(conteudo)
@@ -0,0 +1,351 @@
+"""
+Busca Textual - índices FTS5 (SQLite) ou tsvector + GIN (PostgreSQL) sobre notas fiscais e extrato
+Mantidos por triggers; consultas com prefixo e ordenação por relevância (bm25 / ts_rank)
+"""
+import re
+import sqlite3
+import unicodedata
+
+from armazenamento import criar_gatilho, dialeto, tabela_existe
+
+# Pesos bm25 por coluna de busca_notas (numero_nf, tomador, localidade, tipo, contrato, stm, requisicao, folhas)
+PESOS_NOTAS = (10.0, 2.0, 2.0, 1.0, 5.0, 5.0, 5.0, 3.0)
+# Pesos de busca_extrato (complemento, nfs_referentes, tipo_recebimento)
+PESOS_EXTRATO = (2.0, 5.0, 1.0)
+
+# PostgreSQL: pesos de ts_rank por classe {D, C, B, A}
+#   notas:   A numero_nf; B contrato, stm, requisicao; C folhas, tomador, localidade; D tipo
+#   extrato: B nfs_referentes; C complemento; D tipo_recebimento
+PESOS_TSVECTOR = '{0.1, 0.2, 0.5, 1.0}'
+
+# Texto indexado como no tokenizer do SQLite (unicode61 remove_diacritics): sem acentos,
+# minúsculo e quebrado em qualquer caractere que não seja letra ou número
+FUNCAO_TEXTO_BUSCA = r"""
+    CREATE OR REPLACE FUNCTION texto_busca(texto TEXT) RETURNS TEXT
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT lower(regexp_replace(
+            translate(COALESCE(texto, ''),
+                      'áàâãäéèêëíìîïóòôõöúùûüçñÁÀÂÃÄÉÈÊËÍÌÎÏÓÒÔÕÖÚÙÛÜÇÑ',
+                      'aaaaaeeeeiiiiooooouuuucnAAAAAEEEEIIIIOOOOOUUUUCN'),
+            '[^[:alnum:]]+', ' ', 'g'))
+    $$
+"""
+
+
+def _documento(campos):
+    """Expressão tsvector com peso por coluna ((coluna, peso), ...)"""
+    return ' || '.join(f"setweight(to_tsvector('simple', texto_busca({coluna})), '{peso}')"
+                       for coluna, peso in campos)
+
+
+DOCUMENTO_NOTAS = _documento((
+    ('n.numero_nf', 'A'), ('m.contrato', 'B'), ('m.stm', 'B'), ('m.requisicao', 'B'),
+    ('m.folhas_registro', 'C'), ('n.tomador', 'C'), ('n.localidade', 'C'), ('n.tipo', 'D'),
+))
+# Índice de expressão sobre o próprio extrato (a consulta repete a mesma expressão)
+DOCUMENTO_EXTRATO = _documento((
+    ('nfs_referentes', 'B'), ('complemento', 'C'), ('tipo_recebimento', 'D'),
+))
+
+
+def criar_estrutura(cursor):
+    """Cria tabelas FTS5, triggers de sincronização e popula a partir dos dados existentes
+
+    Requer notas_fiscais, extrato e nf_metadados já criadas.
+    """
+    if dialeto(cursor) == 'postgresql':
+        _criar_estrutura_postgres(cursor)
+        return
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE name IN ('busca_notas', 'busca_extrato')")
+    existentes = {row[0] for row in cursor.fetchall()}
+
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS busca_notas USING fts5(
+            numero_nf, tomador, localidade, tipo,
+            contrato, stm, requisicao, folhas_registro,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS busca_extrato USING fts5(
+            complemento, nfs_referentes, tipo_recebimento,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    ''')
+
+    # notas_fiscais -> busca_notas (rowid = id da nota)
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_busca_notas_insert
+        AFTER INSERT ON notas_fiscais
+        BEGIN
+            INSERT INTO busca_notas (rowid, numero_nf, tomador, localidade, tipo)
+            VALUES (NEW.id, NEW.numero_nf, NEW.tomador, NEW.localidade, NEW.tipo);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_busca_notas_update
+        AFTER UPDATE OF numero_nf, tomador, localidade, tipo ON notas_fiscais
+        BEGIN
+            UPDATE busca_notas
+            SET numero_nf = NEW.numero_nf, tomador = NEW.tomador,
+                localidade = NEW.localidade, tipo = NEW.tipo
+            WHERE rowid = NEW.id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_busca_notas_delete
+        AFTER DELETE ON notas_fiscais
+        BEGIN
+            DELETE FROM busca_notas WHERE rowid = OLD.id;
+        END
+    ''')
+
+    # nf_metadados -> colunas extras de busca_notas
+    for evento, linha in (('INSERT', 'NEW'), ('UPDATE', 'NEW')):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_busca_metadados_{evento.lower()}
+            AFTER {evento} ON nf_metadados
+            BEGIN
+                UPDATE busca_notas
+                SET contrato = {linha}.contrato, stm = {linha}.stm,
+                    requisicao = {linha}.requisicao, folhas_registro = {linha}.folhas_registro
+                WHERE rowid = {linha}.nota_fiscal_id;
+            END
+        ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_busca_metadados_delete
+        AFTER DELETE ON nf_metadados
+        BEGIN
+            UPDATE busca_notas
+            SET contrato = NULL, stm = NULL, requisicao = NULL, folhas_registro = NULL
+            WHERE rowid = OLD.nota_fiscal_id;
+        END
+    ''')
+
+    # extrato -> busca_extrato (rowid = id do lançamento)
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_busca_extrato_insert
+        AFTER INSERT ON extrato
+        BEGIN
+            INSERT INTO busca_extrato (rowid, complemento, nfs_referentes, tipo_recebimento)
+            VALUES (NEW.id, NEW.complemento, NEW.nfs_referentes, NEW.tipo_recebimento);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_busca_extrato_update
+        AFTER UPDATE OF complemento, nfs_referentes, tipo_recebimento ON extrato
+        BEGIN
+            UPDATE busca_extrato
+            SET complemento = NEW.complemento, nfs_referentes = NEW.nfs_referentes,
+                tipo_recebimento = NEW.tipo_recebimento
+            WHERE rowid = NEW.id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_busca_extrato_delete
+        AFTER DELETE ON extrato
+        BEGIN
+            DELETE FROM busca_extrato WHERE rowid = OLD.id;
+        END
+    ''')
+
+    if 'busca_notas' not in existentes:
+        cursor.execute('''
+            INSERT INTO busca_notas (
+                rowid, numero_nf, tomador, localidade, tipo,
+                contrato, stm, requisicao, folhas_registro
+            )
+            SELECT n.id, n.numero_nf, n.tomador, n.localidade, n.tipo,
+                m.contrato, m.stm, m.requisicao, m.folhas_registro
+            FROM notas_fiscais n
+            LEFT JOIN nf_metadados m ON m.nota_fiscal_id = n.id
+        ''')
+    if 'busca_extrato' not in existentes:
+        cursor.execute('''
+            INSERT INTO busca_extrato (rowid, complemento, nfs_referentes, tipo_recebimento)
+            SELECT id, complemento, nfs_referentes, tipo_recebimento FROM extrato
+        ''')
+
+
+def _criar_estrutura_postgres(cursor):
+    """busca_notas (tsvector por nota, reindexada por triggers) e índice GIN de expressão no extrato"""
+    busca_notas_existia = tabela_existe(cursor, 'busca_notas')
+
+    cursor.execute(FUNCAO_TEXTO_BUSCA)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS busca_notas (
+            nota_fiscal_id INTEGER PRIMARY KEY,
+            documento TSVECTOR NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_busca_notas_documento ON busca_notas USING GIN (documento)')
+
+    # Documento da nota montado de notas_fiscais + nf_metadados; some se a nota não existe mais
+    cursor.execute(f'''
+        CREATE OR REPLACE FUNCTION busca_indexar_nota(id_nota INTEGER) RETURNS VOID
+        LANGUAGE sql AS $$
+            DELETE FROM busca_notas WHERE nota_fiscal_id = id_nota;
+            INSERT INTO busca_notas (nota_fiscal_id, documento)
+            SELECT n.id, {DOCUMENTO_NOTAS}
+            FROM notas_fiscais n
+            LEFT JOIN nf_metadados m ON m.nota_fiscal_id = n.id
+            WHERE n.id = id_nota;
+        $$
+    ''')
+    criar_gatilho(cursor, 'trg_busca_notas',
+                  'AFTER INSERT OR DELETE OR UPDATE OF numero_nf, tomador, localidade, tipo ON notas_fiscais',
+                  'PERFORM busca_indexar_nota(COALESCE(NEW.id, OLD.id));')
+    criar_gatilho(cursor, 'trg_busca_metadados', 'AFTER INSERT OR UPDATE OR DELETE ON nf_metadados',
+                  'PERFORM busca_indexar_nota(COALESCE(NEW.nota_fiscal_id, OLD.nota_fiscal_id));')
+
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_busca_extrato ON extrato USING GIN (({DOCUMENTO_EXTRATO}))')
+
+    if not busca_notas_existia:
+        cursor.execute(f'''
+            INSERT INTO busca_notas (nota_fiscal_id, documento)
+            SELECT n.id, {DOCUMENTO_NOTAS}
+            FROM notas_fiscais n
+            LEFT JOIN nf_metadados m ON m.nota_fiscal_id = n.id
+        ''')
+
+
+def montar_consulta_fts(texto):
+    """Converte o texto digitado em consulta FTS5 com prefixo em cada termo
+
+    'celpa 4600' -> '"celpa"* "4600"*' (todos os termos, cada um como prefixo)
+    """
+    termos = re.findall(r'\w+', texto or '')
+    return ' '.join(f'"{termo}"*' for termo in termos)
+
+
+def _termos(texto):
+    """Palavras sem acento e em minúsculas, como texto_busca() as indexa no PostgreSQL"""
+    sem_acentos = ''.join(c for c in unicodedata.normalize('NFKD', texto or '') if not unicodedata.combining(c))
+    return re.findall(r'[^\W_]+', sem_acentos.lower())
+
+
+def montar_consulta_tsquery(texto):
+    """Mesma consulta para to_tsquery('simple', ...), sem acentos como o documento indexado
+
+    'Celpa Belém' -> "'celpa':* & 'belem':*"
+    """
+    return ' & '.join(f"'{termo}':*" for termo in _termos(texto))
+
+
+def montar_trecho(texto, termos, palavras=10):
+    """Trecho de até `palavras` palavras com os termos entre [ ], como snippet() do FTS5
+
+    Feito aqui porque ts_headline compara o texto com acento ('Depósito') e não
+    destacaria a palavra encontrada pela consulta sem acento ('deposito').
+    """
+    partes = (texto or '').split()
+    encontradas = [i for i, parte in enumerate(partes)
+                   if any(t.startswith(termo) for t in _termos(parte) for termo in termos)]
+    inicio = max(0, min(encontradas[0] if encontradas else 0, len(partes) - palavras))
+    janela = [f'[{parte}]' if inicio + i in encontradas else parte
+              for i, parte in enumerate(partes[inicio:inicio + palavras])]
+    return ('…' if inicio > 0 else '') + ' '.join(janela) + ('…' if inicio + palavras < len(partes) else '')
+
+
+class BuscaTextual:
+    """Busca por relevância em notas fiscais e lançamentos do extrato"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def buscar(self, texto, limite=50, escopo='tudo'):
+        """Retorna {'notas': [...], 'extrato': [...]} ordenados por relevância"""
+        if self.db.armazenamento.nome == 'postgresql':
+            return self._buscar_postgres(texto, limite, escopo)
+
+        consulta = montar_consulta_fts(texto)
+        resultado = {'notas': [], 'extrato': []}
+        if not consulta:
+            return resultado
+
+        conn = self.db._conectar()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+
+        if escopo in ('tudo', 'notas'):
+            cursor.execute(f'''
+                SELECT
+                    n.id, n.numero_nf, n.data_emissao, n.tipo, n.valor_bruto,
+                    n.tomador, n.localidade, n.data_vencimento, n.status_recebimento,
+                    b.contrato, b.stm, b.requisicao, b.folhas_registro,
+                    bm25(busca_notas, {', '.join(map(str, PESOS_NOTAS))}) as relevancia
+                FROM busca_notas b
+                JOIN notas_fiscais n ON n.id = b.rowid
+                WHERE busca_notas MATCH ?
+                ORDER BY relevancia
+                LIMIT ?
+            ''', (consulta, limite))
+            resultado['notas'] = [dict(row) for row in cursor.fetchall()]
+
+        if escopo in ('tudo', 'extrato'):
+            cursor.execute(f'''
+                SELECT
+                    e.id, e.data_recebimento, e.valor_recebido, e.nfs_referentes,
+                    e.tipo_recebimento, e.complemento, e.foi_adiantado,
+                    snippet(busca_extrato, 0, '[', ']', '…', 10) as trecho,
+                    bm25(busca_extrato, {', '.join(map(str, PESOS_EXTRATO))}) as relevancia
+                FROM busca_extrato b
+                JOIN extrato e ON e.id = b.rowid
+                WHERE busca_extrato MATCH ?
+                ORDER BY relevancia
+                LIMIT ?
+            ''', (consulta, limite))
+            resultado['extrato'] = [dict(row) for row in cursor.fetchall()]
+
+        conn.close()
+
+        return resultado
+
+    def _buscar_postgres(self, texto, limite, escopo):
+        """buscar() com tsvector: mesmas colunas, relevância = -ts_rank (menor é melhor, como bm25)"""
+        consulta = montar_consulta_tsquery(texto)
+        resultado = {'notas': [], 'extrato': []}
+        if not consulta:
+            return resultado
+
+        conn = self.db._conectar()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+
+        if escopo in ('tudo', 'notas'):
+            cursor.execute(f'''
+                SELECT
+                    n.id, n.numero_nf, n.data_emissao, n.tipo, n.valor_bruto,
+                    n.tomador, n.localidade, n.data_vencimento, n.status_recebimento,
+                    m.contrato, m.stm, m.requisicao, m.folhas_registro,
+                    -ts_rank('{PESOS_TSVECTOR}', b.documento, q) as relevancia
+                FROM to_tsquery('simple', ?) q
+                JOIN busca_notas b ON b.documento @@ q
+                JOIN notas_fiscais n ON n.id = b.nota_fiscal_id
+                LEFT JOIN nf_metadados m ON m.nota_fiscal_id = n.id
+                ORDER BY relevancia
+                LIMIT ?
+            ''', (consulta, limite))
+            resultado['notas'] = [dict(row) for row in cursor.fetchall()]
+
+        if escopo in ('tudo', 'extrato'):
+            cursor.execute(f'''
+                SELECT
+                    e.id, e.data_recebimento, e.valor_recebido, e.nfs_referentes,
+                    e.tipo_recebimento, e.complemento, e.foi_adiantado,
+                    -ts_rank('{PESOS_TSVECTOR}', {DOCUMENTO_EXTRATO}, q) as relevancia
+                FROM to_tsquery('simple', ?) q
+                JOIN extrato e ON {DOCUMENTO_EXTRATO} @@ q
+                ORDER BY relevancia
+                LIMIT ?
+            ''', (consulta, limite))
+            termos = _termos(texto)
+            resultado['extrato'] = [
+                {**dict(row), 'trecho': montar_trecho(row['complemento'], termos)} for row in cursor.fetchall()
+            ]
+
+        conn.close()
+
+        return resultado
@@ -0,0 +1,264 @@
+"""
+Conciliação Automática - sugere as NFs de cada lançamento do extrato bancário
+Índice ordenado dos valores esperados das notas pendentes (busca binária com tolerância)
+e combinações de notas pagas em um único depósito (meet-in-the-middle com limite de tempo)
+"""
+import re
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+from database import normalizar_numero_nf
+
+# Diferença aceita entre o valor recebido e o valor esperado da NF (centavos de arredondamento)
+TOLERANCIA_PADRAO = 0.05
+
+# Busca de combinações (depósito que paga várias NFs)
+MAX_NOTAS_COMBINACAO = 6
+MAX_CANDIDATOS_AMPLO = 300
+MAX_CANDIDATOS = 40
+JANELA_VENCIDAS_DIAS = 120
+JANELA_A_VENCER_DIAS = 15
+TEMPO_LIMITE = 0.5
+
+
+def _centavos(valor):
+    return int(round(valor * 100))
+
+
+class IndiceValoresPendentes:
+    """Notas pendentes ordenadas pelo valor esperado
+
+    Cada consulta custa O(log n + k) (k = notas dentro da tolerância), então um
+    extrato com milhares de linhas é conciliado em uma passada, sem laço aninhado.
+    Uma nota sugerida para um lançamento não é sugerida de novo para outro.
+    """
+
+    def __init__(self, notas, tolerancia=TOLERANCIA_PADRAO):
+        """
+        Args:
+            notas: Linhas de Database.listar_pendentes() (id, numero_nf, valor_liquido, data_vencimento, ...)
+            tolerancia: Diferença máxima em reais entre recebido e esperado
+        """
+        self.notas = sorted(notas, key=lambda n: n['valor_liquido'] or 0)
+        self.valores = [_centavos(n['valor_liquido'] or 0) for n in self.notas]
+        self.por_numero = {normalizar_numero_nf(n['numero_nf']): n for n in self.notas}
+        self.tolerancia = _centavos(tolerancia)
+        self.usadas = set()
+
+    def candidatos(self, valor):
+        """Notas ainda livres com valor esperado dentro da tolerância"""
+        alvo = _centavos(valor)
+        inicio = bisect_left(self.valores, alvo - self.tolerancia)
+        fim = bisect_right(self.valores, alvo + self.tolerancia)
+        return [nota for nota in self.notas[inicio:fim] if nota['id'] not in self.usadas]
+
+    def _por_referencia(self, texto):
+        """NF pendente citada no histórico/documento do lançamento"""
+        for numero in re.findall(r'\d{3,}', texto or ''):
+            nota = self.por_numero.get(normalizar_numero_nf(numero))
+            if nota and nota['id'] not in self.usadas:
+                return nota
+        return None
+
+    def sugerir(self, lancamento):
+        """Sugere a NF de um lançamento e a reserva; None se nenhuma servir
+
+        Ordem: NF citada no texto do lançamento; depois valor mais próximo
+        (empate: vencimento mais antigo).
+        """
+        valor = lancamento['valor_recebido']
+
+        nota = self._por_referencia(f"{lancamento.get('documento_banco', '')} {lancamento.get('complemento', '')}")
+        motivo = 'referencia'
+        alternativas = 0
+
+        if nota is None:
+            candidatos = self.candidatos(valor)
+            if not candidatos:
+                return None
+            alvo = _centavos(valor)
+            nota = min(candidatos, key=lambda n: (abs(_centavos(n['valor_liquido']) - alvo),
+                                                   n['data_vencimento'] or '9999-12-31'))
+            motivo = 'valor'
+            alternativas = len(candidatos) - 1
+
+        self.usadas.add(nota['id'])
+        return {
+            'nota_id': nota['id'],
+            'numero_nf': normalizar_numero_nf(nota['numero_nf']),
+            'tomador': nota.get('tomador'),
+            'valor_esperado': nota['valor_liquido'],
+            'diferenca': round(valor - nota['valor_liquido'], 2),
+            'motivo': motivo,
+            'alternativas': alternativas
+        }
+
+
+def sugerir_nfs(lancamentos, notas_pendentes, tolerancia=TOLERANCIA_PADRAO):
+    """Preenche 'nfs_referentes' e 'sugestao' de cada lançamento (lista alterada no lugar)"""
+    indice = IndiceValoresPendentes(notas_pendentes, tolerancia)
+
+    for lancamento in lancamentos:
+        sugestao = indice.sugerir(lancamento)
+        lancamento['sugestao'] = sugestao
+        lancamento['nfs_referentes'] = sugestao['numero_nf'] if sugestao else ''
+
+    return lancamentos
+
+
+class _TempoEsgotado(Exception):
+    pass
+
+
+def _somas_subconjuntos(valores, limite, max_itens, prazo):
+    """(soma, índices) de todos os subconjuntos com até max_itens itens e soma <= limite
+
+    valores em ordem crescente: ao passar do limite, o resto do ramo é descartado.
+    """
+    somas = []
+    contador = [0]
+
+    def descer(inicio, soma, escolhidos):
+        somas.append((soma, tuple(escolhidos)))
+        contador[0] += 1
+        if contador[0] % 4096 == 0 and time.perf_counter() > prazo:
+            raise _TempoEsgotado()
+        if len(escolhidos) == max_itens:
+            return
+        for i in range(inicio, len(valores)):
+            nova_soma = soma + valores[i]
+            if nova_soma > limite:
+                break
+            escolhidos.append(i)
+            descer(i + 1, nova_soma, escolhidos)
+            escolhidos.pop()
+
+    descer(0, 0, [])
+    return somas
+
+
+def _combinar_grupo(notas, alvo, tolerancia, min_notas, max_notas, prazo, encontradas, vistas):
+    """Meet-in-the-middle em um grupo de notas (mesmo tomador); acrescenta em `encontradas`
+
+    Cada lado é um subconjunto de até ceil(max_notas / 2) notas do grupo; dois lados
+    disjuntos cuja soma cai na tolerância formam uma combinação. Os lados ficam
+    ordenados pela soma e cada par é visto uma vez só (soma do 2º >= soma do 1º).
+    """
+    notas = sorted(notas, key=lambda n: n['valor_liquido'])
+    valores = [_centavos(n['valor_liquido']) for n in notas]
+    limite = alvo + tolerancia
+
+    lados = _somas_subconjuntos(valores, limite, (max_notas + 1) // 2, prazo)
+    lados.sort()
+    somas = [soma for soma, _ in lados]
+
+    for posicao, (soma_a, indices_a) in enumerate(lados):
+        if posicao % 4096 == 0 and time.perf_counter() > prazo:
+            raise _TempoEsgotado()
+        if soma_a * 2 > limite:
+            break
+
+        inicio = max(bisect_left(somas, alvo - tolerancia - soma_a), posicao)
+        fim = bisect_right(somas, limite - soma_a)
+        for soma_b, indices_b in lados[inicio:fim]:
+            if not min_notas <= len(indices_a) + len(indices_b) <= max_notas:
+                continue
+            if set(indices_a) & set(indices_b):
+                continue
+            escolhidas = [notas[i] for i in indices_a + indices_b]
+            chave = frozenset(n['id'] for n in escolhidas)
+            if chave not in vistas:
+                vistas.add(chave)
+                encontradas.append((soma_a + soma_b, escolhidas))
+
+
+def sugerir_combinacoes(notas_pendentes, valor, data_recebimento=None, tomador=None,
+                        tolerancia=TOLERANCIA_PADRAO, max_notas=MAX_NOTAS_COMBINACAO,
+                        limite_sugestoes=5, tempo_limite=TEMPO_LIMITE):
+    """Combinações de notas pendentes cuja soma dos valores esperados bate com o valor recebido
+
+    Poda antes da busca: mesmo tomador (um depósito vem de um pagador só), vencimento
+    dentro da janela em torno da data do recebimento e valor menor que o recebido.
+    Combinações de até 4 notas usam todo o grupo (até MAX_CANDIDATOS_AMPLO notas); as
+    de 5 ou mais, só as MAX_CANDIDATOS com vencimento mais próximo da data.
+
+    Args:
+        notas_pendentes: Linhas de Database.listar_pendentes()
+        valor: Valor recebido
+        data_recebimento: 'YYYY-MM-DD' (padrão: hoje)
+        tomador: Restringe a um tomador
+        tempo_limite: Segundos; ao estourar devolve o que já encontrou (completo=False)
+
+    Returns:
+        dict com 'combinacoes' (melhores primeiro), 'completo', 'candidatos' e 'tempo_ms'
+    """
+    inicio_busca = time.perf_counter()
+    prazo = inicio_busca + tempo_limite
+    alvo = _centavos(valor)
+    tolerancia_centavos = _centavos(tolerancia)
+
+    data = datetime.strptime(data_recebimento, '%Y-%m-%d') if data_recebimento else datetime.now()
+    vencimento_minimo = (data - timedelta(days=JANELA_VENCIDAS_DIAS)).strftime('%Y-%m-%d')
+    vencimento_maximo = (data + timedelta(days=JANELA_A_VENCER_DIAS)).strftime('%Y-%m-%d')
+    data_texto = data.strftime('%Y-%m-%d')
+
+    grupos = {}
+    for nota in notas_pendentes:
+        if tomador and nota.get('tomador') != tomador:
+            continue
+        if not nota['valor_liquido'] or _centavos(nota['valor_liquido']) > alvo + tolerancia_centavos:
+            continue
+        vencimento = nota.get('data_vencimento') or ''
+        if not vencimento_minimo <= vencimento <= vencimento_maximo:
+            continue
+        grupos.setdefault(nota.get('tomador') or '', []).append(nota)
+
+    def distancia_vencimento(nota):
+        return abs((datetime.strptime(nota['data_vencimento'], '%Y-%m-%d') - data).days)
+
+    for chave, notas in grupos.items():
+        grupos[chave] = sorted(notas, key=distancia_vencimento)[:MAX_CANDIDATOS_AMPLO]
+
+    encontradas = []
+    vistas = set()
+    completo = True
+    try:
+        # Grupos menores primeiro: terminam mesmo que o tempo acabe nos maiores
+        for notas in sorted(grupos.values(), key=len):
+            _combinar_grupo(notas, alvo, tolerancia_centavos, 1, min(max_notas, 4),
+                            prazo, encontradas, vistas)
+        if max_notas > 4:
+            for notas in sorted(grupos.values(), key=len):
+                _combinar_grupo(notas[:MAX_CANDIDATOS], alvo, tolerancia_centavos, 5, max_notas,
+                                prazo, encontradas, vistas)
+    except _TempoEsgotado:
+        completo = False
+
+    def ordem(encontrada):
+        soma, notas = encontrada
+        return (abs(soma - alvo), len(notas), sum(distancia_vencimento(n) for n in notas))
+
+    combinacoes = []
+    for soma, notas in sorted(encontradas, key=ordem)[:limite_sugestoes]:
+        notas = sorted(notas, key=lambda n: n['numero_nf'])
+        combinacoes.append({
+            'nfs_referentes': ', '.join(normalizar_numero_nf(n['numero_nf']) for n in notas),
+            'tomador': notas[0].get('tomador'),
+            'total': soma / 100,
+            'diferenca': round(valor - soma / 100, 2),
+            'notas': [{
+                'id': n['id'],
+                'numero_nf': n['numero_nf'],
+                'valor_liquido': n['valor_liquido'],
+                'data_vencimento': n['data_vencimento']
+            } for n in notas]
+        })
+
+    return {
+        'data_recebimento': data_texto,
+        'combinacoes': combinacoes,
+        'completo': completo,
+        'candidatos': sum(len(notas) for notas in grupos.values()),
+        'tempo_ms': round((time.perf_counter() - inicio_busca) * 1000, 1)
+    }
@@ -1,18 +1,189 @@
 import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 import json
+from armazenamento import criar_armazenamento, criar_gatilho, tabela_existe
+import resumos
+import busca
+import arquivo_pdf
+import idempotencia
+import ledger
+import fechamento
+import migracoes
+from adiantamentos import calcular_custo
+from fila_escrita import FilaEscrita, PoolLeitura, MAX_LOTE, CONEXOES_LEITURA
+
+
+def normalizar_numero_nf(numero):
+    """Normaliza o número da NF ('1234.0' -> '1234')"""
+    return str(numero).replace('.0', '').strip()
+
+
+def _copiar(valor):
+    """Cópia de resultados de consulta (listas de linhas planas e dicts de totais)"""
+    if isinstance(valor, list):
+        return [dict(item) if type(item) is dict else _copiar(item) for item in valor]
+    if isinstance(valor, dict):
+        return {chave: _copiar(item) for chave, item in valor.items()}
+    return valor
+
+
+def separar_nfs_referentes(nfs_referentes):
+    """Separa o texto livre de extrato.nfs_referentes ('1234, 1235.0') em números normalizados"""
+    numeros = []
+    for nf in (nfs_referentes or '').split(','):
+        numero = normalizar_numero_nf(nf)
+        if numero and numero not in numeros:
+            numeros.append(numero)
+    return numeros
+
+
+# Resultados de consultas de recebíveis guardados por (consulta, data de referência, versão dos dados)
+MAX_CACHE_CONSULTAS = 64
+
+# Versão do esquema (base + migrações de migracoes.py)
+VERSAO_ESQUEMA = migracoes.VERSAO_ATUAL
+
+# Segundos que uma conexão espera pela trava de escrita antes de 'database is locked'
+TEMPO_ESPERA_TRAVA = 30
+
+# Campos extraídos do PDF guardados em nf_metadados
+CAMPOS_METADADOS = ('contrato', 'folhas_registro', 'stm', 'requisicao', 'pdf_sha256')
+
+# Colunas da nota que mudam o valor esperado e, portanto, o status de recebimento
+CAMPOS_VALOR_ESPERADO = ('tipo', 'valor_bruto', 'valor_nominal_calculado',
+                         'valor_liquido_vinci', 'valor_nominal_conferencia')
+
+# Dias entre a emissão e o vencimento por tipo de serviço (também os tipos aceitos na importação)
+PRAZOS_RECEBIMENTO = {
+    'TRANSPORTE': 60,
+    'TRANSPORTE_CTE': 60,
+    'ENSAIO DIELETRICO': 30,
+    'CONSTRUCAO': 30
+}
 
 
 class Database:
-    def __init__(self, db_path='sistema_nf.db'):
-        self.db_path = db_path
-        self.init_database()
+    def __init__(self, db_path='sistema_nf.db', migrar=True):
+        """
+        Args:
+            db_path: Caminho do arquivo SQLite (ou endereço sqlite:///... / postgresql://...)
+            migrar: Roda init_database se o esquema do banco estiver desatualizado.
+                A aplicação web passa False e migra por comando explícito.
+        """
+        self.armazenamento = criar_armazenamento(db_path, TEMPO_ESPERA_TRAVA)
+        self.db_path = getattr(self.armazenamento, 'caminho', db_path)
+        self.fila_escrita = None
+        self.pool_leitura = None
+        self._cache_consultas = OrderedDict()
+        self._trava_cache = threading.Lock()
+        if migrar and not self.esquema_atualizado():
+            self.init_database()
+
+    def esquema_atualizado(self):
+        """True se o banco já passou por init_database nesta versão (só lê a versão gravada)"""
+        conn = self._conectar()
+        try:
+            return migracoes.versao(conn.cursor()) >= VERSAO_ESQUEMA
+        finally:
+            conn.close()
+
+    def _conectar(self):
+        """Abre conexão com o banco (consultas rastreadas pela instrumentação)"""
+        if self.pool_leitura is not None:
+            return self.pool_leitura.obter()
+        return self.armazenamento.conectar()
+
+    def _ler_em_lotes(self, sql, parametros=()):
+        """Gera as linhas da consulta sem carregar o resultado inteiro (exportações grandes)"""
+        conn = self._conectar()
+        try:
+            yield from self.armazenamento.ler_em_lotes(conn, sql, parametros)
+        finally:
+            conn.close()
+
+    def ativar_fila_escrita(self, max_lote=MAX_LOTE, conexoes_leitura=CONEXOES_LEITURA):
+        """Escritas passam a ir por uma thread dedicada (group commit); leituras, por um pool
+
+        Para servidores com várias threads atendendo requisições; scripts de linha
+        de comando continuam com uma conexão por operação. No PostgreSQL as leituras
+        já vêm do pool de conexões do backend.
+        """
+        if self.fila_escrita is not None:
+            return
+        if self.armazenamento.nome == 'sqlite':
+            self.pool_leitura = PoolLeitura(self.armazenamento.conectar, conexoes_leitura)
+        self.fila_escrita = FilaEscrita(
+            lambda: self.armazenamento.conectar(check_same_thread=False),
+            max_lote=max_lote
+        )
+
+    def encerrar_fila_escrita(self):
+        """Grava o que estiver pendente na fila e volta ao modo de uma conexão por operação"""
+        if self.fila_escrita is None:
+            return
+        self.fila_escrita.fechar()
+        if self.pool_leitura is not None:
+            self.pool_leitura.fechar()
+        self.fila_escrita = None
+        self.pool_leitura = None
+
+    @contextmanager
+    def _transacao(self):
+        """Cursor dentro de uma transação BEGIN IMMEDIATE (commit no fim, rollback em erro)
+
+        A trava de escrita é pega já no início: duas escritas simultâneas são
+        serializadas em vez de uma delas falhar no meio com 'database is locked'
+        (no PostgreSQL, a trava do backend em pg_advisory_xact_lock).
+        """
+        conn = self._conectar()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            yield conn.cursor()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _escrever(self, rota, dados, chave_idempotencia, operacao):
+        """Executa operacao(cursor) em uma transação; com chave, repetições devolvem o primeiro resultado
+
+        A consulta e o registro da chave ficam na mesma transação da escrita, então
+        não existe janela em que a escrita foi gravada e a chave não (nem o contrário).
+        """
+        def transacao(cursor):
+            if chave_idempotencia:
+                anterior = idempotencia.consultar(cursor, chave_idempotencia, rota, dados)
+                if anterior is not None:
+                    return anterior
+
+            resultado = operacao(cursor)
+
+            if chave_idempotencia:
+                idempotencia.registrar(cursor, chave_idempotencia, rota, dados, resultado)
+            return resultado
+
+        return self._executar_escrita(transacao)
+
+    def _executar_escrita(self, operacao):
+        """operacao(cursor) em uma única transação: pela fila de escrita quando ativa, senão direto"""
+        if self.fila_escrita is not None:
+            return self.fila_escrita.executar(operacao)
+        with self._transacao() as cursor:
+            return operacao(cursor)
 
     def init_database(self):
         """Inicializa o banco de dados"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conectar()
         cursor = conn.cursor()
 
+        # SQLite: modo WAL; PostgreSQL: transação única com a trava de escrita e funções do SQLite
+        self.armazenamento.preparar_esquema(cursor)
+
         # Tabela de Notas Fiscais
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS notas_fiscais (
@@ -42,6 +213,13 @@ class Database:
             )
         ''')
 
+        # Notas em aberto por vencimento: classificação atrasado/a receber por faixa de data.
+        # Parcial, só com as não recebidas; as consultas repetem o mesmo filtro literal para usá-lo
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_notas_abertas_vencimento ON notas_fiscais (data_vencimento)
+            WHERE status_recebimento != 'RECEBIDO'
+        ''')
+
         # Tabela de Extrato (Recebimentos)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS extrato (
@@ -69,43 +247,237 @@ class Database:
             )
         ''')
 
+        # Vínculo normalizado Extrato <-> NF (substitui o parse de nfs_referentes)
+        extrato_nf_existia = tabela_existe(cursor, 'extrato_nf')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS extrato_nf (
+                extrato_id INTEGER NOT NULL,
+                numero_nf TEXT NOT NULL,
+                nota_fiscal_id INTEGER,
+                PRIMARY KEY (extrato_id, numero_nf),
+                FOREIGN KEY (extrato_id) REFERENCES extrato(id),
+                FOREIGN KEY (nota_fiscal_id) REFERENCES notas_fiscais(id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_extrato_nf_numero ON extrato_nf (numero_nf)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_extrato_nf_nota ON extrato_nf (nota_fiscal_id)')
+
+        if not extrato_nf_existia:
+            self._migrar_extrato_nf(cursor)
+
+        # Lançamentos vindos de arquivo do banco (OFX/CNAB/CSV): evita importar o mesmo duas vezes
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS extrato_importado (
+                documento TEXT PRIMARY KEY,
+                extrato_id INTEGER NOT NULL,
+                arquivo TEXT,
+                importado_em TEXT DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (extrato_id) REFERENCES extrato (id)
+            )
+        ''')
+
+        # Versão dos dados (ETag/Last-Modified e caches) - incrementada por triggers
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS versao_dados (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                versao INTEGER NOT NULL DEFAULT 0,
+                atualizado_em TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('INSERT INTO versao_dados (id, versao) VALUES (1, 0) ON CONFLICT DO NOTHING')
+
+        for tabela in ('notas_fiscais', 'extrato', 'conciliacao'):
+            for evento in ('INSERT', 'UPDATE', 'DELETE'):
+                criar_gatilho(cursor, f'trg_versao_{tabela}_{evento.lower()}', f'AFTER {evento} ON {tabela}', f'''
+                    UPDATE versao_dados
+                    SET versao = versao + 1, atualizado_em = {self.armazenamento.AGORA_UTC}
+                    WHERE id = 1;
+                ''')
+
+        # Resumos de recebíveis (aging/previsão) mantidos por triggers
+        resumos.criar_estrutura(cursor)
+
+        # Metadados extraídos do PDF (contrato, STM, ...) e hash do arquivo original
+        nf_metadados_existia = tabela_existe(cursor, 'nf_metadados')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS nf_metadados (
+                nota_fiscal_id INTEGER PRIMARY KEY,
+                contrato TEXT,
+                folhas_registro TEXT,
+                stm TEXT,
+                requisicao TEXT,
+                pdf_sha256 TEXT,
+                FOREIGN KEY (nota_fiscal_id) REFERENCES notas_fiscais(id)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_nf_metadados_contrato ON nf_metadados (contrato) '
+                       'WHERE contrato IS NOT NULL')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_nf_metadados_stm ON nf_metadados (stm) '
+                       'WHERE stm IS NOT NULL')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_nf_metadados_pdf ON nf_metadados (pdf_sha256) '
+                       'WHERE pdf_sha256 IS NOT NULL')
+        criar_gatilho(cursor, 'trg_nf_metadados_nota_delete', 'AFTER DELETE ON notas_fiscais',
+                      'DELETE FROM nf_metadados WHERE nota_fiscal_id = OLD.id;')
+
+        # Índices de busca textual (FTS5) mantidos por triggers
+        busca.criar_estrutura(cursor)
+
+        # Controle do arquivo de PDFs (blobs endereçados por SHA-256)
+        arquivo_pdf.criar_estrutura(cursor)
+
+        # Chaves de idempotência das escritas vindas da API
+        idempotencia.criar_estrutura(cursor)
+
+        # Histórico somente-inclusão de notas, recebimentos e conciliações (capturado por triggers)
+        ledger.criar_estrutura(cursor)
+
+        # Fechamentos mensais (posição de recebíveis congelada por data)
+        fechamento.criar_estrutura(cursor)
+
+        if not nf_metadados_existia and self.armazenamento.nome == 'sqlite':
+            # Campos que até então só existiam no índice de busca (FTS5)
+            cursor.execute('''
+                INSERT INTO nf_metadados (nota_fiscal_id, contrato, folhas_registro, stm, requisicao)
+                SELECT rowid, contrato, folhas_registro, stm, requisicao
+                FROM busca_notas
+                WHERE COALESCE(contrato, folhas_registro, stm, requisicao) IS NOT NULL
+            ''')
+
+        # Migrações versionadas (índices, colunas novas) e ANALYZE
+        migracoes.aplicar(cursor)
+
         conn.commit()
         conn.close()
 
+    def _migrar_extrato_nf(self, cursor):
+        """Popula extrato_nf a partir do texto de nfs_referentes dos lançamentos existentes"""
+        cursor.execute('SELECT id, numero_nf FROM notas_fiscais')
+        ids_por_numero = {}
+        for nf_id, numero_nf in cursor.fetchall():
+            ids_por_numero.setdefault(normalizar_numero_nf(numero_nf), nf_id)
+
+        cursor.execute('SELECT id, nfs_referentes FROM extrato')
+        vinculos = [
+            (extrato_id, numero, ids_por_numero.get(numero))
+            for extrato_id, nfs_referentes in cursor.fetchall()
+            for numero in separar_nfs_referentes(nfs_referentes)
+        ]
+
+        # Tabela recém-criada e vínculos já únicos por lançamento: carga em massa direta
+        self.armazenamento.inserir_em_massa(cursor, 'extrato_nf', ('extrato_id', 'numero_nf', 'nota_fiscal_id'),
+                                            vinculos)
+
+        if vinculos:
+            print(f"   🔗 {len(vinculos)} vínculos extrato/NF migrados")
+
+    def reconstruir_resumos(self):
+        """Recalcula as tabelas de resumo de recebíveis a partir das notas"""
+        conn = self._conectar()
+        cursor = conn.cursor()
+
+        resumos.reconstruir(cursor)
+
+        conn.commit()
+        conn.close()
+
+    def versao_dados(self):
+        """Retorna (versao, atualizado_em) - muda a cada escrita nas tabelas principais"""
+        conn = self._conectar()
+        cursor = conn.cursor()
+
+        cursor.execute('SELECT versao, atualizado_em FROM versao_dados WHERE id = 1')
+        versao, atualizado_em = cursor.fetchone()
+        conn.close()
+
+        return versao, atualizado_em
+
+    @staticmethod
+    def _data_referencia(data_referencia):
+        """Data base da classificação atrasado/a receber ('YYYY-MM-DD'; padrão: hoje)"""
+        if data_referencia is None:
+            return datetime.now().strftime('%Y-%m-%d')
+        try:
+            return datetime.strptime(data_referencia, '%Y-%m-%d').strftime('%Y-%m-%d')
+        except (TypeError, ValueError):
+            raise ValueError(f'Data de referência inválida: {data_referencia} (use YYYY-MM-DD)')
+
+    def _em_cache(self, consulta, parametros, carregar):
+        """Resultado de carregar() reaproveitado enquanto os dados não mudarem
+
+        A chave inclui versao_dados, então qualquer escrita invalida; os parâmetros
+        (data de referência etc.) precisam ser explícitos, nunca lidos do relógio dentro
+        da consulta. Devolve uma cópia: quem chama pode alterar o resultado.
+        """
+        chave = (consulta, parametros, self.versao_dados()[0])
+        with self._trava_cache:
+            if chave in self._cache_consultas:
+                self._cache_consultas.move_to_end(chave)
+                return _copiar(self._cache_consultas[chave])
+
+        resultado = carregar()
+
+        with self._trava_cache:
+            self._cache_consultas[chave] = resultado
+            while len(self._cache_consultas) > MAX_CACHE_CONSULTAS:
+                self._cache_consultas.popitem(last=False)
+        return _copiar(resultado)
+
     def calcular_prazo_recebimento(self, tipo, data_emissao):
         """Calcula data de vencimento baseado no tipo"""
-        prazos = {
-            'TRANSPORTE': 60,
-            'TRANSPORTE_CTE': 60,
-            'ENSAIO DIELETRICO': 30,
-            'CONSTRUCAO': 30
-        }
-
-        dias = prazos.get(tipo, 30)
+        dias = PRAZOS_RECEBIMENTO.get(tipo, 30)
         data = datetime.strptime(data_emissao, '%Y-%m-%d')
         data_vencimento = data + timedelta(days=dias)
 
         return data_vencimento.strftime('%Y-%m-%d'), dias
 
-    def inserir_nota(self, dados):
-        """Insere uma nota fiscal no banco"""
-        conn = sqlite3.connect(self.db_path)
+    def numeros_nf_existentes(self, numeros):
+        """Quais dos números de NF já estão no banco, comparados normalizados ('123.0' = '123')
+
+        Uma consulta, pelo índice idx_notas_numero_normalizado.
+
+        Returns:
+            set: Números normalizados já cadastrados
+        """
+        conn = self._conectar()
         cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT DISTINCT TRIM(REPLACE(numero_nf, '.0', '')) FROM notas_fiscais
+            WHERE TRIM(REPLACE(numero_nf, '.0', '')) IN ({self.armazenamento.VALORES_JSON})
+        ''', (json.dumps(sorted({normalizar_numero_nf(numero) for numero in numeros})),))
+        existentes = {row[0] for row in cursor.fetchall()}
+        conn.close()
+        return existentes
 
+    def inserir_nota(self, dados, chave_idempotencia=None):
+        """Insere uma nota fiscal no banco"""
+        return self._escrever('salvar', dados, chave_idempotencia,
+                              lambda cursor: self._inserir_nota(cursor, dados))
+
+    def _inserir_nota(self, cursor, dados):
         # Calcula prazo de recebimento
         data_vencimento, dias = self.calcular_prazo_recebimento(
             dados['tipo'],
             dados['data_emissao']
         )
 
+        # Nota que já chega adiantada (planilha): taxa efetiva calculada como em adiantar_nota
+        custo = (None, None, None)
+        if dados.get('foi_adiantado'):
+            custo = calcular_custo(dados.get('valor_liquido_vinci'), dados.get('valor_retido_vinci'),
+                                   dados.get('data_adiantamento'), data_vencimento)
+
         cursor.execute('''
             INSERT INTO notas_fiscais (
                 data_emissao, numero_nf, tipo, valor_bruto, localidade, tomador,
                 inss, iss, retencao_equatorial, pis_cofins_retido, pis_cofins_csll,
                 valor_nominal_conferencia, valor_nominal_calculado, valor_liquido_vinci,
                 foi_adiantado, data_adiantamento, data_vencimento, dias_para_receber,
-                valor_retido_vinci, percentual_adiantamento
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                valor_retido_vinci, percentual_adiantamento,
+                dias_antecipacao, taxa_efetiva_mensal, taxa_efetiva_anual
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            RETURNING id
         ''', (
             dados['data_emissao'],
             dados['numero_nf'],
@@ -126,25 +498,50 @@ class Database:
             data_vencimento,
             dias,
             dados.get('valor_retido_vinci'),
-            dados.get('percentual_adiantamento')
+            dados.get('percentual_adiantamento'),
+            *custo
         ))
 
-        nf_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        nf_id = cursor.fetchone()[0]
+
+        # Contrato, STM, requisição, folhas e hash do PDF (indexados; também alimentam a busca)
+        self._salvar_metadados(cursor, nf_id, dados)
+
+        # Recebimentos registrados antes da NF existir passam a apontar para ela
+        cursor.execute('''
+            UPDATE extrato_nf SET nota_fiscal_id = ?
+            WHERE numero_nf = ? AND nota_fiscal_id IS NULL
+        ''', (nf_id, normalizar_numero_nf(dados['numero_nf'])))
 
         return nf_id
 
-    def inserir_recebimento(self, dados):
-        """Insere um recebimento no extrato"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def _salvar_metadados(self, cursor, nf_id, dados):
+        """Grava em nf_metadados os campos extraídos do PDF que vieram nos dados"""
+        valores = [dados.get(campo) or None for campo in CAMPOS_METADADOS]
+        if not any(valores):
+            return
+
+        cursor.execute('''
+            INSERT INTO nf_metadados (
+                nota_fiscal_id, contrato, folhas_registro, stm, requisicao, pdf_sha256
+            ) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (nota_fiscal_id) DO UPDATE SET
+                contrato = excluded.contrato, folhas_registro = excluded.folhas_registro,
+                stm = excluded.stm, requisicao = excluded.requisicao, pdf_sha256 = excluded.pdf_sha256
+        ''', (nf_id, *valores))
+
+    def inserir_recebimento(self, dados, chave_idempotencia=None):
+        """Insere um recebimento no extrato e concilia com as NFs (tudo ou nada)"""
+        return self._escrever('registrar-recebimento', dados, chave_idempotencia,
+                              lambda cursor: self._inserir_recebimento(cursor, dados))
 
+    def _inserir_recebimento(self, cursor, dados):
         cursor.execute('''
             INSERT INTO extrato (
                 data_recebimento, valor_recebido, nfs_referentes, 
                 tipo_recebimento, complemento, foi_adiantado
             ) VALUES (?, ?, ?, ?, ?, ?)
+            RETURNING id
         ''', (
             dados['data_recebimento'],
             dados['valor_recebido'],
@@ -154,16 +551,75 @@ class Database:
             dados.get('foi_adiantado', 0)
         ))
 
-        extrato_id = cursor.lastrowid
-        conn.commit()
+        extrato_id = cursor.fetchone()[0]
 
         # Concilia com as NFs
         self._conciliar_recebimento(cursor, extrato_id, dados)
 
-        conn.commit()
+        return extrato_id
+
+    def inserir_recebimentos_lote(self, lancamentos, arquivo=None):
+        """Insere vários recebimentos (extrato bancário) em uma única transação
+
+        Cada lançamento tem os campos de inserir_recebimento e 'documento', a
+        identificação única no arquivo do banco; documentos já importados são ignorados.
+
+        Returns:
+            (ids inseridos, quantidade de duplicados)
+        """
+        def gravar(cursor):
+            ids = []
+            duplicados = 0
+            for dados in lancamentos:
+                cursor.execute('SELECT 1 FROM extrato_importado WHERE documento = ?', (dados['documento'],))
+                if cursor.fetchone():
+                    duplicados += 1
+                    continue
+
+                cursor.execute('''
+                    INSERT INTO extrato (
+                        data_recebimento, valor_recebido, nfs_referentes,
+                        tipo_recebimento, complemento, foi_adiantado
+                    ) VALUES (?, ?, ?, ?, ?, 0)
+                    RETURNING id
+                ''', (
+                    dados['data_recebimento'],
+                    dados['valor_recebido'],
+                    dados['nfs_referentes'],
+                    dados['tipo_recebimento'],
+                    dados.get('complemento', '')
+                ))
+                extrato_id = cursor.fetchone()[0]
+
+                cursor.execute('''
+                    INSERT INTO extrato_importado (documento, extrato_id, arquivo) VALUES (?, ?, ?)
+                ''', (dados['documento'], extrato_id, arquivo))
+
+                self._conciliar_recebimento(cursor, extrato_id, dados)
+                ids.append(extrato_id)
+            return ids, duplicados
+
+        return self._executar_escrita(gravar)
+
+    def documentos_importados(self, documentos):
+        """Quais documentos de extrato bancário já foram importados"""
+        conn = self._conectar()
+        cursor = conn.cursor()
+
+        encontrados = set()
+        documentos = list(documentos)
+        # Em blocos, abaixo do limite de parâmetros do SQLite
+        for inicio in range(0, len(documentos), 500):
+            bloco = documentos[inicio:inicio + 500]
+            cursor.execute(f'''
+                SELECT documento FROM extrato_importado
+                WHERE documento IN ({', '.join('?' * len(bloco))})
+            ''', bloco)
+            encontrados.update(row[0] for row in cursor.fetchall())
+
         conn.close()
 
-        return extrato_id
+        return encontrados
 
     def _conciliar_recebimento(self, cursor, extrato_id, dados):
         """Concilia recebimento com notas fiscais"""
@@ -174,15 +630,12 @@ class Database:
             print(f"   ℹ️  Recebimento sem NF específica - R$ {dados['valor_recebido']:.2f}")
             return
 
-        nfs = [nf.strip() for nf in nfs_str.split(',')]
+        # Para cada NF mencionada (já normalizada)
+        for nf_normalizado in separar_nfs_referentes(nfs_str):
 
-        # Para cada NF mencionada
-        for nf in nfs:
-            # Normaliza o número da NF
-            nf_normalizado = str(nf).replace('.0', '').strip()
-
-            # Busca a NF e seu valor líquido esperado
-            cursor.execute('''
+            # Busca a NF e seu valor líquido esperado (número exato usa o índice UNIQUE;
+            # a comparação normalizada só roda para números gravados como '123.0')
+            colunas = '''
                 SELECT 
                     id, 
                     valor_liquido_vinci, 
@@ -190,10 +643,12 @@ class Database:
                     valor_nominal_calculado,
                     valor_bruto
                 FROM notas_fiscais 
-                WHERE TRIM(REPLACE(numero_nf, '.0', '')) = ?
-                OR numero_nf = ?
-            ''', (nf_normalizado, nf_normalizado))
+            '''
+            cursor.execute(colunas + 'WHERE numero_nf = ?', (nf_normalizado,))
             result = cursor.fetchone()
+            if not result:
+                cursor.execute(colunas + "WHERE TRIM(REPLACE(numero_nf, '.0', '')) = ?", (nf_normalizado,))
+                result = cursor.fetchone()
 
             if result:
                 nf_id = result[0]
@@ -221,10 +676,21 @@ class Database:
 
                 print(f"   ✅ NF {nf_normalizado} conciliada - {dados['tipo_recebimento']} - R$ {valor_esperado:.2f}")
 
+                self._vincular_nf(cursor, extrato_id, nf_normalizado, nf_id)
+
                 # Atualiza status da NF
                 self._atualizar_status_nf(cursor, nf_id)
             else:
                 print(f"   ⚠️  NF {nf_normalizado} não encontrada no banco")
+                self._vincular_nf(cursor, extrato_id, nf_normalizado, None)
+
+    def _vincular_nf(self, cursor, extrato_id, numero_nf, nf_id):
+        """Registra o vínculo lançamento do extrato <-> NF"""
+        cursor.execute('''
+            INSERT INTO extrato_nf (extrato_id, numero_nf, nota_fiscal_id)
+            VALUES (?, ?, ?)
+            ON CONFLICT DO NOTHING
+        ''', (extrato_id, numero_nf, nf_id))
 
     def _atualizar_status_nf(self, cursor, nf_id):
         """Atualiza status de recebimento da NF"""
@@ -279,15 +745,31 @@ class Database:
             WHERE id = ?
         ''', (status, nf_id))
 
-    def listar_pendentes(self):
-        """Lista NFs pendentes de recebimento"""
-        conn = sqlite3.connect(self.db_path)
+    def listar_pendentes(self, ids=None, data_referencia=None):
+        """Lista NFs pendentes de recebimento (opcionalmente só as dos ids informados)
+
+        Args:
+            data_referencia: 'YYYY-MM-DD' da classificação ATRASADO/A_RECEBER (padrão: hoje)
+        """
+        hoje = self._data_referencia(data_referencia)
+        if ids is not None:
+            return self._listar_pendentes(list(ids), hoje)
+        return self._em_cache('listar_pendentes', hoje, lambda: self._listar_pendentes(None, hoje))
+
+    def _listar_pendentes(self, ids, hoje):
+        filtro_ids = ''
+        params = [hoje, hoje]
+        if ids is not None:
+            if not ids:
+                return []
+            filtro_ids = f"AND id IN ({', '.join('?' * len(ids))})"
+            params.extend(ids)
+
+        conn = self._conectar()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
 
-        hoje = datetime.now().strftime('%Y-%m-%d')
-
-        cursor.execute('''
+        cursor.execute(f'''
             SELECT 
                 id, numero_nf, data_emissao, tipo, valor_bruto,
                 -- HIERARQUIA CORRIGIDA: Ignora NULL e valores zerados
@@ -303,27 +785,230 @@ class Database:
                 data_vencimento, tomador, localidade,
                 status_recebimento,
                 CASE 
-                    WHEN date(data_vencimento) < date(?) THEN 'ATRASADO'
+                    WHEN data_vencimento < ? THEN 'ATRASADO'
                     ELSE 'A_RECEBER'
                 END as situacao,
                 CAST(julianday(?) - julianday(data_vencimento) as INTEGER) as dias_diferenca
             FROM notas_fiscais
             WHERE status_recebimento != 'RECEBIDO'
+            {filtro_ids}
             ORDER BY data_vencimento ASC
-        ''', (hoje, hoje))
+        ''', params)
 
         notas = [dict(row) for row in cursor.fetchall()]
         conn.close()
 
         return notas
 
-    def dashboard_recebimentos(self):
-        """Retorna dados para dashboard de recebimentos"""
-        conn = sqlite3.connect(self.db_path)
+    def notas_do_recebimento(self, extrato_id):
+        """Retorna os ids das NFs conciliadas com um lançamento do extrato"""
+        conn = self._conectar()
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT nota_fiscal_id
+            FROM extrato_nf
+            WHERE extrato_id = ? AND nota_fiscal_id IS NOT NULL
+        ''', (extrato_id,))
+
+        ids = [row[0] for row in cursor.fetchall()]
+        conn.close()
+
+        return ids
+
+    def recebimentos_da_nf(self, numero_nf):
+        """Lista os lançamentos do extrato que referenciam a NF (busca pelo índice de extrato_nf)"""
+        conn = self._conectar()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT
+                e.id, e.data_recebimento, e.valor_recebido, e.nfs_referentes,
+                e.tipo_recebimento, e.complemento, e.foi_adiantado,
+                v.nota_fiscal_id
+            FROM extrato_nf v
+            JOIN extrato e ON e.id = v.extrato_id
+            WHERE v.numero_nf = ?
+            ORDER BY e.data_recebimento
+        ''', (normalizar_numero_nf(numero_nf),))
+
+        recebimentos = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        return recebimentos
+
+    def nfs_do_recebimento(self, extrato_id):
+        """Lista as NFs referenciadas por um lançamento do extrato"""
+        conn = self._conectar()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT
+                v.numero_nf, v.nota_fiscal_id,
+                n.data_emissao, n.tipo, n.valor_bruto, n.tomador,
+                n.data_vencimento, n.status_recebimento
+            FROM extrato_nf v
+            LEFT JOIN notas_fiscais n ON n.id = v.nota_fiscal_id
+            WHERE v.extrato_id = ?
+            ORDER BY v.numero_nf
+        ''', (extrato_id,))
+
+        nfs = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        return nfs
+
+    def resumo_por_metadado(self, campo, valor=None):
+        """Totais por contrato ou STM (ou de um único contrato/STM, via índice)"""
+        if campo not in ('contrato', 'stm'):
+            raise ValueError(f'Campo inválido: {campo}')
+
+        conn = self._conectar()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
 
-        hoje = datetime.now().strftime('%Y-%m-%d')
+        filtro = f'm.{campo} = ?' if valor is not None else f'm.{campo} IS NOT NULL'
+        params = (valor,) if valor is not None else ()
+
+        cursor.execute(f'''
+            SELECT
+                m.{campo} as {campo},
+                COUNT(*) as qtd,
+                MIN(n.data_emissao) as primeira_emissao,
+                MAX(n.data_emissao) as ultima_emissao,
+                SUM(n.valor_bruto) as valor_bruto,
+                SUM(n.inss) as inss,
+                SUM(n.iss) as iss,
+                SUM(n.retencao_equatorial) as retencao_equatorial,
+                SUM(
+                    CASE 
+                        WHEN n.valor_nominal_conferencia IS NOT NULL AND n.valor_nominal_conferencia > 0 
+                            THEN n.valor_nominal_conferencia
+                        WHEN n.valor_liquido_vinci IS NOT NULL AND n.valor_liquido_vinci > 0 
+                            THEN n.valor_liquido_vinci
+                        WHEN n.valor_nominal_calculado IS NOT NULL AND n.valor_nominal_calculado > 0 
+                            THEN n.valor_nominal_calculado
+                        ELSE n.valor_bruto
+                    END
+                ) as valor_esperado,
+                SUM(CASE WHEN n.status_recebimento = 'RECEBIDO' THEN 1 ELSE 0 END) as qtd_recebidas
+            FROM nf_metadados m
+            JOIN notas_fiscais n ON n.id = m.nota_fiscal_id
+            WHERE {filtro}
+            GROUP BY m.{campo}
+            ORDER BY valor_bruto DESC
+        ''', params)
+
+        resumo = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        return resumo
+
+    def notas_por_metadado(self, campo, valor):
+        """Lista as notas de um contrato ou STM"""
+        if campo not in ('contrato', 'stm'):
+            raise ValueError(f'Campo inválido: {campo}')
+
+        conn = self._conectar()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+
+        cursor.execute(f'''
+            SELECT n.id, n.numero_nf, n.data_emissao, n.tipo, n.valor_bruto, n.tomador,
+                n.localidade, n.data_vencimento, n.status_recebimento,
+                m.contrato, m.folhas_registro, m.stm, m.requisicao, m.pdf_sha256
+            FROM nf_metadados m
+            JOIN notas_fiscais n ON n.id = m.nota_fiscal_id
+            WHERE m.{campo} = ?
+            ORDER BY n.data_emissao
+        ''', (valor,))
+
+        notas = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        return notas
+
+    def pdf_da_nota(self, nota_id):
+        """Retorna hash e nome original do PDF arquivado de uma nota (ou None)"""
+        conn = self._conectar()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT n.numero_nf, m.pdf_sha256, a.nome_original, a.tamanho
+            FROM nf_metadados m
+            JOIN notas_fiscais n ON n.id = m.nota_fiscal_id
+            LEFT JOIN arquivo_pdf a ON a.sha256 = m.pdf_sha256
+            WHERE m.nota_fiscal_id = ? AND m.pdf_sha256 IS NOT NULL
+        ''', (nota_id,))
+
+        row = cursor.fetchone()
+        conn.close()
+
+        return dict(row) if row else None
+
+    def notas_para_reextracao(self):
+        """Campos extraíveis do PDF de todas as notas (base de comparação da reextração)"""
+        conn = self._conectar()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT n.id, n.numero_nf, n.tipo, n.data_emissao, n.valor_bruto, n.localidade,
+                n.tomador, n.inss, n.iss, n.pis_cofins_retido,
+                m.contrato, m.folhas_registro, m.stm, m.requisicao, m.pdf_sha256
+            FROM notas_fiscais n
+            LEFT JOIN nf_metadados m ON m.nota_fiscal_id = n.id
+        ''')
+
+        notas = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        return notas
+
+    def aplicar_reextracao(self, alteracoes):
+        """Aplica um lote de correções da reextração em uma única transação
+
+        Args:
+            alteracoes: lista de (nota_id, campos_nota, campos_metadados), cada um com
+                        só as colunas que mudaram
+        """
+        def gravar(cursor):
+            for nota_id, campos_nota, campos_metadados in alteracoes:
+                if campos_nota:
+                    atribuicoes = ', '.join(f'{campo} = ?' for campo in campos_nota)
+                    cursor.execute(
+                        f'UPDATE notas_fiscais SET {atribuicoes} WHERE id = ?',
+                        (*campos_nota.values(), nota_id)
+                    )
+                    if any(campo in campos_nota for campo in CAMPOS_VALOR_ESPERADO):
+                        self._atualizar_status_nf(cursor, nota_id)
+                if campos_metadados:
+                    colunas = ', '.join(campos_metadados)
+                    marcadores = ', '.join('?' for _ in campos_metadados)
+                    atualizacao = ', '.join(f'{campo} = excluded.{campo}' for campo in campos_metadados)
+                    cursor.execute(f'''
+                        INSERT INTO nf_metadados (nota_fiscal_id, {colunas}) VALUES (?, {marcadores})
+                        ON CONFLICT (nota_fiscal_id) DO UPDATE SET {atualizacao}
+                    ''', (nota_id, *campos_metadados.values()))
+
+        self._executar_escrita(gravar)
+
+    def dashboard_recebimentos(self, data_referencia=None):
+        """Retorna dados para dashboard de recebimentos
+
+        Args:
+            data_referencia: 'YYYY-MM-DD' que separa atrasado de a receber (padrão: hoje)
+        """
+        hoje = self._data_referencia(data_referencia)
+        return self._em_cache('dashboard_recebimentos', hoje, lambda: self._dashboard_recebimentos(hoje))
+
+    def _dashboard_recebimentos(self, hoje):
+        conn = self._conectar()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
 
         # Total A Receber - HIERARQUIA CORRIGIDA
         cursor.execute('''
@@ -342,7 +1027,7 @@ class Database:
                 ) as total
             FROM notas_fiscais
             WHERE status_recebimento != 'RECEBIDO'
-            AND date(data_vencimento) >= date(?)
+            AND data_vencimento >= ?
         ''', (hoje,))
 
         a_receber = dict(cursor.fetchone())
@@ -364,7 +1049,7 @@ class Database:
                 ) as total
             FROM notas_fiscais
             WHERE status_recebimento != 'RECEBIDO'
-            AND date(data_vencimento) < date(?)
+            AND data_vencimento < ?
         ''', (hoje,))
 
         atrasado = dict(cursor.fetchone())
@@ -398,27 +1083,82 @@ class Database:
             'recebido': recebido
         }
 
-    def adiantar_nota(self, nota_id, dados):
-        """Registra adiantamento de uma nota fiscal E cria lançamento no extrato"""
-        conn = sqlite3.connect(self.db_path)
+    def posicao_caixa(self, ate, data_referencia=None, saldo_inicial=0):
+        """Entradas previstas dia a dia entre a data de referência e `ate`, com saldo acumulado
+
+        Lê do resumo diário por vencimento (faixa na chave primária), então o custo
+        depende dos dias da janela, não da quantidade de notas.
+
+        Returns:
+            dict com 'atrasado' (vencido e não recebido até a referência, fora da série),
+            'serie' [{data, qtd, entradas, saldo}] e 'saldo_final'
+        """
+        hoje = self._data_referencia(data_referencia)
+        ate = self._data_referencia(ate)
+        posicao = self._em_cache('posicao_caixa', (hoje, ate), lambda: self._posicao_caixa(hoje, ate))
+
+        saldo = saldo_inicial
+        for dia in posicao['serie']:
+            saldo += dia['entradas']
+            dia['saldo'] = round(saldo, 2)
+        posicao['saldo_inicial'] = saldo_inicial
+        posicao['saldo_final'] = round(saldo, 2)
+        return posicao
+
+    def _posicao_caixa(self, hoje, ate):
+        conn = self._conectar()
         cursor = conn.cursor()
 
+        cursor.execute('''
+            SELECT COALESCE(SUM(qtd), 0), COALESCE(SUM(valor_esperado), 0)
+            FROM resumo_recebiveis_diario
+            WHERE periodo > '' AND periodo < ?
+            AND status_recebimento != 'RECEBIDO'
+        ''', (hoje,))
+        qtd_atrasado, total_atrasado = cursor.fetchone()
+
+        cursor.execute('''
+            SELECT periodo, SUM(qtd), SUM(valor_esperado)
+            FROM resumo_recebiveis_diario
+            WHERE periodo >= ? AND periodo <= ?
+            AND status_recebimento != 'RECEBIDO'
+            GROUP BY periodo
+            ORDER BY periodo
+        ''', (hoje, ate))
+        serie = [{'data': periodo, 'qtd': qtd, 'entradas': round(total, 2)}
+                 for periodo, qtd, total in cursor.fetchall()]
+        conn.close()
+
+        return {
+            'data_referencia': hoje,
+            'ate': ate,
+            'atrasado': {'qtd': qtd_atrasado, 'total': round(total_atrasado, 2)},
+            'serie': serie
+        }
+
+    def adiantar_nota(self, nota_id, dados, chave_idempotencia=None):
+        """Registra adiantamento de uma nota fiscal E cria lançamento no extrato"""
+        return self._escrever('adiantar-nota', dados, chave_idempotencia,
+                              lambda cursor: self._adiantar_nota(cursor, nota_id, dados))
+
+    def _adiantar_nota(self, cursor, nota_id, dados):
         # Busca dados da nota
         cursor.execute('''
-            SELECT numero_nf, valor_nominal_calculado, pis_cofins_csll, valor_nominal_conferencia
+            SELECT numero_nf, valor_nominal_calculado, pis_cofins_csll, valor_nominal_conferencia,
+                data_vencimento
             FROM notas_fiscais 
             WHERE id = ?
         ''', (nota_id,))
 
         resultado = cursor.fetchone()
         if not resultado:
-            conn.close()
             raise Exception("Nota fiscal não encontrada")
 
         numero_nf = resultado[0]
         valor_nominal = resultado[1]
         pis_cofins_csll = resultado[2]
         valor_nominal_conferencia = resultado[3]
+        data_vencimento = resultado[4]
 
         # Calcula valores
         valor_liquido = dados['valor_liquido_vinci']
@@ -431,6 +1171,10 @@ class Database:
 
         valor_retido = valor_nominal_final - valor_liquido
         percentual_adiantamento = (valor_retido / valor_nominal_final) * 100 if valor_nominal_final > 0 else 0
+        # Custo efetivo pelos dias antecipados (alimenta resumo_adiantamentos via trigger)
+        dias_antecipacao, taxa_mensal, taxa_anual = calcular_custo(
+            valor_liquido, valor_retido, dados['data_adiantamento'], data_vencimento
+        )
 
         # Atualiza nota
         cursor.execute('''
@@ -442,7 +1186,10 @@ class Database:
                 valor_liquido_vinci = ?,
                 percentual_adiantamento = ?,
                 valor_retido_vinci = ?,
-                valor_nominal_conferencia = ?
+                valor_nominal_conferencia = ?,
+                dias_antecipacao = ?,
+                taxa_efetiva_mensal = ?,
+                taxa_efetiva_anual = ?
             WHERE id = ?
         ''', (
             1 if dados['pis_cofins_retido'] else 0,
@@ -451,6 +1198,9 @@ class Database:
             percentual_adiantamento,
             valor_retido,
             valor_liquido,  # Atualiza o Valor Nominal Conferência
+            dias_antecipacao,
+            taxa_mensal,
+            taxa_anual,
             nota_id
         ))
 
@@ -460,6 +1210,7 @@ class Database:
                 data_recebimento, valor_recebido, nfs_referentes, 
                 tipo_recebimento, complemento, foi_adiantado
             ) VALUES (?, ?, ?, ?, ?, ?)
+            RETURNING id
         ''', (
             dados['data_adiantamento'],
             valor_liquido,
@@ -469,7 +1220,7 @@ class Database:
             1
         ))
 
-        extrato_id = cursor.lastrowid
+        extrato_id = cursor.fetchone()[0]
 
         # Concilia automaticamente
         cursor.execute('''
@@ -477,22 +1228,23 @@ class Database:
                 nota_fiscal_id, extrato_id, valor_conciliado, tipo_recebimento
             ) VALUES (?, ?, ?, ?)
         ''', (nota_id, extrato_id, valor_liquido, 'Adiantamento'))
+        self._vincular_nf(cursor, extrato_id, normalizar_numero_nf(numero_nf), nota_id)
 
         # Atualiza status da NF
         self._atualizar_status_nf(cursor, nota_id)
 
-        conn.commit()
-        conn.close()
-
         return {
             'valor_retido': valor_retido,
             'percentual': percentual_adiantamento,
+            'dias_antecipacao': dias_antecipacao,
+            'taxa_efetiva_mensal': taxa_mensal,
+            'taxa_efetiva_anual': taxa_anual,
             'extrato_id': extrato_id
         }
 
     def analise_financeira(self):
         """Retorna análise financeira completa"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conectar()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
 
@@ -536,7 +1288,7 @@ class Database:
 
     def listar_todas_notas(self):
         """Lista todas as notas fiscais"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conectar()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
 
@@ -562,7 +1314,7 @@ class Database:
 
     def listar_extrato(self, filtro_adiantamento=None):
         """Lista todos os lançamentos do extrato com filtro opcional"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._conectar()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
 
@@ -594,9 +1346,36 @@ class Database:
 
         return extrato
 
-    def exportar_para_excel(self, tipo_relatorio):
+    def exportar_notas_completo(self):
+        """Notas da planilha completa, na ordem da aba NFs (lidas em lotes)"""
+        return self._ler_em_lotes('''
+            SELECT
+                data_emissao, numero_nf, tipo, valor_bruto, localidade,
+                inss, iss, retencao_equatorial, tomador, pis_cofins_csll,
+                valor_nominal_conferencia, valor_nominal_calculado,
+                valor_liquido_vinci, foi_adiantado, data_adiantamento,
+                percentual_adiantamento, valor_retido_vinci
+            FROM notas_fiscais
+            ORDER BY data_emissao, numero_nf
+        ''')
+
+    def exportar_extrato_completo(self):
+        """Lançamentos da planilha completa, na ordem da aba Extrato (lidos em lotes)"""
+        return self._ler_em_lotes('''
+            SELECT
+                data_recebimento, valor_recebido, nfs_referentes,
+                tipo_recebimento, complemento
+            FROM extrato
+            ORDER BY data_recebimento
+        ''')
+
+    def exportar_para_excel(self, tipo_relatorio, data_referencia=None):
         """Exporta relatório para formato Excel (dados em dict)"""
-        conn = sqlite3.connect(self.db_path)
+        if tipo_relatorio == 'fechamento':
+            # Lido do fechamento gravado, sem recalcular o histórico
+            return fechamento.Fechamento(self).notas(data_referencia)
+
+        conn = self._conectar()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
 
@@ -622,7 +1401,7 @@ class Database:
             ''')
 
         elif tipo_relatorio == 'pendentes':
-            hoje = datetime.now().strftime('%Y-%m-%d')
+            hoje = self._data_referencia(data_referencia)
             cursor.execute('''
                 SELECT 
                     numero_nf as "Nº NF",
@@ -631,7 +1410,7 @@ class Database:
                     COALESCE(valor_nominal_conferencia, valor_nominal_calculado) as "Valor a Receber",
                     data_vencimento as "Data Vencimento",
                     CASE 
-                        WHEN date(data_vencimento) < date(?) THEN 'ATRASADO'
+                        WHEN data_vencimento < ? THEN 'ATRASADO'
                         ELSE 'A RECEBER'
                     END as "Situação",
                     CAST(julianday(?) - julianday(data_vencimento) as INTEGER) as "Dias",
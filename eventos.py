@@ -0,0 +1,80 @@
+"""
+Canal de eventos (Server-Sent Events) para atualização incremental do dashboard
+Publicação em memória, por processo: cada worker notifica os dashboards conectados a ele
+Cada conexão aberta ocupa uma thread do worker enquanto durar: o número de assinantes
+por processo é limitado e quem passa do limite volta a atualizar por consulta periódica.
+"""
+import json
+import queue
+import threading
+
+# Intervalo para comentários de keep-alive (evita que proxies derrubem a conexão)
+INTERVALO_KEEPALIVE = 15
+
+
+class CanalEventos:
+    """Distribui eventos para todos os assinantes conectados"""
+
+    def __init__(self, tamanho_fila=100):
+        self.tamanho_fila = tamanho_fila
+        self._lock = threading.Lock()
+        self._assinantes = set()
+
+    def assinar(self, limite=None):
+        """Registra um novo assinante e retorna sua fila; None se já há `limite` assinantes"""
+        fila = queue.Queue(maxsize=self.tamanho_fila)
+        with self._lock:
+            if limite is not None and len(self._assinantes) >= limite:
+                return None
+            self._assinantes.add(fila)
+        return fila
+
+    def cancelar(self, fila):
+        with self._lock:
+            self._assinantes.discard(fila)
+
+    def tem_assinantes(self):
+        with self._lock:
+            return bool(self._assinantes)
+
+    def publicar(self, tipo, dados):
+        """Envia um evento a todos os assinantes
+
+        Se a fila de um cliente lento encher, ele recebe 'resync' e deve recarregar tudo.
+        """
+        mensagem = _formatar_evento(tipo, dados)
+        with self._lock:
+            assinantes = list(self._assinantes)
+
+        for fila in assinantes:
+            try:
+                fila.put_nowait(mensagem)
+            except queue.Full:
+                self._forcar_resync(fila)
+
+    def _forcar_resync(self, fila):
+        try:
+            while True:
+                fila.get_nowait()
+        except queue.Empty:
+            pass
+        fila.put_nowait(_formatar_evento('resync', {}))
+
+    def transmitir(self, fila):
+        """Gerador do corpo da resposta text/event-stream para um assinante"""
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    yield fila.get(timeout=INTERVALO_KEEPALIVE)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+        finally:
+            self.cancelar(fila)
+
+
+def _formatar_evento(tipo, dados):
+    return f'event: {tipo}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n'
+
+
+canal = CanalEventos()
@@ -0,0 +1,352 @@
+"""
+Fechamento Mensal - posição de recebíveis congelada em uma data de referência
+Cada fechamento guarda, por nota em aberto na data, a situação (A_RECEBER/ATRASADO),
+o valor esperado e o já recebido até ali (pelas datas de recebimento do extrato).
+Relatórios de fechamento leem o fechamento gravado em vez de recalcular o histórico.
+Valor esperado e vencimento são os da nota como estavam registrados na data, pelo
+ledger de eventos: um fechamento gerado depois (retroativo) não enxerga adiantamentos
+ou alterações feitos após a data.
+
+Uso:
+    python fechamento.py gerar --data 2024-06-30 [--substituir]
+    python fechamento.py mensal                 # fins de mês ainda sem fechamento (agendar no cron)
+    python fechamento.py comparar 2024-05-31 2024-06-30
+    python fechamento.py listar
+"""
+import argparse
+import calendar
+import sqlite3
+from datetime import datetime, date
+
+# Eventos do ledger cujo conteúdo é a nota inteira (valor esperado na posição 6, vencimento na 4)
+EVENTOS_NOTA = "('nota_criada', 'nota_alterada', 'adiantamento')"
+
+def criar_estrutura(cursor):
+    """Cria o cabeçalho dos fechamentos e as linhas por nota (só notas em aberto na data)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fechamento (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data_referencia TEXT NOT NULL UNIQUE,
+            criado_em TEXT NOT NULL,
+            origem TEXT NOT NULL,
+            qtd_a_receber INTEGER NOT NULL DEFAULT 0,
+            total_a_receber REAL NOT NULL DEFAULT 0,
+            qtd_atrasado INTEGER NOT NULL DEFAULT 0,
+            total_atrasado REAL NOT NULL DEFAULT 0,
+            recebido_parcial REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fechamento_nota (
+            fechamento_id INTEGER NOT NULL,
+            nota_fiscal_id INTEGER NOT NULL,
+            situacao TEXT NOT NULL,
+            valor_esperado REAL NOT NULL,
+            recebido REAL NOT NULL DEFAULT 0,
+            data_vencimento TEXT,
+            PRIMARY KEY (fechamento_id, nota_fiscal_id)
+        ) WITHOUT ROWID
+    ''')
+
+
+def fim_do_mes(ano, mes):
+    return date(ano, mes, calendar.monthrange(ano, mes)[1]).strftime('%Y-%m-%d')
+
+
+def fins_de_mes(inicio, fim):
+    """Últimos dias de cada mês entre duas datas 'YYYY-MM-DD' (inclusive)"""
+    ano, mes = int(inicio[:4]), int(inicio[5:7])
+    datas = []
+    while True:
+        data = fim_do_mes(ano, mes)
+        if data > fim:
+            return datas
+        if data >= inicio:
+            datas.append(data)
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+
+
+def _validar_data(data_referencia):
+    try:
+        datetime.strptime(data_referencia, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ValueError(f'Data de referência inválida: {data_referencia} (use YYYY-MM-DD)')
+
+
+class Fechamento:
+    """Geração, consulta e comparação de fechamentos"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def _consultar(self, sql, params=()):
+        conn = self.db._conectar()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+
+        cursor.execute(sql, params)
+        linhas = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        return linhas
+
+    def gerar(self, data_referencia, substituir=False, origem='manual'):
+        """Congela a posição em `data_referencia`
+
+        Nota em aberto na data: emitida até a data e com recebido (conciliações cujo
+        recebimento é até a data) menor que o valor esperado, a mesma regra de
+        _atualizar_status_nf. ATRASADO quando o vencimento é anterior à data.
+
+        Valor esperado e vencimento vêm do último evento da nota no ledger registrado até
+        a data. Nota lançada no sistema depois da data (emissão anterior) usa o primeiro
+        evento, ou seja, os valores com que foi lançada.
+
+        Returns:
+            Cabeçalho do fechamento (o existente, se já havia um e substituir=False)
+        """
+        _validar_data(data_referencia)
+        item_json = self.db.armazenamento.item_json
+
+        def gravar(cursor):
+            cursor.execute('SELECT id FROM fechamento WHERE data_referencia = ?', (data_referencia,))
+            existente = cursor.fetchone()
+            if existente and not substituir:
+                return existente[0]
+            if existente:
+                cursor.execute('DELETE FROM fechamento_nota WHERE fechamento_id = ?', (existente[0],))
+                cursor.execute('DELETE FROM fechamento WHERE id = ?', (existente[0],))
+
+            cursor.execute('''
+                INSERT INTO fechamento (data_referencia, criado_em, origem) VALUES (?, ?, ?)
+                RETURNING id
+            ''', (data_referencia, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), origem))
+            fechamento_id = cursor.fetchone()[0]
+
+            cursor.execute(f'''
+                INSERT INTO fechamento_nota (fechamento_id, nota_fiscal_id, situacao,
+                                             valor_esperado, recebido, data_vencimento)
+                SELECT :id, n.id,
+                       CASE WHEN n.data_vencimento < :data THEN 'ATRASADO' ELSE 'A_RECEBER' END,
+                       n.esperado, COALESCE(r.recebido, 0), n.data_vencimento
+                FROM (
+                    SELECT n.id, {item_json('v.dados', 4)} as data_vencimento,
+                           {item_json('v.dados', 6, 'DOUBLE PRECISION')} as esperado
+                    FROM notas_fiscais n
+                    JOIN ledger_eventos v ON v.seq = COALESCE(
+                        (SELECT MAX(seq) FROM ledger_eventos
+                         WHERE entidade = n.id AND tipo IN {EVENTOS_NOTA} AND registrado_em <= :limite),
+                        (SELECT MIN(seq) FROM ledger_eventos
+                         WHERE entidade = n.id AND tipo IN {EVENTOS_NOTA}))
+                    WHERE n.data_emissao <= :data
+                ) n
+                LEFT JOIN (
+                    SELECT c.nota_fiscal_id, SUM(c.valor_conciliado) as recebido
+                    FROM conciliacao c
+                    JOIN extrato e ON e.id = c.extrato_id
+                    WHERE e.data_recebimento <= :data
+                    GROUP BY c.nota_fiscal_id
+                ) r ON r.nota_fiscal_id = n.id
+                WHERE COALESCE(r.recebido, 0) <= 0 OR r.recebido < n.esperado
+            ''', {
+                'id': fechamento_id,
+                'data': data_referencia,
+                # Eventos registrados até o fim do dia
+                'limite': f'{data_referencia} 23:59:59.999'
+            })
+
+            cursor.execute('''
+                SELECT
+                    COALESCE(SUM(CASE WHEN situacao = 'A_RECEBER' THEN 1 ELSE 0 END), 0),
+                    COALESCE(SUM(CASE WHEN situacao = 'A_RECEBER' THEN valor_esperado END), 0),
+                    COALESCE(SUM(CASE WHEN situacao = 'ATRASADO' THEN 1 ELSE 0 END), 0),
+                    COALESCE(SUM(CASE WHEN situacao = 'ATRASADO' THEN valor_esperado END), 0),
+                    COALESCE(SUM(recebido), 0)
+                FROM fechamento_nota WHERE fechamento_id = ?
+            ''', (fechamento_id,))
+            cursor.execute('''
+                UPDATE fechamento SET
+                    qtd_a_receber = ?, total_a_receber = ?, qtd_atrasado = ?, total_atrasado = ?,
+                    recebido_parcial = ?
+                WHERE id = ?
+            ''', (*(round(valor, 2) for valor in cursor.fetchone()), fechamento_id))
+
+            return fechamento_id
+
+        self.db._executar_escrita(gravar)
+        return self.cabecalho(data_referencia)
+
+    def gerar_pendentes(self, ate=None):
+        """Gera os fechamentos de fim de mês que ainda não existem (uso agendado)
+
+        Vai do mês da primeira nota até o último mês encerrado antes de `ate` (padrão: hoje).
+        """
+        ate = ate or datetime.now().strftime('%Y-%m-%d')
+        linhas = self._consultar('SELECT MIN(data_emissao) as inicio FROM notas_fiscais')
+        if not linhas or not linhas[0]['inicio']:
+            return []
+
+        existentes = {f['data_referencia'] for f in self.listar()}
+        gerados = []
+        for data in fins_de_mes(linhas[0]['inicio'], ate):
+            if data < ate and data not in existentes:
+                gerados.append(self.gerar(data, origem='agendado'))
+        return gerados
+
+    def cabecalho(self, data_referencia):
+        linhas = self._consultar('SELECT * FROM fechamento WHERE data_referencia = ?', (data_referencia,))
+        return linhas[0] if linhas else None
+
+    def listar(self):
+        return self._consultar('SELECT * FROM fechamento ORDER BY data_referencia')
+
+    def relatorio(self, data_referencia, dimensao=None):
+        """Totais do fechamento, opcionalmente por tomador/tipo/localidade"""
+        cabecalho = self.cabecalho(data_referencia)
+        if cabecalho is None:
+            return None
+        if dimensao is None:
+            return {'fechamento': cabecalho}
+        if dimensao not in ('tomador', 'tipo', 'localidade'):
+            raise ValueError(f'Dimensão inválida: {dimensao} (use tomador, tipo ou localidade)')
+
+        linhas = self._consultar(f'''
+            SELECT n.{dimensao} as {dimensao}, f.situacao,
+                   COUNT(*) as qtd, SUM(f.valor_esperado) as total, SUM(f.recebido) as recebido
+            FROM fechamento_nota f
+            JOIN notas_fiscais n ON n.id = f.nota_fiscal_id
+            WHERE f.fechamento_id = ?
+            GROUP BY n.{dimensao}, f.situacao
+            ORDER BY total DESC
+        ''', (cabecalho['id'],))
+        return {'fechamento': cabecalho, 'dimensao': dimensao, 'linhas': linhas}
+
+    def notas(self, data_referencia):
+        """Linhas do fechamento no layout do relatório de pendentes (exportação Excel)"""
+        return self._consultar('''
+            SELECT
+                n.numero_nf as "Nº NF",
+                n.data_emissao as "Data Emissão",
+                n.tipo as "Tipo",
+                f.valor_esperado as "Valor a Receber",
+                f.recebido as "Recebido até a Data",
+                f.data_vencimento as "Data Vencimento",
+                CASE f.situacao WHEN 'ATRASADO' THEN 'ATRASADO' ELSE 'A RECEBER' END as "Situação",
+                CAST(julianday(fc.data_referencia) - julianday(f.data_vencimento) as INTEGER) as "Dias",
+                n.tomador as "Tomador",
+                n.localidade as "Localidade"
+            FROM fechamento fc
+            JOIN fechamento_nota f ON f.fechamento_id = fc.id
+            JOIN notas_fiscais n ON n.id = f.nota_fiscal_id
+            WHERE fc.data_referencia = ?
+            ORDER BY f.data_vencimento ASC
+        ''', (data_referencia,))
+
+    def comparar(self, data_anterior, data_posterior, limite=200):
+        """Diferenças entre dois fechamentos
+
+        Por nota: 'entrou' (em aberto só no posterior), 'saiu' (recebida ou excluída),
+        'venceu' (A_RECEBER -> ATRASADO) e 'alterou' (valor esperado ou recebido mudou).
+        """
+        _validar_data(data_anterior)
+        _validar_data(data_posterior)
+        anterior = self.cabecalho(data_anterior)
+        posterior = self.cabecalho(data_posterior)
+        faltando = [d for d, c in ((data_anterior, anterior), (data_posterior, posterior)) if c is None]
+        if faltando:
+            raise ValueError(f"Fechamento inexistente: {', '.join(faltando)}")
+
+        diferencas = self._consultar('''
+            SELECT d.*, n.numero_nf FROM (
+                SELECT a.nota_fiscal_id,
+                       CASE
+                           WHEN b.nota_fiscal_id IS NULL THEN 'saiu'
+                           WHEN a.situacao != b.situacao THEN 'venceu'
+                           WHEN ABS(a.valor_esperado - b.valor_esperado) > 0.005
+                                OR ABS(a.recebido - b.recebido) > 0.005 THEN 'alterou'
+                       END as mudanca,
+                       a.situacao as situacao_anterior, b.situacao as situacao_posterior,
+                       a.valor_esperado - a.recebido as saldo_anterior,
+                       COALESCE(b.valor_esperado - b.recebido, 0) as saldo_posterior
+                FROM fechamento_nota a
+                LEFT JOIN fechamento_nota b ON b.fechamento_id = :b AND b.nota_fiscal_id = a.nota_fiscal_id
+                WHERE a.fechamento_id = :a
+                UNION ALL
+                SELECT b.nota_fiscal_id, 'entrou', NULL, b.situacao, 0, b.valor_esperado - b.recebido
+                FROM fechamento_nota b
+                WHERE b.fechamento_id = :b
+                AND NOT EXISTS (SELECT 1 FROM fechamento_nota a
+                                WHERE a.fechamento_id = :a AND a.nota_fiscal_id = b.nota_fiscal_id)
+            ) d
+            LEFT JOIN notas_fiscais n ON n.id = d.nota_fiscal_id
+            WHERE d.mudanca IS NOT NULL
+            ORDER BY ABS(d.saldo_posterior - d.saldo_anterior) DESC
+        ''', {'a': anterior['id'], 'b': posterior['id']})
+
+        resumo = {}
+        for d in diferencas:
+            item = resumo.setdefault(d['mudanca'], {'qtd': 0, 'variacao_saldo': 0.0})
+            item['qtd'] += 1
+            item['variacao_saldo'] += d['saldo_posterior'] - d['saldo_anterior']
+        for item in resumo.values():
+            item['variacao_saldo'] = round(item['variacao_saldo'], 2)
+
+        totais = {}
+        for campo in ('qtd_a_receber', 'total_a_receber', 'qtd_atrasado', 'total_atrasado'):
+            totais[campo] = {
+                'anterior': anterior[campo],
+                'posterior': posterior[campo],
+                'variacao': round(posterior[campo] - anterior[campo], 2)
+            }
+
+        return {
+            'anterior': data_anterior,
+            'posterior': data_posterior,
+            'totais': totais,
+            'resumo': resumo,
+            'notas': diferencas[:limite],
+            'total_notas': len(diferencas)
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fechamentos mensais de recebíveis')
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+    gerar = subcomandos.add_parser('gerar', help='Gera o fechamento de uma data')
+    gerar.add_argument('--data', required=True, help='YYYY-MM-DD')
+    gerar.add_argument('--substituir', action='store_true', help='Refaz se já existir')
+    subcomandos.add_parser('mensal', help='Gera os fins de mês que ainda não têm fechamento')
+    comparar = subcomandos.add_parser('comparar', help='Compara dois fechamentos')
+    comparar.add_argument('anterior')
+    comparar.add_argument('posterior')
+    subcomandos.add_parser('listar', help='Lista os fechamentos gravados')
+    parser.add_argument('--db', default='sistema_nf.db')
+    args = parser.parse_args()
+
+    from database import Database
+    fechamento = Fechamento(Database(args.db))
+
+    def mostrar(f):
+        print(f"📅 {f['data_referencia']}  a receber {f['qtd_a_receber']:>6,} R$ {f['total_a_receber']:>16,.2f}  "
+              f"atrasado {f['qtd_atrasado']:>6,} R$ {f['total_atrasado']:>16,.2f}  ({f['origem']})")
+
+    if args.comando == 'gerar':
+        mostrar(fechamento.gerar(args.data, substituir=args.substituir))
+    elif args.comando == 'mensal':
+        gerados = fechamento.gerar_pendentes()
+        for f in gerados:
+            mostrar(f)
+        print(f'✅ {len(gerados)} fechamento(s) gerado(s)')
+    elif args.comando == 'listar':
+        for f in fechamento.listar():
+            mostrar(f)
+    else:
+        resultado = fechamento.comparar(args.anterior, args.posterior)
+        for campo, valores in resultado['totais'].items():
+            print(f"   {campo:<16} {valores['anterior']:>16,.2f} → {valores['posterior']:>16,.2f} "
+                  f"({valores['variacao']:+,.2f})")
+        for mudanca, item in resultado['resumo'].items():
+            print(f"   {mudanca:<8} {item['qtd']:>6,} notas  saldo {item['variacao_saldo']:+,.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+Fila de Escrita - serializa as escritas no SQLite em uma thread dedicada
+O SQLite aceita um escritor por vez: em vez de cada requisição disputar a trava
+(e falhar com 'database is locked'), as escritas entram em uma fila, a thread
+escritora as agrupa em lotes pequenos e faz um único COMMIT por lote (group commit).
+Leituras usam um pool de conexões; no modo WAL elas não bloqueiam a escrita (no PostgreSQL,
+as leituras vêm do pool do próprio backend).
+"""
+import queue
+import threading
+from concurrent.futures import Future
+
+from instrumentacao import ConexaoRastreada, contexto_atual, usar_contexto
+
+# Operações por transação e quanto esperar por mais operações antes de gravar o lote
+MAX_LOTE = 64
+ESPERA_LOTE = 0.002
+
+CONEXOES_LEITURA = 8
+
+
+class FilaEscrita:
+    """Thread dona da conexão de escrita; cada operação vira um Future para quem a enviou
+
+    Cada operação roda em um SAVEPOINT dentro da transação do lote: se uma falhar, só ela
+    é desfeita e o erro vai para o seu Future; as demais do lote são gravadas. Os
+    resultados só são entregues depois do COMMIT. As consultas de cada operação contam
+    na instrumentação da requisição que a enviou.
+    """
+
+    def __init__(self, conectar, max_lote=MAX_LOTE, espera_lote=ESPERA_LOTE):
+        """
+        Args:
+            conectar: Função que abre a conexão de escrita (usada só pela thread escritora)
+            max_lote: Máximo de operações por transação
+            espera_lote: Segundos aguardando novas operações depois da primeira do lote
+        """
+        self.conectar = conectar
+        self.max_lote = max_lote
+        self.espera_lote = espera_lote
+        self.fila = queue.Queue()
+        self.lotes = 0
+        self.operacoes = 0
+        self.thread = threading.Thread(target=self._executar, name='fila-escrita', daemon=True)
+        self.thread.start()
+
+    def enviar(self, operacao):
+        """Enfileira operacao(cursor) e devolve o Future com o seu resultado"""
+        futuro = Future()
+        self.fila.put((futuro, operacao, contexto_atual()))
+        return futuro
+
+    def executar(self, operacao):
+        """Enfileira e espera o resultado (levanta a exceção da operação, se houver)"""
+        return self.enviar(operacao).result()
+
+    def fechar(self):
+        """Grava o que já está na fila e encerra a thread"""
+        self.fila.put(None)
+        self.thread.join()
+
+    def _executar(self):
+        conn = self.conectar()
+        # Transações controladas explicitamente (BEGIN IMMEDIATE / SAVEPOINT / COMMIT)
+        conn.isolation_level = None
+
+        encerrar = False
+        while not encerrar:
+            item = self.fila.get()
+            if item is None:
+                break
+
+            lote = [item]
+            while len(lote) < self.max_lote:
+                try:
+                    item = self.fila.get(timeout=self.espera_lote)
+                except queue.Empty:
+                    break
+                if item is None:
+                    encerrar = True
+                    break
+                lote.append(item)
+
+            self._gravar(conn, lote)
+
+        conn.close()
+
+    def _gravar(self, conn, lote):
+        """Uma transação para o lote inteiro; um SAVEPOINT por operação"""
+        cursor = conn.cursor()
+        concluidas = []
+
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            for futuro, operacao, contexto in lote:
+                if not futuro.set_running_or_notify_cancel():
+                    continue
+
+                cursor.execute('SAVEPOINT operacao')
+                try:
+                    with usar_contexto(contexto):
+                        resultado = operacao(cursor)
+                except Exception as e:
+                    cursor.execute('ROLLBACK TO operacao')
+                    cursor.execute('RELEASE operacao')
+                    concluidas.append((futuro, None, e))
+                else:
+                    cursor.execute('RELEASE operacao')
+                    concluidas.append((futuro, resultado, None))
+            cursor.execute('COMMIT')
+        except Exception as e:
+            # Falha na transação do lote (COMMIT, disco cheio...): nada foi gravado
+            if conn.in_transaction:
+                conn.rollback()
+            for futuro, _, _ in concluidas:
+                futuro.set_exception(e)
+            for futuro, _, _ in lote:
+                if futuro.running():
+                    futuro.set_exception(e)
+            return
+
+        self.lotes += 1
+        self.operacoes += len(concluidas)
+        for futuro, resultado, erro in concluidas:
+            if erro is not None:
+                futuro.set_exception(erro)
+            else:
+                futuro.set_result(resultado)
+
+
+class ConexaoPool(ConexaoRastreada):
+    """Conexão que volta para o pool em close() em vez de fechar"""
+
+    pool = None
+
+    def close(self):
+        if self.pool is None or not self.pool.devolver(self):
+            super().close()
+
+
+class PoolLeitura:
+    """Conexões reaproveitadas entre requisições (uma thread por vez em cada conexão)"""
+
+    def __init__(self, conectar, tamanho=CONEXOES_LEITURA):
+        """
+        Args:
+            conectar: Abre uma conexão nova, chamada como conectar(factory=ConexaoPool, check_same_thread=False)
+        """
+        self.conectar = conectar
+        self.tamanho = tamanho
+        self.livres = queue.LifoQueue()
+
+    def obter(self):
+        try:
+            return self.livres.get_nowait()
+        except queue.Empty:
+            conn = self.conectar(factory=ConexaoPool, check_same_thread=False)
+            conn.pool = self
+            return conn
+
+    def devolver(self, conn):
+        """Limpa o estado deixado pelo uso; False se o pool já está cheio (a conexão é fechada)"""
+        if conn.in_transaction:
+            conn.rollback()
+        conn.row_factory = None
+        if self.livres.qsize() >= self.tamanho:
+            return False
+        self.livres.put(conn)
+        return True
+
+    def fechar(self):
+        while True:
+            try:
+                conn = self.livres.get_nowait()
+            except queue.Empty:
+                break
+            conn.pool = None
+            conn.close()
@@ -0,0 +1,74 @@
+"""
+Idempotência das escritas - chave enviada pelo cliente (cabeçalho Idempotency-Key)
+O resultado da primeira execução fica guardado; repetir a requisição (duplo clique,
+nova tentativa após timeout) devolve o mesmo resultado sem escrever de novo.
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+# Por quanto tempo uma chave é lembrada
+VALIDADE_HORAS = 24
+
+
+class ChaveIdempotenciaReutilizada(Exception):
+    """A mesma chave foi enviada com outro conteúdo ou para outra rota"""
+
+
+def criar_estrutura(cursor):
+    """Cria a tabela de chaves (índice em criado_em para a limpeza por validade)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS requisicao_idempotente (
+            chave TEXT PRIMARY KEY,
+            rota TEXT NOT NULL,
+            hash_requisicao TEXT NOT NULL,
+            resultado TEXT,
+            criado_em TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_requisicao_idempotente_criado '
+                   'ON requisicao_idempotente(criado_em)')
+
+
+def _hash(dados):
+    texto = json.dumps(dados, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def _limite_validade():
+    return (datetime.now() - timedelta(hours=VALIDADE_HORAS)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def consultar(cursor, chave, rota, dados):
+    """Resultado guardado para a chave, ou None se ela é nova (ou expirou)
+
+    Deve rodar dentro da mesma transação BEGIN IMMEDIATE da escrita: uma
+    requisição repetida em paralelo espera a primeira terminar e então encontra a chave.
+
+    Raises:
+        ChaveIdempotenciaReutilizada: chave conhecida com conteúdo ou rota diferentes
+    """
+    cursor.execute('''
+        SELECT rota, hash_requisicao, resultado FROM requisicao_idempotente
+        WHERE chave = ? AND criado_em >= ?
+    ''', (chave, _limite_validade()))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+
+    if row[0] != rota or row[1] != _hash(dados):
+        raise ChaveIdempotenciaReutilizada(f'Chave de idempotência {chave} já usada em outra requisição')
+    return json.loads(row[2])
+
+
+def registrar(cursor, chave, rota, dados, resultado):
+    """Guarda o resultado da escrita e descarta as chaves vencidas (faixa do índice)"""
+    cursor.execute('DELETE FROM requisicao_idempotente WHERE criado_em < ?', (_limite_validade(),))
+    cursor.execute('''
+        INSERT INTO requisicao_idempotente (chave, rota, hash_requisicao, resultado, criado_em)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (chave) DO UPDATE SET
+            rota = excluded.rota, hash_requisicao = excluded.hash_requisicao,
+            resultado = excluded.resultado, criado_em = excluded.criado_em
+    ''', (chave, rota, _hash(dados), json.dumps(resultado, default=str),
+          datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
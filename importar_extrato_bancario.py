@@ -0,0 +1,381 @@
+"""
+Importação de extrato bancário (OFX, CNAB 240/400 de retorno, CSV)
+Lê o arquivo em streaming, sugere as NFs de cada crédito e grava tudo em uma transação
+Créditos sem data utilizável não são gravados: voltam em 'rejeitados' com a linha e o motivo
+
+Uso:
+    python importar_extrato_bancario.py extrato.ofx
+    python importar_extrato_bancario.py retorno.ret --previa --tolerancia 0.10
+"""
+import csv
+import hashlib
+import os
+import re
+import unicodedata
+from datetime import datetime
+
+from conciliacao_automatica import TOLERANCIA_PADRAO, sugerir_nfs
+from database import Database
+
+# Movimentos de liquidação nos arquivos de retorno
+OCORRENCIAS_LIQUIDACAO_240 = {'06', '17'}
+OCORRENCIAS_LIQUIDACAO_400 = {'06', '15', '16', '17'}
+
+# Cabeçalhos aceitos no CSV (sem acento, minúsculos)
+COLUNAS_CSV = {
+    'data': ('data', 'data lancamento', 'data do lancamento', 'data_recebimento', 'dt lancamento'),
+    'valor': ('valor', 'valor (r$)', 'valor r$', 'credito', 'valor_recebido'),
+    'historico': ('historico', 'descricao', 'complemento', 'memo', 'lancamento'),
+    'documento': ('documento', 'n documento', 'numero documento', 'doc', 'id'),
+}
+
+
+def _abrir_texto(caminho):
+    """Abre o arquivo como texto (UTF-8 se possível, senão Latin-1, comum em arquivos de banco)"""
+    with open(caminho, 'rb') as arquivo:
+        amostra = arquivo.read(65536)
+    try:
+        amostra[:-4].decode('utf-8')
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError:
+        encoding = 'latin-1'
+    return open(caminho, encoding=encoding, newline='')
+
+
+def detectar_formato(caminho):
+    """'ofx', 'cnab240', 'cnab400' ou 'csv' pela extensão e pela primeira linha"""
+    extensao = os.path.splitext(caminho)[1].lower()
+    if extensao == '.ofx':
+        return 'ofx'
+    if extensao == '.csv':
+        return 'csv'
+
+    with _abrir_texto(caminho) as arquivo:
+        primeira = arquivo.readline()
+    if primeira.lstrip().upper().startswith(('OFXHEADER', '<OFX', '<?XML')):
+        return 'ofx'
+    tamanho = len(primeira.rstrip('\r\n'))
+    if tamanho == 240:
+        return 'cnab240'
+    if tamanho == 400:
+        return 'cnab400'
+    return 'csv'
+
+
+def _lancamento(data, valor, complemento, documento_banco, documento):
+    return {
+        'data_recebimento': data,
+        'valor_recebido': round(valor, 2),
+        'complemento': complemento.strip(),
+        'documento_banco': documento_banco.strip(),
+        'documento': documento,
+        'tipo_recebimento': 'Integral',
+        'nfs_referentes': ''
+    }
+
+
+def _rejeitar(rejeitados, numero_linha, motivo):
+    if rejeitados is not None:
+        rejeitados.append({'linha': numero_linha, 'motivo': motivo})
+
+
+# ------------------------------------------------------------
+# OFX (SGML 1.x ou XML 2.x; um bloco STMTTRN por vez)
+# ------------------------------------------------------------
+def ler_ofx(caminho, rejeitados=None):
+    padrao_campo = re.compile(r'<(\w+)>([^<\r\n]*)')
+    conta = ''
+    buffer = ''
+
+    with _abrir_texto(caminho) as arquivo:
+        for numero_linha, linha in enumerate(arquivo, 1):
+            buffer += linha
+            if not conta:
+                encontrado = re.search(r'<ACCTID>([^<\r\n]+)', buffer)
+                if encontrado:
+                    conta = encontrado.group(1).strip()
+
+            while True:
+                inicio = buffer.upper().find('<STMTTRN>')
+                fim = buffer.upper().find('</STMTTRN>', inicio)
+                if inicio < 0 or fim < 0:
+                    break
+                bloco, buffer = buffer[inicio:fim], buffer[fim + len('</STMTTRN>'):]
+
+                campos = {tag.upper(): valor.strip() for tag, valor in padrao_campo.findall(bloco)}
+                valor = float(campos.get('TRNAMT', '0').replace(',', '.'))
+                if valor <= 0:
+                    continue
+
+                try:
+                    data = datetime.strptime(campos.get('DTPOSTED', '')[:8], '%Y%m%d').strftime('%Y-%m-%d')
+                except ValueError:
+                    _rejeitar(rejeitados, numero_linha, 'DTPOSTED ausente ou inválido')
+                    continue
+                historico = ' '.join(filter(None, (campos.get('NAME'), campos.get('MEMO'))))
+                fitid = campos.get('FITID') or hashlib.sha1(bloco.encode()).hexdigest()
+                yield _lancamento(data, valor, historico, campos.get('CHECKNUM', fitid),
+                                  f'ofx:{conta}:{fitid}')
+
+            if '<STMTTRN>' not in buffer.upper():
+                # Mantém só o necessário para achar o próximo bloco
+                buffer = buffer[-20:] if conta else buffer[-4096:]
+
+
+# ------------------------------------------------------------
+# CNAB 240 (retorno de cobrança, segmentos T + U)
+# ------------------------------------------------------------
+def _data_cnab(texto, formato='%d%m%Y'):
+    """Data do CNAB em 'YYYY-MM-DD'; None para campo zerado, em branco ou inválido"""
+    texto = texto.strip()
+    if not texto or not texto.strip('0'):
+        return None
+    try:
+        return datetime.strptime(texto, formato).strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+
+def ler_cnab240(caminho, rejeitados=None):
+    segmento_t = None
+    # Data de geração do header do arquivo: usada quando crédito e ocorrência vêm zerados
+    data_geracao = None
+
+    with _abrir_texto(caminho) as arquivo:
+        for numero_linha, linha in enumerate(arquivo, 1):
+            if len(linha) < 240:
+                continue
+            if linha[7] == '0':
+                data_geracao = _data_cnab(linha[143:151])
+                continue
+            if linha[7] != '3':
+                continue
+
+            segmento = linha[13]
+            if segmento == 'T':
+                segmento_t = linha
+                continue
+            if segmento != 'U' or segmento_t is None:
+                continue
+
+            t, u, segmento_t = segmento_t, linha, None
+            if t[15:17] not in OCORRENCIAS_LIQUIDACAO_240:
+                continue
+
+            valor = int(u[77:92]) / 100
+            if valor <= 0:
+                continue
+
+            data = _data_cnab(u[145:153]) or _data_cnab(u[137:145]) or data_geracao
+            if not data:
+                _rejeitar(rejeitados, numero_linha, 'Sem data de crédito, de ocorrência ou de geração do arquivo')
+                continue
+            nosso_numero = t[37:57].strip()
+            seu_numero = t[58:73].strip()
+            yield _lancamento(data, valor, f'CNAB240 {seu_numero} NN {nosso_numero}', seu_numero,
+                              f'cnab:{t[0:3]}:{nosso_numero}:{t[15:17]}')
+
+
+# ------------------------------------------------------------
+# CNAB 400 (retorno de cobrança, leiaute Febraban/Bradesco)
+# ------------------------------------------------------------
+def ler_cnab400(caminho, rejeitados=None):
+    banco = ''
+    data_gravacao = None
+
+    with _abrir_texto(caminho) as arquivo:
+        for numero_linha, linha in enumerate(arquivo, 1):
+            if len(linha) < 400:
+                continue
+            if linha[0] == '0':
+                banco = linha[76:79]
+                data_gravacao = _data_cnab(linha[94:100], '%d%m%y')
+                continue
+            if linha[0] != '1':
+                continue
+
+            ocorrencia = linha[108:110]
+            if ocorrencia not in OCORRENCIAS_LIQUIDACAO_400:
+                continue
+
+            valor = int(linha[253:266]) / 100
+            if valor <= 0:
+                continue
+
+            data = (_data_cnab(linha[295:301], '%d%m%y') or _data_cnab(linha[110:116], '%d%m%y')
+                    or data_gravacao)
+            if not data:
+                _rejeitar(rejeitados, numero_linha, 'Sem data de crédito, de ocorrência ou de gravação do arquivo')
+                continue
+            nosso_numero = linha[70:82].strip()
+            seu_numero = linha[116:126].strip()
+            yield _lancamento(data, valor, f'CNAB400 {seu_numero} NN {nosso_numero}', seu_numero,
+                              f'cnab:{banco}:{nosso_numero}:{ocorrencia}')
+
+
+# ------------------------------------------------------------
+# CSV exportado do internet banking
+# ------------------------------------------------------------
+def _sem_acento(texto):
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in texto if not unicodedata.combining(c)).strip().lower()
+
+
+def _valor_brasileiro(texto):
+    """'1.234,56' / '1234.56' / 'R$ -10,00' -> float"""
+    texto = re.sub(r'[^\d,.\-]', '', texto or '')
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    return float(texto) if texto not in ('', '-') else 0.0
+
+
+def _data_csv(texto):
+    for formato in ('%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%d/%m/%y'):
+        try:
+            return datetime.strptime(texto.strip()[:10], formato).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
+
+
+class DialetoBanco(csv.excel):
+    """Padrão dos bancos brasileiros quando o Sniffer não decide"""
+    delimiter = ';'
+
+
+def ler_csv(caminho, rejeitados=None):
+    with _abrir_texto(caminho) as arquivo:
+        amostra = arquivo.read(4096)
+        arquivo.seek(0)
+        try:
+            dialeto = csv.Sniffer().sniff(amostra, delimiters=';,\t')
+        except csv.Error:
+            dialeto = DialetoBanco
+
+        leitor = csv.reader(arquivo, dialeto)
+        cabecalho = [_sem_acento(coluna) for coluna in next(leitor, [])]
+        indices = {}
+        for campo, nomes in COLUNAS_CSV.items():
+            for nome in nomes:
+                if nome in cabecalho:
+                    indices[campo] = cabecalho.index(nome)
+                    break
+        if 'data' not in indices or 'valor' not in indices:
+            raise ValueError('CSV sem colunas de data e valor reconhecíveis')
+
+        vistos = {}
+        for linha in leitor:
+            if len(linha) <= max(indices.values()):
+                continue
+            data = _data_csv(linha[indices['data']])
+            valor = _valor_brasileiro(linha[indices['valor']])
+            if valor <= 0:
+                continue
+            if not data:
+                _rejeitar(rejeitados, leitor.line_num, f"Data inválida: {linha[indices['data']]!r}")
+                continue
+
+            historico = linha[indices['historico']] if 'historico' in indices else ''
+            documento_banco = linha[indices['documento']] if 'documento' in indices else ''
+            if documento_banco.strip():
+                documento = f'csv:{documento_banco.strip()}'
+            else:
+                # Sem identificador: data + valor + histórico (+ ocorrência, para linhas idênticas)
+                base = f'{data}|{valor:.2f}|{historico.strip()}'
+                vistos[base] = vistos.get(base, 0) + 1
+                documento = 'csv:' + hashlib.sha1(f'{base}|{vistos[base]}'.encode()).hexdigest()
+
+            yield _lancamento(data, valor, historico, documento_banco, documento)
+
+
+LEITORES = {
+    'ofx': ler_ofx,
+    'cnab240': ler_cnab240,
+    'cnab400': ler_cnab400,
+    'csv': ler_csv,
+}
+
+
+class ExtratoBancarioImporter:
+    def __init__(self, caminho, db=None, tolerancia=TOLERANCIA_PADRAO, nome_arquivo=None):
+        self.caminho = caminho
+        self.db = db or Database()
+        self.tolerancia = tolerancia
+        self.nome_arquivo = nome_arquivo or os.path.basename(caminho)
+        self.formato = detectar_formato(caminho)
+        self.rejeitados = []
+
+    def ler(self):
+        """Itera os créditos do arquivo (débitos e movimentos que não são liquidação são ignorados)
+
+        Créditos sem data vão para self.rejeitados em vez de serem devolvidos.
+        """
+        return LEITORES[self.formato](self.caminho, self.rejeitados)
+
+    def importar(self, aplicar=True):
+        """Lê, sugere as NFs e (se aplicar) grava os lançamentos
+
+        Os créditos do arquivo ficam todos em memória (a leitura é em streaming, mas a sugestão
+        distribui as pendentes entre todos os créditos e a gravação é uma transação só); são
+        dicionários pequenos, algumas dezenas de MB mesmo para extratos de centenas de milhares
+        de linhas. Arquivos maiores devem ser divididos antes da importação.
+
+        Returns:
+            dict com resumo, a lista de lançamentos com suas sugestões e os créditos rejeitados
+        """
+        lancamentos = list(self.ler())
+
+        # Lançamentos de arquivos já importados não reservam notas para si
+        ja_importados = self.db.documentos_importados([l['documento'] for l in lancamentos])
+        novos = [l for l in lancamentos if l['documento'] not in ja_importados]
+
+        sugerir_nfs(novos, self.db.listar_pendentes(), self.tolerancia)
+
+        ids = []
+        if aplicar and novos:
+            ids, _ = self.db.inserir_recebimentos_lote(novos, arquivo=self.nome_arquivo)
+
+        conciliados = [l for l in novos if l['sugestao']]
+        return {
+            'formato': self.formato,
+            'lidos': len(lancamentos),
+            'duplicados': len(lancamentos) - len(novos),
+            'novos': len(novos),
+            'com_sugestao': len(conciliados),
+            'sem_sugestao': len(novos) - len(conciliados),
+            'valor_total': round(sum(l['valor_recebido'] for l in novos), 2),
+            'rejeitados': self.rejeitados,
+            'aplicado': bool(aplicar),
+            'extrato_ids': ids,
+            'notas_ids': [l['sugestao']['nota_id'] for l in conciliados],
+            'lancamentos': novos
+        }
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Importa extrato bancário (OFX, CNAB 240/400, CSV)')
+    parser.add_argument('arquivo')
+    parser.add_argument('--previa', action='store_true', help='Só mostra as sugestões, sem gravar')
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_PADRAO,
+                        help='Diferença máxima (R$) entre recebido e esperado')
+    parser.add_argument('--db', default='sistema_nf.db')
+    args = parser.parse_args()
+
+    importer = ExtratoBancarioImporter(args.arquivo, db=Database(args.db), tolerancia=args.tolerancia)
+    resultado = importer.importar(aplicar=not args.previa)
+
+    print("=" * 60)
+    print(f"EXTRATO BANCÁRIO ({resultado['formato'].upper()})")
+    print("=" * 60)
+    for lancamento in resultado['lancamentos']:
+        sugestao = lancamento['sugestao']
+        destino = f"NF {sugestao['numero_nf']} ({sugestao['motivo']})" if sugestao else '—'
+        print(f"   {lancamento['data_recebimento']}  R$ {lancamento['valor_recebido']:>12,.2f}  → {destino}")
+    print(f"\n📄 {resultado['lidos']} créditos lidos ({resultado['duplicados']} já importados)")
+    for rejeitado in resultado['rejeitados']:
+        print(f"❌ Linha {rejeitado['linha']}: {rejeitado['motivo']}")
+    print(f"✅ {resultado['com_sugestao']} com NF sugerida / ⚠️  {resultado['sem_sugestao']} sem sugestão")
+    print(f"💰 Total: R$ {resultado['valor_total']:,.2f}")
+    print('💾 Gravado' if resultado['aplicado'] else '👀 Prévia (nada gravado)')
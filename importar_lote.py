@@ -0,0 +1,211 @@
+"""
+Importação em Lote - várias planilhas regionais (.xlsm) consolidadas de uma vez
+Cada planilha é lida em um processo próprio (a leitura com pandas/openpyxl usa um
+núcleo só); os processos devolvem as linhas já normalizadas e um único escritor, no
+processo principal, grava em blocos (uma transação por bloco) e concilia. Notas de
+todas as planilhas entram antes dos recebimentos, para a conciliação encontrar NFs
+de qualquer arquivo. O relatório consolida rejeitadas (validacao_planilha), avisos e
+duplicadas de todos os arquivos.
+
+Uso:
+    python importar_lote.py norte.xlsm sul.xlsm leste.xlsm [--processos 4] [--relatorio relatorio.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from database import normalizar_numero_nf
+from importar_planilha import ler_extrato, ler_notas_fiscais
+
+# Linhas por transação do escritor
+BLOCO_ESCRITA = 500
+
+
+def ler_planilha(caminho):
+    """Lê e valida as abas NF'S e Extrato de uma planilha (roda no processo de leitura)"""
+    inicio = time.perf_counter()
+    notas, problemas_notas = ler_notas_fiscais(caminho)
+    recebimentos, problemas_extrato = ler_extrato(caminho)
+    return {
+        'notas': notas,
+        'recebimentos': recebimentos,
+        'problemas': [{'aba': "NF'S", **problema} for problema in problemas_notas] +
+                     [{'aba': 'Extrato', **problema} for problema in problemas_extrato],
+        'segundos_leitura': time.perf_counter() - inicio
+    }
+
+
+def _chave_recebimento(dados):
+    return (dados['data_recebimento'], round(float(dados['valor_recebido']), 2), dados['nfs_referentes'])
+
+
+def _recebimentos_existentes(db, recebimentos):
+    """Chaves (data, valor, NFs) já no extrato, no intervalo de datas do lote (uma consulta)"""
+    if not recebimentos:
+        return set()
+    datas = [dados['data_recebimento'] for _, _, dados in recebimentos]
+    conn = db._conectar()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT data_recebimento, valor_recebido, nfs_referentes FROM extrato
+        WHERE data_recebimento BETWEEN ? AND ?
+    ''', (min(datas), max(datas)))
+    existentes = {(data, round(valor, 2), nfs) for data, valor, nfs in cursor.fetchall()}
+    conn.close()
+    return existentes
+
+
+def _gravar_em_blocos(db, linhas, inserir, rejeitadas, aba):
+    """Escritor único: blocos de BLOCO_ESCRITA linhas, um SAVEPOINT por linha
+
+    Uma linha que falha (ex.: NF duplicada gravada em paralelo por outra requisição)
+    vai para as rejeitadas sem desfazer as demais do bloco.
+    """
+    gravadas = 0
+    for inicio in range(0, len(linhas), BLOCO_ESCRITA):
+        bloco = linhas[inicio:inicio + BLOCO_ESCRITA]
+
+        def gravar(cursor, bloco=bloco):
+            erros = []
+            for arquivo, linha, dados in bloco:
+                cursor.execute('SAVEPOINT linha_importada')
+                try:
+                    inserir(cursor, dados)
+                except Exception as e:
+                    cursor.execute('ROLLBACK TO linha_importada')
+                    erros.append({'arquivo': arquivo, 'aba': aba, 'linha': linha, 'coluna': None, 'valor': None,
+                                  'nivel': 'erro', 'mensagem': str(e)})
+                cursor.execute('RELEASE linha_importada')
+            return erros
+
+        erros = db._executar_escrita(gravar)
+        rejeitadas.extend(erros)
+        gravadas += len(bloco) - len(erros)
+    return gravadas
+
+
+def importar_planilhas(caminhos, db, processos=None, nomes=None):
+    """Lê as planilhas em paralelo e grava tudo por um único escritor
+
+    Args:
+        caminhos: Arquivos .xlsx/.xlsm
+        db: Database de destino
+        processos: Processos de leitura (padrão: um por núcleo, no máximo um por arquivo);
+            1 lê no próprio processo
+        nomes: Nomes dos arquivos no relatório (padrão: o nome de cada caminho)
+
+    Returns:
+        dict: Relatório consolidado (por arquivo, rejeitadas, avisos, duplicadas e totais)
+    """
+    nomes = list(nomes or [os.path.basename(caminho) for caminho in caminhos])
+    processos = max(1, min(processos or os.cpu_count() or 1, len(caminhos)))
+    inicio = time.perf_counter()
+
+    if processos == 1:
+        lidas = [ler_planilha(caminho) for caminho in caminhos]
+    else:
+        # spawn: o processo principal pode ter threads (fila de escrita, servidor) e fork as copiaria
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=processos, mp_context=contexto) as executor:
+            lidas = list(executor.map(ler_planilha, caminhos))
+    segundos_leitura = time.perf_counter() - inicio
+
+    rejeitadas = []
+    avisos = []
+    duplicadas = []
+    arquivos = []
+    notas = []
+    recebimentos = []
+    for nome, lida in zip(nomes, lidas):
+        arquivos.append({
+            'arquivo': nome,
+            'notas_lidas': len(lida['notas']),
+            'recebimentos_lidos': len(lida['recebimentos']),
+            'rejeitadas': len({(problema['aba'], problema['linha']) for problema in lida['problemas']
+                               if problema['nivel'] == 'erro'}),
+            'segundos_leitura': round(lida['segundos_leitura'], 3)
+        })
+        for problema in lida['problemas']:
+            (rejeitadas if problema['nivel'] == 'erro' else avisos).append({'arquivo': nome, **problema})
+        notas.extend((nome, linha, dados) for linha, dados in lida['notas'])
+        recebimentos.extend((nome, linha, dados) for linha, dados in lida['recebimentos'])
+
+    # Duplicadas: a primeira ocorrência (na ordem dos arquivos) vence; o banco vence todas
+    no_banco = db.numeros_nf_existentes({dados['numero_nf'] for _, _, dados in notas})
+    vistas = {}
+    notas_novas = []
+    for nome, linha, dados in notas:
+        numero_nf = normalizar_numero_nf(dados['numero_nf'])
+        if numero_nf in no_banco:
+            duplicadas.append({'arquivo': nome, 'aba': "NF'S", 'linha': linha, 'chave': numero_nf,
+                               'motivo': 'ja_no_banco'})
+        elif numero_nf in vistas:
+            duplicadas.append({'arquivo': nome, 'aba': "NF'S", 'linha': linha, 'chave': numero_nf,
+                               'motivo': 'repetida', 'primeira_em': vistas[numero_nf]})
+        else:
+            vistas[numero_nf] = f'{nome}:{linha}'
+            notas_novas.append((nome, linha, dados))
+
+    no_extrato = _recebimentos_existentes(db, recebimentos)
+    vistos = {}
+    recebimentos_novos = []
+    for nome, linha, dados in recebimentos:
+        chave = _chave_recebimento(dados)
+        if chave in no_extrato:
+            duplicadas.append({'arquivo': nome, 'aba': 'Extrato', 'linha': linha, 'chave': ' | '.join(map(str, chave)),
+                               'motivo': 'ja_no_banco'})
+        elif chave in vistos:
+            duplicadas.append({'arquivo': nome, 'aba': 'Extrato', 'linha': linha, 'chave': ' | '.join(map(str, chave)),
+                               'motivo': 'repetida', 'primeira_em': vistos[chave]})
+        else:
+            vistos[chave] = f'{nome}:{linha}'
+            recebimentos_novos.append((nome, linha, dados))
+
+    inicio_escrita = time.perf_counter()
+    notas_gravadas = _gravar_em_blocos(db, notas_novas, db._inserir_nota, rejeitadas, "NF'S")
+    recebimentos_gravados = _gravar_em_blocos(db, recebimentos_novos, db._inserir_recebimento, rejeitadas, 'Extrato')
+
+    return {
+        'arquivos': arquivos,
+        'processos': processos,
+        'notas_importadas': notas_gravadas,
+        'recebimentos_importados': recebimentos_gravados,
+        'rejeitadas': rejeitadas,
+        'avisos': avisos,
+        'duplicadas': duplicadas,
+        'segundos_leitura': round(segundos_leitura, 3),
+        'segundos_escrita': round(time.perf_counter() - inicio_escrita, 3),
+        'segundos_total': round(time.perf_counter() - inicio, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Importa várias planilhas de faturamento em paralelo')
+    parser.add_argument('planilhas', nargs='+', help='Arquivos .xlsx/.xlsm')
+    parser.add_argument('--processos', type=int, help='Processos de leitura (padrão: um por núcleo)')
+    parser.add_argument('--relatorio', help='Grava o relatório completo em JSON')
+    parser.add_argument('--db', default='sistema_nf.db')
+    args = parser.parse_args()
+
+    from database import Database
+    relatorio = importar_planilhas(args.planilhas, Database(args.db), processos=args.processos)
+
+    for arquivo in relatorio['arquivos']:
+        print(f"📄 {arquivo['arquivo']}: {arquivo['notas_lidas']} notas, {arquivo['recebimentos_lidos']} "
+              f"recebimentos, {arquivo['rejeitadas']} rejeitadas ({arquivo['segundos_leitura']:.1f}s)")
+    print(f"\n✅ {relatorio['notas_importadas']} notas e {relatorio['recebimentos_importados']} recebimentos "
+          f"importados em {relatorio['segundos_total']:.1f}s ({relatorio['processos']} processos)")
+    print(f"⚠️  {len(relatorio['rejeitadas'])} rejeitadas, {len(relatorio['avisos'])} avisos, "
+          f"{len(relatorio['duplicadas'])} duplicadas")
+
+    if args.relatorio:
+        with open(args.relatorio, 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+        print(f"📝 Relatório em {args.relatorio}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""
+Instrumentação - Latência por rota e perfil de consultas ao banco (SQLite ou PostgreSQL)
+Mantém histogramas em memória (por processo) e exporta no formato texto do Prometheus
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Limites dos buckets dos histogramas (em segundos)
+BUCKETS_PADRAO = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 250, 500)
+
+
+class Histograma:
+    """Histograma cumulativo no estilo Prometheus"""
+
+    def __init__(self, buckets=BUCKETS_PADRAO):
+        self.buckets = buckets
+        self.contagens = [0] * len(buckets)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.soma += valor
+        self.total += 1
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.contagens[i] += 1
+
+
+class RegistroMetricas:
+    """Registro de histogramas e contadores, seguro para múltiplas threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histogramas = {}
+        self._contadores = {}
+        self._descricoes = {}
+
+    def descrever(self, nome, descricao):
+        self._descricoes[nome] = descricao
+
+    def observar(self, nome, valor, buckets=BUCKETS_PADRAO, **labels):
+        """Registra uma observação no histograma `nome` com os labels informados"""
+        chave = (nome, tuple(sorted(labels.items())))
+        with self._lock:
+            histograma = self._histogramas.get(chave)
+            if histograma is None:
+                histograma = self._histogramas[chave] = Histograma(buckets)
+            histograma.observar(valor)
+
+    def incrementar(self, nome, valor=1, **labels):
+        """Incrementa o contador `nome`"""
+        chave = (nome, tuple(sorted(labels.items())))
+        with self._lock:
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    def limpar(self):
+        with self._lock:
+            self._histogramas.clear()
+            self._contadores.clear()
+
+    def exportar_prometheus(self):
+        """Gera o texto de exposição do Prometheus (versão 0.0.4)"""
+        with self._lock:
+            histogramas = sorted(self._histogramas.items())
+            contadores = sorted(self._contadores.items())
+
+        linhas = []
+        nomes_vistos = set()
+
+        for (nome, labels), valor in contadores:
+            if nome not in nomes_vistos:
+                nomes_vistos.add(nome)
+                if nome in self._descricoes:
+                    linhas.append(f'# HELP {nome} {self._descricoes[nome]}')
+                linhas.append(f'# TYPE {nome} counter')
+            linhas.append(f'{nome}{_formatar_labels(labels)} {valor}')
+
+        for (nome, labels), histograma in histogramas:
+            if nome not in nomes_vistos:
+                nomes_vistos.add(nome)
+                if nome in self._descricoes:
+                    linhas.append(f'# HELP {nome} {self._descricoes[nome]}')
+                linhas.append(f'# TYPE {nome} histogram')
+            for limite, contagem in zip(histograma.buckets, histograma.contagens):
+                linhas.append(f'{nome}_bucket{_formatar_labels(labels + (("le", repr(float(limite))),))} {contagem}')
+            linhas.append(f'{nome}_bucket{_formatar_labels(labels + (("le", "+Inf"),))} {histograma.total}')
+            linhas.append(f'{nome}_sum{_formatar_labels(labels)} {histograma.soma}')
+            linhas.append(f'{nome}_count{_formatar_labels(labels)} {histograma.total}')
+
+        return '\n'.join(linhas) + '\n'
+
+
+def _formatar_labels(labels):
+    if not labels:
+        return ''
+    partes = []
+    for chave, valor in labels:
+        valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        partes.append(f'{chave}="{valor}"')
+    return '{' + ','.join(partes) + '}'
+
+
+registro = RegistroMetricas()
+registro.descrever('faturamento_http_requisicao_segundos', 'Latência das requisições HTTP por rota')
+registro.descrever('faturamento_db_consultas_por_requisicao', 'Quantidade de consultas ao banco por requisição')
+registro.descrever('faturamento_db_tempo_por_requisicao_segundos', 'Tempo gasto no banco por requisição')
+registro.descrever('faturamento_db_consulta_segundos', 'Duração de cada consulta ao banco por tipo de comando')
+registro.descrever('faturamento_operacao_segundos', 'Duração de operações internas (OCR, cálculos, exportação)')
+registro.descrever('faturamento_db_consultas_lentas_total', 'Consultas acima do limite do log de consultas lentas')
+
+
+class ContextoRequisicao:
+    """Consultas e tempo de banco de uma requisição
+
+    Somados pela thread da requisição e pela thread da fila de escrita, que executa as
+    escritas enviadas por ela (BEGIN/COMMIT do lote, compartilhados, não entram).
+    """
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_consultas = 0.0
+        self._lock = threading.Lock()
+
+    def somar(self, duracao):
+        with self._lock:
+            self.consultas += 1
+            self.tempo_consultas += duracao
+
+
+# Contexto da requisição em andamento em cada thread
+_contexto = threading.local()
+
+
+def iniciar_requisicao():
+    """Abre um contexto novo para as consultas da requisição corrente"""
+    _contexto.atual = ContextoRequisicao()
+
+
+def finalizar_requisicao():
+    """Retorna (quantidade, tempo total) das consultas da requisição corrente"""
+    contexto = contexto_atual()
+    _contexto.atual = None
+    if contexto is None:
+        return 0, 0.0
+    return contexto.consultas, contexto.tempo_consultas
+
+
+def contexto_atual():
+    """Contexto da requisição desta thread (None fora de requisição)"""
+    return getattr(_contexto, 'atual', None)
+
+
+@contextmanager
+def usar_contexto(contexto):
+    """Atribui as consultas do bloco a `contexto` (ex.: escrita executada em nome de outra thread)"""
+    anterior = contexto_atual()
+    _contexto.atual = contexto
+    try:
+        yield
+    finally:
+        _contexto.atual = anterior
+
+
+def _somar_ao_contexto(duracao):
+    contexto = contexto_atual()
+    if contexto is not None:
+        contexto.somar(duracao)
+
+
+@contextmanager
+def medir(operacao):
+    """Mede a duração de um bloco e registra em faturamento_operacao_segundos"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registro.observar('faturamento_operacao_segundos', time.perf_counter() - inicio, operacao=operacao)
+
+
+def _limite_consulta_lenta():
+    """Limite do log de consultas lentas em segundos (None = desativado)
+
+    Ativado pela variável de ambiente SLOW_QUERY_MS.
+    """
+    valor = os.environ.get('SLOW_QUERY_MS')
+    if not valor:
+        return None
+    try:
+        return float(valor) / 1000
+    except ValueError:
+        return None
+
+
+def registrar_consulta(conexao, sql, parametros, duracao):
+    """Duração de um comando; acima de SLOW_QUERY_MS vai para o log com o plano (conexao.plano_consulta)"""
+    comando = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else 'VAZIO'
+    registro.observar('faturamento_db_consulta_segundos', duracao, comando=comando)
+    _somar_ao_contexto(duracao)
+
+    limite = _limite_consulta_lenta()
+    if limite is not None and duracao >= limite and comando in ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT'):
+        _registrar_consulta_lenta(conexao, sql, parametros, duracao, comando)
+
+
+def registrar_lote(duracao):
+    """Duração de um executemany (EXPLAIN não se aplica a lotes)"""
+    registro.observar('faturamento_db_consulta_segundos', duracao, comando='EXECUTEMANY')
+    _somar_ao_contexto(duracao)
+
+
+def _registrar_consulta_lenta(conexao, sql, parametros, duracao, comando):
+    """Grava a consulta lenta com o plano de execução correspondente"""
+    registro.incrementar('faturamento_db_consultas_lentas_total', comando=comando)
+
+    try:
+        plano = '\n'.join(f'      {linha}' for linha in conexao.plano_consulta(sql, parametros))
+    except Exception as e:
+        plano = f'      (plano indisponível: {e})'
+
+    consulta = ' '.join(sql.split())
+    texto = (
+        f"🐢 [{datetime.now().isoformat(timespec='seconds')}] Consulta lenta ({duracao * 1000:.1f} ms)\n"
+        f"   SQL: {consulta}\n"
+        f"   Plano:\n{plano}\n"
+    )
+
+    caminho_log = os.environ.get('SLOW_QUERY_LOG')
+    if caminho_log:
+        with open(caminho_log, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(texto)
+    else:
+        print(texto, end='')
+
+
+class CursorRastreado(sqlite3.Cursor):
+    """Cursor que mede a duração de cada comando executado"""
+
+    def execute(self, sql, parametros=()):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            registrar_consulta(self.connection, sql, parametros, time.perf_counter() - inicio)
+
+    def executemany(self, sql, parametros):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, parametros)
+        finally:
+            registrar_lote(time.perf_counter() - inicio)
+
+
+class ConexaoRastreada(sqlite3.Connection):
+    """Conexão SQLite cujos cursores são rastreados
+
+    Uso: sqlite3.connect(caminho, factory=ConexaoRastreada)
+    """
+
+    def cursor(self, factory=CursorRastreado):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, parametros):
+        return self.cursor().executemany(sql, parametros)
+
+    def plano_consulta(self, sql, parametros):
+        """Linhas do EXPLAIN QUERY PLAN (log de consultas lentas)"""
+        # Cursor comum (sem rastreamento) para não medir o próprio EXPLAIN
+        cursor = sqlite3.Connection.cursor(self)
+        try:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, parametros)
+            return [linha[-1] for linha in cursor.fetchall()]
+        finally:
+            cursor.close()
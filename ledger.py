@@ -0,0 +1,446 @@
+"""
+Ledger de Eventos - histórico somente-inclusão de notas, recebimentos, conciliações e adiantamentos
+Os eventos são gravados por triggers na mesma transação da alteração, então qualquer
+caminho de escrita (tela, API, planilha, extrato bancário, reextração) entra no histórico.
+As tabelas atuais são a projeção mais recente; a posição de recebíveis em qualquer data
+é reconstruída a partir do snapshot anterior mais os eventos seguintes.
+
+Uso:
+    python ledger.py snapshot
+    python ledger.py verificar
+    python ledger.py posicao --data 2024-06-30
+"""
+import argparse
+import json
+import sqlite3
+import zlib
+from datetime import datetime
+
+from armazenamento import criar_gatilho, dialeto, tabela_existe
+from resumos import VALOR_ESPERADO
+
+# Eventos replicados depois do último snapshot antes de gravar um novo automaticamente
+SNAPSHOT_A_CADA = 20000
+
+# Conteúdo (json_array) de cada tipo de evento, na ordem das posições
+CAMPOS_EVENTO = {
+    'nota_criada': ('numero_nf', 'tipo', 'tomador', 'localidade', 'data_vencimento',
+                    'valor_bruto', 'valor_esperado', 'foi_adiantado'),
+    'nota_alterada': 'nota_criada',
+    'adiantamento': 'nota_criada',
+    'nota_excluida': (),
+    'recebimento': ('data_recebimento', 'valor_recebido', 'tipo_recebimento', 'nfs_referentes'),
+    'recebimento_excluido': ('valor_recebido',),
+    'conciliacao': ('extrato_id', 'valor_conciliado', 'tipo_recebimento'),
+    'conciliacao_excluida': ('extrato_id', 'valor_conciliado'),
+}
+
+# Estado de cada nota na projeção: [numero_nf, tipo, tomador, localidade, data_vencimento,
+#                                    valor_bruto, valor_esperado, foi_adiantado, recebido]
+RECEBIDO = 8
+
+# Por dialeto (chave: é PostgreSQL): hora local com milissegundos e recusa de alteração no trigger
+AGORA = {
+    False: "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')",
+    True: "to_char(clock_timestamp(), 'YYYY-MM-DD HH24:MI:SS.MS')",
+}
+RECUSAR = {
+    False: "SELECT RAISE(ABORT, '{mensagem}');",
+    True: "RAISE EXCEPTION '{mensagem}';",
+}
+
+
+def _json_array(pg, *valores):
+    """Array JSON (texto) com os valores"""
+    if pg:
+        return f"CAST(jsonb_build_array({', '.join(valores)}) AS TEXT)"
+    return f"json_array({', '.join(valores)})"
+
+
+def _payload_nota(p, pg=False):
+    return _json_array(pg, f'{p}.numero_nf', f'{p}.tipo', f'{p}.tomador', f'{p}.localidade',
+                       f'{p}.data_vencimento', f'{p}.valor_bruto', VALOR_ESPERADO.format(p=p),
+                       f'COALESCE({p}.foi_adiantado, 0)')
+
+
+def criar_estrutura(cursor):
+    """Cria o ledger, seus snapshots e os triggers de captura
+
+    Requer notas_fiscais, extrato e conciliacao já criadas. Em bancos que já tinham
+    dados, o histórico começa com um evento por nota (na data de emissão), por
+    recebimento e por conciliação (na data do recebimento), com os valores atuais.
+    """
+    pg = dialeto(cursor) == 'postgresql'
+    existia = tabela_existe(cursor, 'ledger_eventos')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ledger_eventos (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            registrado_em TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            entidade INTEGER NOT NULL,
+            dados TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ledger_eventos_registrado ON ledger_eventos(registrado_em)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ledger_eventos_entidade ON ledger_eventos(entidade, tipo)')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ledger_snapshot (
+            seq INTEGER PRIMARY KEY,
+            registrado_em TEXT NOT NULL,
+            estado BLOB NOT NULL
+        )
+    ''')
+
+    # Somente inclusão
+    for operacao in ('UPDATE', 'DELETE'):
+        criar_gatilho(cursor, f'trg_ledger_eventos_{operacao.lower()}', f'BEFORE {operacao} ON ledger_eventos',
+                      RECUSAR[pg].format(mensagem='ledger_eventos é somente inclusão'))
+
+    if not existia:
+        _registrar_historico_existente(cursor, pg)
+
+    agora = AGORA[pg]
+    inserir = 'INSERT INTO ledger_eventos (registrado_em, tipo, entidade, dados)'
+    gatilhos = {
+        'trg_ledger_nota_insert': ('AFTER INSERT ON notas_fiscais', f'''
+            {inserir}
+            VALUES ({agora}, 'nota_criada', NEW.id, {_payload_nota('NEW', pg)});
+        ''', None),
+        # Só mudanças que afetam o valor a receber; status_recebimento é derivado das conciliações
+        'trg_ledger_nota_update': ('''
+            AFTER UPDATE OF numero_nf, tipo, tomador, localidade, data_vencimento, valor_bruto,
+                valor_nominal_conferencia, valor_liquido_vinci, valor_nominal_calculado, foi_adiantado
+            ON notas_fiscais
+        ''', f'''
+            {inserir}
+            VALUES ({agora},
+                    CASE WHEN NEW.foi_adiantado = 1 AND COALESCE(OLD.foi_adiantado, 0) = 0
+                         THEN 'adiantamento' ELSE 'nota_alterada' END,
+                    NEW.id, {_payload_nota('NEW', pg)});
+        ''', f"{_payload_nota('OLD', pg)} {'IS DISTINCT FROM' if pg else 'IS NOT'} {_payload_nota('NEW', pg)}"),
+        'trg_ledger_nota_delete': ('AFTER DELETE ON notas_fiscais', f'''
+            {inserir}
+            VALUES ({agora}, 'nota_excluida', OLD.id, NULL);
+        ''', None),
+        'trg_ledger_extrato_insert': ('AFTER INSERT ON extrato', f'''
+            {inserir}
+            VALUES ({agora}, 'recebimento', NEW.id,
+                    {_json_array(pg, 'NEW.data_recebimento', 'NEW.valor_recebido',
+                                 'NEW.tipo_recebimento', 'NEW.nfs_referentes')});
+        ''', None),
+        'trg_ledger_extrato_delete': ('AFTER DELETE ON extrato', f'''
+            {inserir}
+            VALUES ({agora}, 'recebimento_excluido', OLD.id, {_json_array(pg, 'OLD.valor_recebido')});
+        ''', None),
+        'trg_ledger_conciliacao_insert': ('AFTER INSERT ON conciliacao', f'''
+            {inserir}
+            VALUES ({agora}, 'conciliacao', NEW.nota_fiscal_id,
+                    {_json_array(pg, 'NEW.extrato_id', 'NEW.valor_conciliado', 'NEW.tipo_recebimento')});
+        ''', None),
+        'trg_ledger_conciliacao_delete': ('AFTER DELETE ON conciliacao', f'''
+            {inserir}
+            VALUES ({agora}, 'conciliacao_excluida', OLD.nota_fiscal_id,
+                    {_json_array(pg, 'OLD.extrato_id', 'OLD.valor_conciliado')});
+        ''', None),
+    }
+    for nome, (evento, corpo, quando) in gatilhos.items():
+        criar_gatilho(cursor, nome, evento, corpo, quando)
+
+
+def _registrar_historico_existente(cursor, pg):
+    """Eventos iniciais para os dados anteriores ao ledger, em ordem de data"""
+    cursor.execute(f'''
+        INSERT INTO ledger_eventos (registrado_em, tipo, entidade, dados)
+        SELECT registrado_em, tipo, entidade, dados FROM (
+            SELECT n.data_emissao || ' 00:00:00.000' as registrado_em, 0 as ordem, n.id as chave,
+                   'nota_criada' as tipo, n.id as entidade, {_payload_nota('n', pg)} as dados
+            FROM notas_fiscais n
+            UNION ALL
+            SELECT e.data_recebimento || ' 00:00:00.000', 1, e.id,
+                   'recebimento', e.id,
+                   {_json_array(pg, 'e.data_recebimento', 'e.valor_recebido', 'e.tipo_recebimento', 'e.nfs_referentes')}
+            FROM extrato e
+            UNION ALL
+            SELECT COALESCE(e.data_recebimento, '') || ' 00:00:00.000', 2, c.id,
+                   'conciliacao', c.nota_fiscal_id,
+                   {_json_array(pg, 'c.extrato_id', 'c.valor_conciliado', 'c.tipo_recebimento')}
+            FROM conciliacao c
+            LEFT JOIN extrato e ON e.id = c.extrato_id
+        ) historico
+        ORDER BY registrado_em, ordem, chave
+    ''')
+
+
+def estado_vazio():
+    return {'notas': {}, 'recebimentos': [0, 0.0]}
+
+
+def aplicar(estado, tipo, entidade, dados):
+    """Aplica um evento à projeção (estado alterado no lugar)"""
+    notas = estado['notas']
+
+    if tipo in ('nota_criada', 'nota_alterada', 'adiantamento'):
+        anterior = notas.get(entidade)
+        recebido = anterior[RECEBIDO] if anterior else 0.0
+        notas[entidade] = dados + [recebido]
+    elif tipo == 'nota_excluida':
+        notas.pop(entidade, None)
+    elif tipo == 'recebimento':
+        estado['recebimentos'][0] += 1
+        estado['recebimentos'][1] += dados[1] or 0
+    elif tipo == 'recebimento_excluido':
+        estado['recebimentos'][0] -= 1
+        estado['recebimentos'][1] -= dados[0] or 0
+    elif tipo in ('conciliacao', 'conciliacao_excluida'):
+        nota = notas.get(entidade)
+        if nota is not None:
+            sinal = 1 if tipo == 'conciliacao' else -1
+            nota[RECEBIDO] += sinal * (dados[1] or 0)
+
+
+def status_nota(nota):
+    """Mesma regra de Database._atualizar_status_nf"""
+    recebido = nota[RECEBIDO]
+    if recebido <= 0:
+        return 'PENDENTE'
+    if recebido >= (nota[6] or 0):
+        return 'RECEBIDO'
+    return 'PARCIAL'
+
+
+def _limite(data):
+    """'YYYY-MM-DD' inclui o dia inteiro"""
+    return f'{data} 23:59:59.999' if len(data) == 10 else data
+
+
+class Ledger:
+    """Consultas sobre o histórico: posição em uma data, histórico de uma nota, snapshots"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def estado_em(self, data=None):
+        """Projeção (notas e totais de recebimento) como registrada até `data` (padrão: agora)
+
+        Returns:
+            (estado, seq do último evento aplicado)
+        """
+        limite = _limite(data) if data else '9999-12-31'
+        conn = self.db._conectar()
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT seq, estado FROM ledger_snapshot
+            WHERE registrado_em <= ?
+            ORDER BY seq DESC LIMIT 1
+        ''', (limite,))
+        row = cursor.fetchone()
+        if row:
+            seq_inicial = row[0]
+            estado = json.loads(zlib.decompress(row[1]))
+            estado['notas'] = {int(nota_id): nota for nota_id, nota in estado['notas'].items()}
+        else:
+            seq_inicial = 0
+            estado = estado_vazio()
+
+        cursor.execute('''
+            SELECT seq, registrado_em, tipo, entidade, dados FROM ledger_eventos
+            WHERE seq > ? AND registrado_em <= ?
+            ORDER BY seq
+        ''', (seq_inicial, limite))
+
+        seq = seq_inicial
+        aplicados = 0
+        for seq, _, tipo, entidade, dados in cursor:
+            aplicar(estado, tipo, entidade, json.loads(dados) if dados else None)
+            aplicados += 1
+        conn.close()
+
+        # Replay longo do estado atual: guarda um snapshot para a próxima consulta partir dele
+        # (em uma data passada podem ter ficado de fora eventos anteriores ao último aplicado)
+        if data is None and aplicados >= SNAPSHOT_A_CADA:
+            self._gravar_snapshot(seq, estado)
+
+        return estado, seq
+
+    def _gravar_snapshot(self, seq, estado):
+        """Grava o estado até `seq`
+
+        O snapshot vale a partir do maior registrado_em entre os eventos que ele contém
+        (o histórico importado usa datas de negócio, que podem ser posteriores a eventos novos).
+        """
+        blob = zlib.compress(json.dumps(estado, separators=(',', ':')).encode('utf-8'))
+
+        def gravar(cursor):
+            cursor.execute('SELECT MAX(registrado_em) FROM ledger_eventos WHERE seq <= ?', (seq,))
+            registrado_em = cursor.fetchone()[0]
+            cursor.execute('''
+                INSERT INTO ledger_snapshot (seq, registrado_em, estado) VALUES (?, ?, ?)
+                ON CONFLICT DO NOTHING
+            ''', (seq, registrado_em, blob))
+            return registrado_em
+
+        return self.db._executar_escrita(gravar), len(blob)
+
+    def snapshot(self):
+        """Grava o estado atual como snapshot"""
+        estado, seq = self.estado_em()
+        if seq == 0:
+            return None
+
+        registrado_em, tamanho = self._gravar_snapshot(seq, estado)
+        return {'seq': seq, 'registrado_em': registrado_em, 'notas': len(estado['notas']), 'bytes': tamanho}
+
+    def posicao_em(self, data, dimensao=None):
+        """Posição dos recebíveis como conhecida em `data`: esperado, recebido e saldo por status
+
+        Args:
+            data: 'YYYY-MM-DD' (fim do dia) ou 'YYYY-MM-DD HH:MM:SS'
+            dimensao: 'tomador' ou 'tipo' para quebrar o saldo em aberto
+        """
+        if dimensao not in (None, 'tomador', 'tipo'):
+            raise ValueError(f'Dimensão inválida: {dimensao} (use tomador ou tipo)')
+
+        estado, seq = self.estado_em(data)
+        por_status = {status: {'qtd': 0, 'esperado': 0.0, 'recebido': 0.0}
+                      for status in ('PENDENTE', 'PARCIAL', 'RECEBIDO')}
+        quebra = {}
+        indice = {'tomador': 2, 'tipo': 1}.get(dimensao)
+
+        for nota in estado['notas'].values():
+            status = status_nota(nota)
+            grupo = por_status[status]
+            grupo['qtd'] += 1
+            grupo['esperado'] += nota[6] or 0
+            grupo['recebido'] += nota[RECEBIDO]
+
+            if indice is not None and status != 'RECEBIDO':
+                chave = nota[indice] or ''
+                item = quebra.setdefault(chave, {dimensao: chave, 'qtd': 0, 'saldo': 0.0})
+                item['qtd'] += 1
+                item['saldo'] += (nota[6] or 0) - nota[RECEBIDO]
+
+        em_aberto = [g for s, g in por_status.items() if s != 'RECEBIDO']
+        resultado = {
+            'data': data,
+            'seq': seq,
+            'notas': len(estado['notas']),
+            'por_status': {s: {k: round(v, 2) for k, v in g.items()} for s, g in por_status.items()},
+            'saldo_em_aberto': round(sum(g['esperado'] - g['recebido'] for g in em_aberto), 2),
+            'recebimentos': {'qtd': estado['recebimentos'][0], 'total': round(estado['recebimentos'][1], 2)}
+        }
+        if dimensao:
+            resultado['por_' + dimensao] = sorted(
+                ({**item, 'saldo': round(item['saldo'], 2)} for item in quebra.values()),
+                key=lambda item: -item['saldo']
+            )
+        return resultado
+
+    def historico_nota(self, nota_id):
+        """Eventos de uma nota (criação, alterações, adiantamento, conciliações) em ordem"""
+        conn = self.db._conectar()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT seq, registrado_em, tipo, dados FROM ledger_eventos
+            WHERE entidade = ? AND tipo IN ('nota_criada', 'nota_alterada', 'adiantamento',
+                                            'nota_excluida', 'conciliacao', 'conciliacao_excluida')
+            ORDER BY seq
+        ''', (nota_id,))
+
+        eventos = []
+        for seq, registrado_em, tipo, dados in cursor.fetchall():
+            campos = CAMPOS_EVENTO[tipo]
+            if isinstance(campos, str):
+                campos = CAMPOS_EVENTO[campos]
+            eventos.append({
+                'seq': seq,
+                'registrado_em': registrado_em,
+                'tipo': tipo,
+                'dados': dict(zip(campos, json.loads(dados))) if dados else {}
+            })
+        conn.close()
+
+        return eventos
+
+    def verificar(self):
+        """Refaz a projeção a partir de todos os eventos e compara com notas_fiscais
+
+        Returns:
+            Lista de divergências (vazia quando as tabelas batem com o ledger)
+        """
+        estado, _ = self.estado_em()
+
+        conn = self.db._conectar()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT n.id, n.numero_nf, n.status_recebimento, {VALOR_ESPERADO.format(p='n')} as valor_esperado,
+                   COALESCE(c.recebido, 0) as recebido
+            FROM notas_fiscais n
+            LEFT JOIN (
+                SELECT nota_fiscal_id, SUM(valor_conciliado) as recebido
+                FROM conciliacao GROUP BY nota_fiscal_id
+            ) c ON c.nota_fiscal_id = n.id
+        ''')
+        atuais = {row['id']: dict(row) for row in cursor.fetchall()}
+        conn.close()
+
+        divergencias = []
+        for nota_id in atuais.keys() - estado['notas'].keys():
+            divergencias.append({'nota_id': nota_id, 'problema': 'nota sem evento de criação'})
+        for nota_id in estado['notas'].keys() - atuais.keys():
+            divergencias.append({'nota_id': nota_id, 'problema': 'nota no ledger e fora da tabela'})
+
+        for nota_id in atuais.keys() & estado['notas'].keys():
+            atual = atuais[nota_id]
+            nota = estado['notas'][nota_id]
+            if abs((atual['valor_esperado'] or 0) - (nota[6] or 0)) > 0.005:
+                divergencias.append({'nota_id': nota_id, 'problema': 'valor esperado',
+                                     'tabela': atual['valor_esperado'], 'ledger': nota[6]})
+            if abs(atual['recebido'] - nota[RECEBIDO]) > 0.005:
+                divergencias.append({'nota_id': nota_id, 'problema': 'recebido',
+                                     'tabela': atual['recebido'], 'ledger': nota[RECEBIDO]})
+            if (atual['status_recebimento'] or 'PENDENTE') != status_nota(nota):
+                divergencias.append({'nota_id': nota_id, 'problema': 'status',
+                                     'tabela': atual['status_recebimento'], 'ledger': status_nota(nota)})
+
+        return divergencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ledger de eventos de notas e recebimentos')
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+    subcomandos.add_parser('snapshot', help='Grava o estado atual como snapshot')
+    subcomandos.add_parser('verificar', help='Compara a projeção do ledger com as tabelas')
+    posicao = subcomandos.add_parser('posicao', help='Posição dos recebíveis em uma data')
+    posicao.add_argument('--data', default=datetime.now().strftime('%Y-%m-%d'))
+    posicao.add_argument('--dimensao', choices=['tomador', 'tipo'])
+    parser.add_argument('--db', default='sistema_nf.db')
+    args = parser.parse_args()
+
+    from database import Database
+    ledger = Ledger(Database(args.db))
+
+    if args.comando == 'snapshot':
+        resultado = ledger.snapshot()
+        if resultado:
+            print(f"📸 Snapshot no evento {resultado['seq']:,} ({resultado['registrado_em']}): "
+                  f"{resultado['notas']:,} notas, {resultado['bytes'] / 1024:.1f} KB")
+        else:
+            print('ℹ️  Ledger vazio')
+    elif args.comando == 'verificar':
+        divergencias = ledger.verificar()
+        if not divergencias:
+            print('✅ Tabelas conferem com o ledger')
+        for divergencia in divergencias[:50]:
+            print(f'⚠️  {divergencia}')
+        if len(divergencias) > 50:
+            print(f'   ... e mais {len(divergencias) - 50}')
+    else:
+        print(json.dumps(ledger.posicao_em(args.data, args.dimensao), indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Migrações versionadas do esquema - número da versão em PRAGMA user_version
+(no PostgreSQL, na tabela esquema_versao)
+init_database cria o esquema base (versão 1, CREATE ... IF NOT EXISTS) e depois
+aplica, em ordem e uma única vez, as migrações com versão maior que a do banco.
+
+Para alterar o esquema: acrescente uma função ao fim de MIGRACOES (nunca edite uma
+já publicada). Colunas novas usam adicionar_coluna, que não falha se a coluna já existe.
+"""
+import adiantamentos
+from armazenamento import dialeto, tabela_existe
+
+# Versão gravada pelo esquema base de init_database
+VERSAO_BASE = 1
+
+
+def versao(cursor):
+    """Versão do esquema gravada no cabeçalho do arquivo (ou em esquema_versao); 0 se nunca inicializado"""
+    if dialeto(cursor) == 'postgresql':
+        if not tabela_existe(cursor, 'esquema_versao'):
+            return 0
+        return cursor.execute('SELECT versao FROM esquema_versao WHERE id = 1').fetchone()[0]
+    return cursor.execute('PRAGMA user_version').fetchone()[0]
+
+
+def _gravar_versao(cursor, numero):
+    if dialeto(cursor) == 'postgresql':
+        cursor.execute('CREATE TABLE IF NOT EXISTS esquema_versao ('
+                       'id INTEGER PRIMARY KEY CHECK (id = 1), versao INTEGER NOT NULL)')
+        cursor.execute('INSERT INTO esquema_versao (id, versao) VALUES (1, ?) '
+                       'ON CONFLICT (id) DO UPDATE SET versao = excluded.versao', (numero,))
+    else:
+        cursor.execute(f'PRAGMA user_version = {numero}')
+
+
+def adicionar_coluna(cursor, tabela, coluna, definicao):
+    """ALTER TABLE ADD COLUMN só se a coluna ainda não existir
+
+    Args:
+        definicao: Tipo e restrições da coluna (ex.: "REAL DEFAULT 0")
+
+    Returns:
+        bool: True se a coluna foi criada
+    """
+    if dialeto(cursor) == 'postgresql':
+        cursor.execute('SELECT column_name FROM information_schema.columns '
+                       'WHERE table_schema = current_schema() AND table_name = ?', (tabela,))
+        existentes = {row[0] for row in cursor.fetchall()}
+    else:
+        cursor.execute(f'PRAGMA table_info({tabela})')
+        existentes = {row[1] for row in cursor.fetchall()}
+    if coluna in existentes:
+        return False
+    cursor.execute(f'ALTER TABLE {tabela} ADD COLUMN {coluna} {definicao}')
+    return True
+
+
+def _indices_consultas(cursor):
+    """Índices das consultas quentes de conciliação, recebíveis e extrato"""
+    # SUM(valor_conciliado) WHERE nota_fiscal_id = ? (status da NF a cada conciliação): coberto pelo índice
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_conciliacao_nota '
+                   'ON conciliacao (nota_fiscal_id, valor_conciliado)')
+    # Conciliações de um lançamento (exclusão, NFs do recebimento)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_conciliacao_extrato ON conciliacao (extrato_id)')
+
+    # Vencimento de todas as notas (o índice parcial idx_notas_abertas_vencimento só cobre as em aberto)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_notas_vencimento ON notas_fiscais (data_vencimento)')
+    # status_recebimento = 'RECEBIDO' e agrupamentos por status, já na ordem de vencimento
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_notas_status_vencimento '
+                   'ON notas_fiscais (status_recebimento, data_vencimento)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_notas_tomador ON notas_fiscais (tomador)')
+    # Busca do número normalizado ('123.0' -> '123') quando o número exato não existe:
+    # índice na mesma expressão da consulta em vez de varrer a tabela
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_notas_numero_normalizado
+        ON notas_fiscais (TRIM(REPLACE(numero_nf, '.0', '')))
+    ''')
+
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_extrato_data_recebimento ON extrato (data_recebimento)')
+
+
+def _custo_adiantamentos(cursor):
+    """Taxas efetivas gravadas no adiantamento e resumo do custo por mês e tomador"""
+    adicionar_coluna(cursor, 'notas_fiscais', 'dias_antecipacao', 'INTEGER')
+    adicionar_coluna(cursor, 'notas_fiscais', 'taxa_efetiva_mensal', 'REAL')
+    adicionar_coluna(cursor, 'notas_fiscais', 'taxa_efetiva_anual', 'REAL')
+    adiantamentos.criar_estrutura(cursor)
+
+
+# Versão de destino de cada migração = VERSAO_BASE + posição na lista
+MIGRACOES = [
+    _indices_consultas,
+    _custo_adiantamentos,
+]
+
+VERSAO_ATUAL = VERSAO_BASE + len(MIGRACOES)
+
+
+def aplicar(cursor):
+    """Aplica as migrações pendentes e atualiza as estatísticas do planejador
+
+    Roda dentro da transação de init_database: uma falha desfaz a migração inteira e
+    user_version continua na versão anterior.
+
+    Returns:
+        list: Versões aplicadas
+    """
+    atual = versao(cursor)
+    aplicadas = []
+
+    for numero, migracao in enumerate(MIGRACOES, start=VERSAO_BASE + 1):
+        if numero <= atual:
+            continue
+        migracao(cursor)
+        aplicadas.append(numero)
+        print(f"   🔧 Migração {numero}: {migracao.__doc__.splitlines()[0]}")
+
+    if aplicadas or atual < VERSAO_BASE:
+        # Estatísticas (sqlite_stat1) para o planejador escolher entre os índices;
+        # analysis_limit amostra cada índice em vez de lê-lo inteiro em bancos grandes
+        # (o ANALYZE do PostgreSQL já trabalha por amostragem)
+        if dialeto(cursor) != 'postgresql':
+            cursor.execute('PRAGMA analysis_limit = 1000')
+        cursor.execute('ANALYZE')
+    _gravar_versao(cursor, VERSAO_ATUAL)
+    return aplicadas
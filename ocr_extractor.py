@@ -1,4 +1,3 @@
-import pdfplumber
 import re
 from datetime import datetime
 
@@ -10,6 +9,9 @@ class NFExtractor:
 
     def extract(self):
         """Extrai dados do PDF"""
+        # Importado aqui: pdfplumber/pdfminer pesam na inicialização e o XML não precisa deles
+        import pdfplumber
+
         with pdfplumber.open(self.pdf_path) as pdf:
             text = ""
             for page in pdf.pages:
@@ -0,0 +1,271 @@
+"""
+Reextração em lote - roda o NFExtractor de novo sobre PDFs históricos (e XMLs, quando houver)
+Compara com as notas gravadas e gera relatório de divergências ou aplica as correções
+
+Uso:
+    python reextrair.py --arquivo                      # PDFs do arquivo (arquivo_pdfs/)
+    python reextrair.py --diretorio notas_2023/        # PDFs/XMLs soltos em uma pasta
+    python reextrair.py --arquivo --aplicar            # grava as correções em lotes
+
+O progresso fica no arquivo de checkpoint: rodar de novo continua de onde parou.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from arquivo_pdf import ArquivoPDF, RAIZ_PADRAO
+from calculadora_retencoes import CalculadoraRetencoes
+from xml_extractor import extrair_documento
+from database import Database, normalizar_numero_nf
+
+# Campos comparados (nome no extractor -> coluna gravada)
+CAMPOS_NOTA = ('tipo', 'data_emissao', 'valor_bruto', 'localidade', 'tomador', 'inss', 'iss')
+CAMPOS_METADADOS = ('contrato', 'folhas_registro', 'stm', 'requisicao')
+CAMPOS_NUMERICOS = ('valor_bruto', 'inss', 'iss')
+
+TOLERANCIA_VALOR = 0.005
+
+
+# ------------------------------------------------------------
+# Worker (roda em outro processo)
+# ------------------------------------------------------------
+def _extrair(tarefa):
+    """Extrai os dados de um PDF/XML; tarefa = (origem, chave) com origem 'arquivo:<raiz>' ou 'diretorio'"""
+    origem, chave = tarefa
+    try:
+        if origem.startswith('arquivo:'):
+            sha256 = chave
+            conteudo = ArquivoPDF(None, raiz=origem.split(':', 1)[1]).ler(sha256)
+        else:
+            with open(chave, 'rb') as arquivo:
+                conteudo = arquivo.read()
+            sha256 = hashlib.sha256(conteudo).hexdigest()
+
+        dados, formato = extrair_documento(io.BytesIO(conteudo), nome=chave if origem == 'diretorio' else None)
+        # Só PDFs ficam vinculados por hash (nf_metadados.pdf_sha256)
+        return {'chave': chave, 'sha256': sha256 if formato == 'pdf' else None, 'dados': dados}
+
+    except Exception as e:
+        return {'chave': chave, 'erro': str(e)}
+
+
+# ------------------------------------------------------------
+# Comparação
+# ------------------------------------------------------------
+def _normalizar(campo, valor):
+    """Coloca o valor extraído no formato gravado; None = extractor não encontrou"""
+    if valor in (None, '') or (campo in CAMPOS_NUMERICOS and not valor):
+        return None
+    if campo == 'data_emissao':
+        try:
+            return datetime.strptime(valor, '%d/%m/%Y').strftime('%Y-%m-%d')
+        except ValueError:
+            return valor
+    if campo in CAMPOS_NUMERICOS:
+        return round(float(valor), 2)
+    return str(valor).strip()
+
+
+def _diferente(campo, atual, novo):
+    if campo in CAMPOS_NUMERICOS:
+        return atual is None or abs(float(atual) - novo) > TOLERANCIA_VALOR
+    return (atual or '').strip() != novo
+
+
+def comparar(nota, dados):
+    """Retorna {campo: [valor_gravado, valor_extraido]} só para campos que divergem"""
+    divergencias = {}
+    for campo in CAMPOS_NOTA + CAMPOS_METADADOS:
+        novo = _normalizar(campo, dados.get(campo))
+        # Campo que o extractor não achou não apaga o que já está gravado
+        if novo is not None and _diferente(campo, nota.get(campo), novo):
+            divergencias[campo] = [nota.get(campo), novo]
+    return divergencias
+
+
+def montar_alteracao(nota, divergencias, sha256, db):
+    """Converte divergências em (nota_id, campos_nota, campos_metadados), recalculando derivados"""
+    campos_nota = {c: v[1] for c, v in divergencias.items() if c in CAMPOS_NOTA}
+    campos_metadados = {c: v[1] for c, v in divergencias.items() if c in CAMPOS_METADADOS}
+    if sha256 and not nota.get('pdf_sha256'):
+        campos_metadados['pdf_sha256'] = sha256
+
+    tipo = campos_nota.get('tipo', nota['tipo'])
+    if 'tipo' in campos_nota or 'data_emissao' in campos_nota:
+        data_emissao = campos_nota.get('data_emissao', nota['data_emissao'])
+        campos_nota['data_vencimento'], campos_nota['dias_para_receber'] = \
+            db.calcular_prazo_recebimento(tipo, data_emissao)
+
+    if 'tipo' in campos_nota or 'valor_bruto' in campos_nota:
+        calculo = CalculadoraRetencoes.calcular_completo(
+            tipo, campos_nota.get('valor_bruto', nota['valor_bruto']), bool(nota['pis_cofins_retido'])
+        )
+        campos_nota['valor_nominal_calculado'] = calculo['valor_nominal']
+
+    return nota['id'], campos_nota, campos_metadados
+
+
+class Reextracao:
+    """Coordena workers, comparação, relatório, checkpoint e aplicação em lotes"""
+
+    def __init__(self, db, relatorio, checkpoint, aplicar=False, tamanho_lote=200):
+        self.db = db
+        self.relatorio = relatorio
+        self.checkpoint = checkpoint
+        self.aplicar = aplicar
+        self.tamanho_lote = tamanho_lote
+
+        notas = db.notas_para_reextracao()
+        self.por_hash = {n['pdf_sha256']: n for n in notas if n['pdf_sha256']}
+        self.por_numero = {}
+        for nota in notas:
+            self.por_numero.setdefault(normalizar_numero_nf(nota['numero_nf']), []).append(nota)
+
+        self.estatisticas = Counter()
+        self.divergencias_por_campo = Counter()
+
+    def _localizar_nota(self, resultado):
+        nota = self.por_hash.get(resultado['sha256'])
+        if nota:
+            return nota, None
+
+        numero = normalizar_numero_nf(resultado['dados'].get('numero_nf') or '')
+        candidatas = self.por_numero.get(numero, []) if numero else []
+        if len(candidatas) == 1:
+            return candidatas[0], None
+        return None, 'nota ambígua' if candidatas else 'sem nota correspondente'
+
+    def processados(self):
+        if not os.path.exists(self.checkpoint):
+            return set()
+        with open(self.checkpoint, encoding='utf-8') as arquivo:
+            return {linha.strip() for linha in arquivo if linha.strip()}
+
+    def _fechar_lote(self, chaves, linhas_relatorio, alteracoes):
+        """Aplica (se pedido) e só então registra relatório e checkpoint do lote"""
+        if self.aplicar and alteracoes:
+            self.db.aplicar_reextracao(alteracoes)
+            self.estatisticas['aplicadas'] += len(alteracoes)
+
+        with open(self.relatorio, 'a', encoding='utf-8') as arquivo:
+            for linha in linhas_relatorio:
+                arquivo.write(json.dumps(linha, ensure_ascii=False, default=str) + '\n')
+        with open(self.checkpoint, 'a', encoding='utf-8') as arquivo:
+            arquivo.writelines(chave + '\n' for chave in chaves)
+
+    def executar(self, tarefas, processos=None):
+        """Roda as tarefas (origem, chave) ainda não processadas"""
+        feitos = self.processados()
+        pendentes = [tarefa for tarefa in tarefas if tarefa[1] not in feitos]
+        self.estatisticas['ja_processados'] = len(tarefas) - len(pendentes)
+        print(f"📄 {len(pendentes)} PDFs a processar ({self.estatisticas['ja_processados']} já no checkpoint)")
+
+        inicio = time.perf_counter()
+        chaves, linhas_relatorio, alteracoes = [], [], []
+
+        with ProcessPoolExecutor(max_workers=processos) as pool:
+            for resultado in pool.map(_extrair, pendentes, chunksize=4):
+                self.estatisticas['processados'] += 1
+                chaves.append(resultado['chave'])
+
+                if 'erro' in resultado:
+                    self.estatisticas['erros'] += 1
+                    linhas_relatorio.append({'chave': resultado['chave'], 'erro': resultado['erro']})
+                else:
+                    nota, motivo = self._localizar_nota(resultado)
+                    if nota is None:
+                        self.estatisticas['sem_nota'] += 1
+                        linhas_relatorio.append({'chave': resultado['chave'], 'erro': motivo,
+                                                 'numero_nf': resultado['dados'].get('numero_nf')})
+                    else:
+                        divergencias = comparar(nota, resultado['dados'])
+                        if divergencias:
+                            self.estatisticas['com_divergencia'] += 1
+                            self.divergencias_por_campo.update(divergencias.keys())
+                            linhas_relatorio.append({
+                                'chave': resultado['chave'],
+                                'nota_id': nota['id'],
+                                'numero_nf': nota['numero_nf'],
+                                'divergencias': divergencias
+                            })
+                        if divergencias or (resultado['sha256'] and not nota.get('pdf_sha256')):
+                            alteracoes.append(montar_alteracao(nota, divergencias, resultado['sha256'], self.db))
+
+                if len(chaves) >= self.tamanho_lote:
+                    self._fechar_lote(chaves, linhas_relatorio, alteracoes)
+                    chaves, linhas_relatorio, alteracoes = [], [], []
+                    decorrido = time.perf_counter() - inicio
+                    print(f"⏳ {self.estatisticas['processados']}/{len(pendentes)} "
+                          f"({self.estatisticas['processados'] / decorrido:.1f} PDFs/s)")
+
+        if chaves:
+            self._fechar_lote(chaves, linhas_relatorio, alteracoes)
+
+        self.estatisticas['segundos'] = round(time.perf_counter() - inicio, 2)
+        return self.estatisticas, self.divergencias_por_campo
+
+
+def listar_tarefas(diretorio=None, raiz_arquivo=None):
+    """Monta as tarefas (origem, chave) a partir de uma pasta ou do arquivo de PDFs"""
+    if raiz_arquivo:
+        origem = f'arquivo:{raiz_arquivo}'
+        return [(origem, sha256) for sha256 in sorted(ArquivoPDF(None, raiz=raiz_arquivo).listar())]
+
+    tarefas = []
+    for pasta, _, arquivos in os.walk(diretorio):
+        for nome in sorted(arquivos):
+            if nome.lower().endswith(('.pdf', '.xml')):
+                tarefas.append(('diretorio', os.path.join(pasta, nome)))
+    return tarefas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reextração em lote dos PDFs de notas fiscais')
+    fonte = parser.add_mutually_exclusive_group(required=True)
+    fonte.add_argument('--diretorio', help='Pasta com PDFs ou XMLs (busca recursiva)')
+    fonte.add_argument('--arquivo', nargs='?', const=RAIZ_PADRAO, metavar='RAIZ',
+                       help=f'Arquivo de PDFs endereçado por hash (padrão: {RAIZ_PADRAO})')
+    parser.add_argument('--db', default='sistema_nf.db')
+    parser.add_argument('--aplicar', action='store_true', help='Grava as correções (padrão: só relatório)')
+    parser.add_argument('--processos', type=int, default=None, help='Workers (padrão: nº de CPUs)')
+    parser.add_argument('--lote', type=int, default=200, help='PDFs por transação/checkpoint')
+    parser.add_argument('--relatorio', default='reextracao_relatorio.jsonl')
+    parser.add_argument('--checkpoint', default='reextracao.checkpoint')
+    parser.add_argument('--recomecar', action='store_true', help='Ignora o checkpoint e o relatório anteriores')
+    args = parser.parse_args()
+
+    if args.recomecar:
+        for caminho in (args.checkpoint, args.relatorio):
+            if os.path.exists(caminho):
+                os.remove(caminho)
+
+    tarefas = listar_tarefas(diretorio=args.diretorio, raiz_arquivo=args.arquivo)
+    reextracao = Reextracao(Database(args.db), args.relatorio, args.checkpoint,
+                            aplicar=args.aplicar, tamanho_lote=args.lote)
+    estatisticas, por_campo = reextracao.executar(tarefas, processos=args.processos)
+
+    segundos = estatisticas['segundos'] or 1e-9
+    print('\n' + '=' * 60)
+    print(f"✅ {estatisticas['processados']} PDFs em {estatisticas['segundos']:.1f}s "
+          f"({estatisticas['processados'] / segundos:.1f} PDFs/s)")
+    print(f"⚠️  {estatisticas['com_divergencia']} notas com divergência")
+    print(f"❓ {estatisticas['sem_nota']} PDFs sem nota correspondente")
+    print(f"❌ {estatisticas['erros']} erros de extração")
+    if args.aplicar:
+        print(f"💾 {estatisticas['aplicadas']} notas atualizadas")
+    if por_campo:
+        print('\nDivergências por campo:')
+        for campo, quantidade in por_campo.most_common():
+            print(f'   {campo}: {quantidade}')
+    print(f'\n📝 Relatório: {args.relatorio}')
+    print('=' * 60)
+
+
+if __name__ == '__main__':
+    main()
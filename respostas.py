@@ -0,0 +1,144 @@
+"""
+Respostas compactas para os endpoints de listagem
+Formato colunar (ou MessagePack), compressão gzip/brotli e cache por versão dos dados
+
+Dependências opcionais (usadas se instaladas): orjson, msgpack, brotli
+"""
+import gzip
+import zlib
+from datetime import datetime, timezone
+
+from flask import current_app, request, make_response
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIMETYPE_MSGPACK = 'application/x-msgpack'
+
+# Abaixo disso a compressão não compensa
+TAMANHO_MINIMO_COMPRESSAO = 1024
+
+
+class ProvedorJSONRapido(DefaultJSONProvider):
+    """Provedor JSON do Flask baseado no orjson (cai no padrão para tipos não suportados)"""
+
+    def dumps(self, obj, **kwargs):
+        try:
+            return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+def configurar_json(app):
+    """Usa orjson como provedor JSON quando disponível"""
+    if orjson is not None:
+        app.json = ProvedorJSONRapido(app)
+
+
+def para_colunar(linhas):
+    """Converte lista de dicts em {'colunas': [...], 'linhas': [[...], ...]}"""
+    if not linhas:
+        return {'colunas': [], 'linhas': []}
+
+    colunas = list(linhas[0].keys())
+    return {
+        'colunas': colunas,
+        'linhas': [[linha[c] for c in colunas] for linha in linhas]
+    }
+
+
+def _formato_solicitado():
+    """Formato pedido pelo cliente: 'msgpack', 'colunar' ou 'objetos' (padrão, compatível)"""
+    formato = request.args.get('formato')
+    if formato in ('colunar', 'msgpack', 'objetos'):
+        return 'msgpack' if formato == 'msgpack' and msgpack is not None else formato
+    if msgpack is not None and request.accept_mimetypes.best == MIMETYPE_MSGPACK:
+        return 'msgpack'
+    return 'objetos'
+
+
+def _codificacao_aceita():
+    """Escolhe a compressão negociada via Accept-Encoding (brotli > gzip)"""
+    aceitas = request.accept_encodings
+    if brotli is not None and aceitas['br']:
+        return 'br'
+    if aceitas['gzip']:
+        return 'gzip'
+    return None
+
+
+def _ultima_modificacao(atualizado_em):
+    if not atualizado_em:
+        return None
+    return datetime.strptime(atualizado_em, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+
+
+def responder_lista(chave, carregar, versao, atualizado_em=None, variante=''):
+    """Responde uma listagem com cache condicional, formato compacto e compressão
+
+    Args:
+        chave: Nome do campo da lista no JSON ('notas', 'extrato', ...)
+        carregar: Função sem argumentos que retorna a lista de dicts
+        versao: Versão dos dados (Database.versao_dados) usada no ETag
+        atualizado_em: Timestamp da última escrita (Last-Modified)
+        variante: Entra no ETag quando o resultado depende de algo além dos dados
+                  (ex.: a data de hoje na classificação ATRASADO/A_RECEBER)
+
+    Se o ETag do cliente ainda for válido, responde 304 sem consultar as linhas.
+    """
+    formato = _formato_solicitado()
+    codificacao = _codificacao_aceita()
+    parametros = zlib.crc32(request.query_string + variante.encode())
+    etag = f'{versao}-{formato}-{codificacao or "identity"}-{parametros:08x}'
+    ultima_modificacao = _ultima_modificacao(atualizado_em)
+
+    response = make_response()
+    response.set_etag(etag)
+    if ultima_modificacao:
+        response.last_modified = ultima_modificacao
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.update(('Accept', 'Accept-Encoding'))
+
+    if request.if_none_match.contains(etag) or (
+            not request.if_none_match and not variante and ultima_modificacao
+            and request.if_modified_since and ultima_modificacao <= request.if_modified_since):
+        response.status_code = 304
+        return response
+
+    linhas = carregar()
+
+    if formato == 'objetos':
+        corpo = current_app.json.dumps({'success': True, chave: linhas}).encode()
+        response.mimetype = 'application/json'
+    elif formato == 'colunar':
+        corpo = current_app.json.dumps({'success': True, 'formato': 'colunar', chave: para_colunar(linhas)}).encode()
+        response.mimetype = 'application/json'
+    else:
+        corpo = msgpack.packb({'success': True, 'formato': 'colunar', chave: para_colunar(linhas)})
+        response.mimetype = MIMETYPE_MSGPACK
+
+    if codificacao and len(corpo) >= TAMANHO_MINIMO_COMPRESSAO:
+        if codificacao == 'br':
+            corpo = brotli.compress(corpo, quality=5)
+        else:
+            corpo = gzip.compress(corpo, compresslevel=6)
+        response.headers['Content-Encoding'] = codificacao
+
+    response.set_data(corpo)
+    return response
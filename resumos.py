@@ -0,0 +1,244 @@
+"""
+Resumos de Recebíveis - tabelas agregadas (diária e mensal) por vencimento
+Mantidas incrementalmente por triggers em notas_fiscais; aging, previsão de
+caixa e quebras por tomador/tipo/localidade leem apenas dos resumos.
+"""
+import sqlite3
+from datetime import datetime
+
+from armazenamento import criar_gatilho
+
+# Hierarquia do valor esperado (mesma de listar_pendentes/dashboard_recebimentos)
+VALOR_ESPERADO = '''
+    CASE
+        WHEN {p}.valor_nominal_conferencia IS NOT NULL AND {p}.valor_nominal_conferencia > 0
+            THEN {p}.valor_nominal_conferencia
+        WHEN {p}.valor_liquido_vinci IS NOT NULL AND {p}.valor_liquido_vinci > 0
+            THEN {p}.valor_liquido_vinci
+        WHEN {p}.valor_nominal_calculado IS NOT NULL AND {p}.valor_nominal_calculado > 0
+            THEN {p}.valor_nominal_calculado
+        ELSE {p}.valor_bruto
+    END
+'''
+
+DIMENSOES = ('tomador', 'tipo', 'localidade')
+
+# (tabela, expressão do período a partir da data de vencimento)
+TABELAS_RESUMO = (
+    ('resumo_recebiveis_diario', "COALESCE({p}.data_vencimento, '')"),
+    ('resumo_recebiveis_mensal', "COALESCE(substr({p}.data_vencimento, 1, 7), '')"),
+)
+
+FAIXAS_AGING = ('a_vencer', '0-30', '31-60', '61-90', '90+')
+
+
+def _chaves(p, periodo):
+    """Valores da chave do resumo para a linha NEW/OLD"""
+    return (
+        f"{periodo.format(p=p)}, COALESCE({p}.tomador, ''), {p}.tipo, "
+        f"COALESCE({p}.localidade, ''), COALESCE({p}.status_recebimento, 'PENDENTE')"
+    )
+
+
+def _sql_somar(tabela, periodo, p, sinal):
+    return f'''
+        INSERT INTO {tabela} (periodo, tomador, tipo, localidade, status_recebimento,
+                              qtd, valor_bruto, valor_esperado)
+        VALUES ({_chaves(p, periodo)}, {sinal}1, {sinal}{p}.valor_bruto, {sinal}({VALOR_ESPERADO.format(p=p)}))
+        ON CONFLICT (periodo, tomador, tipo, localidade, status_recebimento) DO UPDATE SET
+            qtd = {tabela}.qtd + excluded.qtd,
+            valor_bruto = {tabela}.valor_bruto + excluded.valor_bruto,
+            valor_esperado = {tabela}.valor_esperado + excluded.valor_esperado;
+    '''
+
+
+def _sql_limpar(tabela, periodo, p):
+    """Remove a linha do resumo que ficou zerada"""
+    return f'''
+        DELETE FROM {tabela}
+        WHERE (periodo, tomador, tipo, localidade, status_recebimento) = ({_chaves(p, periodo)})
+        AND qtd <= 0;
+    '''
+
+
+def criar_estrutura(cursor):
+    """Cria tabelas de resumo e triggers de manutenção incremental"""
+    for tabela, periodo in TABELAS_RESUMO:
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {tabela} (
+                periodo TEXT NOT NULL,
+                tomador TEXT NOT NULL,
+                tipo TEXT NOT NULL,
+                localidade TEXT NOT NULL,
+                status_recebimento TEXT NOT NULL,
+                qtd INTEGER NOT NULL DEFAULT 0,
+                valor_bruto REAL NOT NULL DEFAULT 0,
+                valor_esperado REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (periodo, tomador, tipo, localidade, status_recebimento)
+            ) WITHOUT ROWID
+        ''')
+
+        criar_gatilho(cursor, f'trg_{tabela}_insert', 'AFTER INSERT ON notas_fiscais',
+                      _sql_somar(tabela, periodo, 'NEW', ''))
+
+        criar_gatilho(cursor, f'trg_{tabela}_delete', 'AFTER DELETE ON notas_fiscais', f'''
+            {_sql_somar(tabela, periodo, 'OLD', '-')}
+            {_sql_limpar(tabela, periodo, 'OLD')}
+        ''')
+
+        criar_gatilho(cursor, f'trg_{tabela}_update', '''
+            AFTER UPDATE OF valor_bruto, valor_nominal_conferencia, valor_liquido_vinci,
+                valor_nominal_calculado, data_vencimento, tomador, tipo, localidade, status_recebimento
+            ON notas_fiscais
+        ''', f'''
+            {_sql_somar(tabela, periodo, 'OLD', '-')}
+            {_sql_limpar(tabela, periodo, 'OLD')}
+            {_sql_somar(tabela, periodo, 'NEW', '')}
+        ''')
+
+    # Bancos que já tinham notas antes dos resumos existirem
+    cursor.execute('SELECT EXISTS (SELECT 1 FROM resumo_recebiveis_diario)')
+    resumo_vazio = not cursor.fetchone()[0]
+    cursor.execute('SELECT EXISTS (SELECT 1 FROM notas_fiscais)')
+    tem_notas = cursor.fetchone()[0]
+    if resumo_vazio and tem_notas:
+        reconstruir(cursor)
+
+
+def reconstruir(cursor):
+    """Recalcula os resumos do zero a partir de notas_fiscais"""
+    for tabela, periodo in TABELAS_RESUMO:
+        cursor.execute(f'DELETE FROM {tabela}')
+        cursor.execute(f'''
+            INSERT INTO {tabela} (periodo, tomador, tipo, localidade, status_recebimento,
+                                  qtd, valor_bruto, valor_esperado)
+            SELECT {_chaves('n', periodo)}, COUNT(*), SUM(n.valor_bruto), SUM({VALOR_ESPERADO.format(p='n')})
+            FROM notas_fiscais n
+            GROUP BY 1, 2, 3, 4, 5
+        ''')
+
+
+class ResumoRecebiveis:
+    """Consultas de aging, previsão e quebras lendo só das tabelas de resumo"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def _consultar(self, sql, params=()):
+        conn = self.db._conectar()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+
+        cursor.execute(sql, params)
+        linhas = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        return linhas
+
+    @staticmethod
+    def _validar_dimensao(dimensao):
+        if dimensao is not None and dimensao not in DIMENSOES:
+            raise ValueError(f"Dimensão inválida: {dimensao} (use {', '.join(DIMENSOES)})")
+
+    def aging(self, dimensao=None, data_referencia=None):
+        """Recebíveis em aberto por faixa de atraso (a vencer, 0-30, 31-60, 61-90, 90+ dias)"""
+        self._validar_dimensao(dimensao)
+        hoje = data_referencia or datetime.now().strftime('%Y-%m-%d')
+        coluna = f', {dimensao}' if dimensao else ''
+
+        linhas = self._consultar(f'''
+            SELECT
+                CASE
+                    WHEN periodo = '' OR periodo >= :hoje THEN 'a_vencer'
+                    WHEN julianday(:hoje) - julianday(periodo) <= 30 THEN '0-30'
+                    WHEN julianday(:hoje) - julianday(periodo) <= 60 THEN '31-60'
+                    WHEN julianday(:hoje) - julianday(periodo) <= 90 THEN '61-90'
+                    ELSE '90+'
+                END as faixa
+                {coluna},
+                SUM(qtd) as qtd,
+                SUM(valor_esperado) as total
+            FROM resumo_recebiveis_diario
+            WHERE status_recebimento != 'RECEBIDO'
+            GROUP BY faixa {coluna}
+        ''', {'hoje': hoje})
+
+        if dimensao:
+            return {'data_referencia': hoje, 'dimensao': dimensao, 'linhas': linhas}
+
+        faixas = {faixa: {'qtd': 0, 'total': 0} for faixa in FAIXAS_AGING}
+        for linha in linhas:
+            faixas[linha['faixa']] = {'qtd': linha['qtd'], 'total': linha['total']}
+        return {'data_referencia': hoje, 'faixas': faixas}
+
+    def previsao_mensal(self, meses=12, dimensao=None, data_referencia=None):
+        """Previsão de recebimentos por mês de vencimento
+
+        Valores já vencidos e não recebidos aparecem em 'atrasado', fora da série mensal:
+        o mês atual vem do resumo diário (só vencimentos a partir de hoje) e os seguintes
+        do resumo mensal.
+        """
+        self._validar_dimensao(dimensao)
+        hoje = data_referencia or datetime.now().strftime('%Y-%m-%d')
+        ano, mes = int(hoje[:4]), int(hoje[5:7])
+        proximo_mes = f'{ano + mes // 12:04d}-{mes % 12 + 1:02d}'
+        total_meses = (mes - 1) + meses
+        mes_final = f'{ano + total_meses // 12:04d}-{total_meses % 12 + 1:02d}'
+        coluna = f', {dimensao}' if dimensao else ''
+
+        serie = self._consultar(f'''
+            SELECT mes {coluna}, SUM(qtd) as qtd, SUM(valor_esperado) as total
+            FROM (
+                SELECT substr(periodo, 1, 7) as mes {coluna}, qtd, valor_esperado
+                FROM resumo_recebiveis_diario
+                WHERE status_recebimento != 'RECEBIDO'
+                AND periodo >= ? AND periodo < ?
+                UNION ALL
+                SELECT periodo as mes {coluna}, qtd, valor_esperado
+                FROM resumo_recebiveis_mensal
+                WHERE status_recebimento != 'RECEBIDO'
+                AND periodo >= ? AND periodo < ?
+            ) resumo
+            GROUP BY mes {coluna}
+            ORDER BY mes {coluna}
+        ''', (hoje, proximo_mes, proximo_mes, mes_final))
+
+        atrasado = self._consultar('''
+            SELECT COALESCE(SUM(qtd), 0) as qtd, COALESCE(SUM(valor_esperado), 0) as total
+            FROM resumo_recebiveis_diario
+            WHERE status_recebimento != 'RECEBIDO'
+            AND periodo != '' AND periodo < ?
+        ''', (hoje,))[0]
+
+        return {
+            'data_referencia': hoje,
+            'meses': serie,
+            'atrasado': atrasado
+        }
+
+    def por_dimensao(self, dimensao, inicio=None, fim=None):
+        """Quantidade e valores por tomador/tipo/localidade e status, em um intervalo de vencimento (YYYY-MM)"""
+        self._validar_dimensao(dimensao)
+        if dimensao is None:
+            raise ValueError('Informe a dimensão')
+
+        filtros = []
+        params = []
+        if inicio:
+            filtros.append('periodo >= ?')
+            params.append(inicio)
+        if fim:
+            filtros.append('periodo <= ?')
+            params.append(fim)
+        where = f"WHERE {' AND '.join(filtros)}" if filtros else ''
+
+        return self._consultar(f'''
+            SELECT {dimensao}, status_recebimento,
+                SUM(qtd) as qtd,
+                SUM(valor_bruto) as valor_bruto,
+                SUM(valor_esperado) as total
+            FROM resumo_recebiveis_mensal
+            {where}
+            GROUP BY {dimensao}, status_recebimento
+            ORDER BY total DESC
+        ''', params)
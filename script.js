@@ -21,6 +21,20 @@ const valorNominalCalc = document.getElementById('valorNominalCalc');
 // Checkbox PIS/COFINS (pode não existir no HTML antigo)
 const presumirPisCofins = document.getElementById('presumirPisCofins');
 
+// Campos extraídos do PDF que não aparecem no formulário (contrato, STM, requisição, folhas)
+let metadadosExtraidos = {};
+
+// Chave de idempotência do envio atual: repetir o envio (duplo clique, nova tentativa) reaproveita a mesma
+let chaveEnvio = null;
+
+function novaChaveIdempotencia() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    // Fora de contexto seguro (HTTP na rede local) randomUUID não existe
+    return Date.now().toString(16) + '-' + Math.random().toString(16).slice(2);
+}
+
 // Upload via drag & drop
 uploadArea.addEventListener('click', () => fileInput.click());
 
@@ -51,8 +65,9 @@ fileInput.addEventListener('change', (e) => {
 
 // Processa arquivo
 async function handleFile(file) {
-    if (!file.type.includes('pdf')) {
-        mostrarErro('Por favor, selecione apenas arquivos PDF.');
+    const ehXml = file.type.includes('xml') || file.name.toLowerCase().endsWith('.xml');
+    if (!file.type.includes('pdf') && !ehXml) {
+        mostrarErro('Por favor, selecione apenas arquivos PDF ou XML.');
         return;
     }
 
@@ -93,6 +108,14 @@ function preencherFormulario(dados) {
         dataEmissao.value = `${ano}-${mes}-${dia}`;
     }
 
+    metadadosExtraidos = {
+        contrato: dados.contrato || '',
+        folhas_registro: dados.folhas_registro || '',
+        stm: dados.stm || '',
+        requisicao: dados.requisicao || '',
+        pdf_sha256: dados.pdf_sha256 || ''
+    };
+
     numeroNF.value = dados.numero_nf || '';
     tipo.value = dados.tipo || '';
     valorBruto.value = dados.valor_bruto || '';
@@ -216,14 +239,18 @@ nfForm.addEventListener('submit', async (e) => {
         pis_cofins_csll: parseFloat(pisCofins.value) || 0,
         pis_cofins_retido: presumirPisCofins ? presumirPisCofins.checked : (parseFloat(pisCofins.value) > 0),
         valor_nominal_calculado: parseFloat(valorNominalCalc.value) || 0,
-        valor_nominal_conferencia: parseFloat(valorNominalCalc.value) || 0
+        valor_nominal_conferencia: parseFloat(valorNominalCalc.value) || 0,
+        ...metadadosExtraidos
     };
 
+    chaveEnvio = chaveEnvio || novaChaveIdempotencia();
+
     try {
         const response = await fetch('/salvar', {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Idempotency-Key': chaveEnvio
             },
             body: JSON.stringify(dados)
         });
@@ -252,6 +279,8 @@ function limparFormulario() {
     retencaoEquatorial.value = '';
     pisCofins.value = '';
     valorNominalCalc.value = '';
+    metadadosExtraidos = {};
+    chaveEnvio = null;
 
     // Marca checkbox novamente se existir
     if (presumirPisCofins) {
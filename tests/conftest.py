@@ -0,0 +1,72 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+# Módulos da aplicação ficam na raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Servidor PostgreSQL para os testes do backend (ex.: postgresql://postgres@localhost/postgres).
+# Sem ele, um servidor local temporário é criado com o pgserver (pip install pgserver);
+# sem nenhum dos dois, os testes no PostgreSQL são pulados e esse caminho fica sem verificação
+POSTGRES_TESTE = os.environ.get('FATURAMENTO_TESTE_POSTGRES')
+
+
+@pytest.fixture(scope='session')
+def servidor_postgres(tmp_path_factory):
+    """Endereço do PostgreSQL dos testes"""
+    if POSTGRES_TESTE:
+        yield POSTGRES_TESTE
+        return
+    try:
+        import pgserver
+    except ImportError:
+        pytest.skip('PostgreSQL NÃO verificado: defina FATURAMENTO_TESTE_POSTGRES ou instale o pgserver')
+
+    servidor = pgserver.get_server(str(tmp_path_factory.mktemp('postgres')), cleanup_mode='stop')
+    try:
+        yield servidor.get_uri()
+    finally:
+        servidor.cleanup()
+
+
+@pytest.fixture(params=['sqlite', 'postgresql'])
+def db(request, tmp_path):
+    """Database vazio em cada backend: arquivo em tmp_path ou schema próprio no PostgreSQL"""
+    from database import Database
+
+    if request.param == 'sqlite':
+        yield Database(str(tmp_path / 'teste.db'))
+        return
+
+    import psycopg
+
+    endereco = request.getfixturevalue('servidor_postgres')
+    schema = f'teste_{uuid.uuid4().hex[:12]}'
+    with psycopg.connect(endereco, autocommit=True) as conn:
+        conn.execute(f'CREATE SCHEMA {schema}')
+    separador = '&' if '?' in endereco else '?'
+    banco = Database(f'{endereco}{separador}options=-csearch_path%3D{schema}')
+    try:
+        yield banco
+    finally:
+        banco.encerrar_fila_escrita()
+        banco.armazenamento.fechar()
+        with psycopg.connect(endereco, autocommit=True) as conn:
+            conn.execute(f'DROP SCHEMA {schema} CASCADE')
+
+
+@pytest.fixture
+def cliente(db, tmp_path):
+    """Cliente de teste da aplicação sobre o mesmo banco do fixture db"""
+    from app import create_app
+
+    app = create_app({'TESTING': True, 'DATABASE': db.db_path,
+                      'UPLOAD_FOLDER': str(tmp_path / 'uploads'), 'ARQUIVO_PDF': str(tmp_path / 'arquivo_pdfs')})
+    db_app = app.extensions['faturamento_db']
+    try:
+        yield app.test_client()
+    finally:
+        db_app.encerrar_fila_escrita()
+        db_app.armazenamento.fechar()
@@ -0,0 +1,54 @@
+import pytest
+
+from adiantamentos import CustoAdiantamentos, calcular_custo
+
+
+def _nota(numero, data_emissao, valor, tomador):
+    return {'data_emissao': data_emissao, 'numero_nf': numero, 'tipo': 'CONSTRUCAO', 'valor_bruto': valor,
+            'valor_nominal_calculado': valor, 'tomador': tomador}
+
+
+def test_calcular_custo():
+    dias, mensal, anual = calcular_custo(980, 20, '2026-09-11', '2026-10-01')
+    assert dias == 20
+    assert mensal == pytest.approx(((1000 / 980) ** (30 / 20) - 1) * 100, abs=1e-4)
+    assert anual == pytest.approx(((1000 / 980) ** (365 / 20) - 1) * 100, abs=1e-4)
+
+    # Adiantamento no vencimento, sem valor ou com data inválida: sem taxa
+    assert calcular_custo(980, 20, '2026-10-01', '2026-10-01') == (0, None, None)
+    assert calcular_custo(0, 20, '2026-09-11', '2026-10-01') == (None, None, None)
+    assert calcular_custo(980, None, '2026-09-11', '2026-10-01') == (None, None, None)
+    assert calcular_custo(980, 20, '2026-13-01', '2026-10-01') == (None, None, None)
+
+
+def test_otimizar_usa_a_taxa_historica_de_cada_tomador(db):
+    with pytest.raises(ValueError, match='taxa_anual'):
+        CustoAdiantamentos(db).otimizar('2026-10-15')
+
+    # Histórico (vencimento em 2026-10-01): Celpa ~44% a.a., Vale ~20% a.a.
+    for numero, tomador, liquido in (('1', 'Celpa', 980), ('2', 'Vale', 990)):
+        nota_id = db.inserir_nota(_nota(numero, '2026-09-01', 1000, tomador))
+        db.adiantar_nota(nota_id, {'valor_liquido_vinci': liquido, 'pis_cofins_retido': False,
+                                   'data_adiantamento': '2026-09-11'})
+
+    db.inserir_nota(_nota('10', '2026-10-05', 1000, 'Celpa'))   # vence em 20 dias
+    db.inserir_nota(_nota('11', '2026-10-10', 2000, 'Vale'))    # 25 dias
+    db.inserir_nota(_nota('12', '2026-10-20', 500, 'Celpa'))    # 35 dias
+    db.inserir_nota(_nota('13', '2026-09-01', 700, 'Celpa'))    # já vencida: fora
+
+    otimizacao = CustoAdiantamentos(db).otimizar('2026-10-15')
+    assert otimizacao['candidatas'] == 3
+    assert [n['numero_nf'] for n in otimizacao['notas']] == ['11', '10', '12']
+    celpa = otimizacao['notas'][1]
+    assert celpa['dias_antecipados'] == 20
+    assert celpa['valor_liquido_estimado'] == pytest.approx(
+        1000 / (1 + celpa['taxa_anual_estimada'] / 100) ** (20 / 365), abs=0.05)
+
+    otimizacao = CustoAdiantamentos(db).otimizar('2026-10-15', valor_necessario=2500)
+    assert [n['numero_nf'] for n in otimizacao['notas']] == ['11', '10']
+    assert otimizacao['cobre_valor_necessario'] is True
+
+    # Taxa informada vale para todos: quem vence antes custa menos
+    otimizacao = CustoAdiantamentos(db).otimizar('2026-10-15', taxa_anual=12)
+    assert [n['numero_nf'] for n in otimizacao['notas']] == ['10', '11', '12']
+    assert {n['taxa_anual_estimada'] for n in otimizacao['notas']} == {12}
@@ -0,0 +1,186 @@
+import threading
+
+import pytest
+
+from adiantamentos import CustoAdiantamentos
+from analises import Analises
+from armazenamento import traduzir_sql
+from busca import BuscaTextual, montar_consulta_tsquery
+from idempotencia import ChaveIdempotenciaReutilizada
+from ledger import Ledger
+
+
+def _nota(numero, data_emissao='2026-09-01', valor=1000, **extras):
+    return {'data_emissao': data_emissao, 'numero_nf': numero, 'tipo': 'CONSTRUCAO',
+            'valor_bruto': valor, 'tomador': 'Prefeitura de Belém', 'localidade': 'Belém', **extras}
+
+
+def _recebimento(nfs, valor, **extras):
+    return {'data_recebimento': '2026-10-01', 'valor_recebido': valor, 'nfs_referentes': nfs,
+            'tipo_recebimento': 'TED', 'complemento': 'Pagamento medição', **extras}
+
+
+def test_traduzir_sql_respeita_textos_e_marcadores():
+    assert traduzir_sql("SELECT '?', x FROM t WHERE a = ? AND b LIKE 'x%'") == \
+        "SELECT '?', x FROM t WHERE a = %s AND b LIKE 'x%%'"
+    assert traduzir_sql("SELECT :hoje, ':nome', a::text", True) == "SELECT %(hoje)s, ':nome', a::text"
+    assert traduzir_sql('SELECT :hoje') == 'SELECT :hoje'
+
+
+def test_consulta_tsquery_sem_acentos():
+    assert montar_consulta_tsquery('Celpa Belém') == "'celpa':* & 'belem':*"
+    assert montar_consulta_tsquery('  ') == ''
+
+
+def test_recebimento_concilia_e_atualiza_status(db):
+    versao_inicial, _ = db.versao_dados()
+    db.inserir_nota(_nota('101', valor=600))
+    db.inserir_nota(_nota('102.0', valor=400))
+    db.inserir_nota(_nota('103', valor=100))
+    extrato_id = db.inserir_recebimento(_recebimento('101, 102', 1000))
+
+    status = {nota['numero_nf']: nota['status_recebimento'] for nota in db.listar_todas_notas()}
+    assert status == {'101': 'RECEBIDO', '102.0': 'RECEBIDO', '103': 'PENDENTE'}
+    assert len(db.notas_do_recebimento(extrato_id)) == 2
+    assert [r['id'] for r in db.recebimentos_da_nf('102')] == [extrato_id]
+
+    versao, atualizado_em = db.versao_dados()
+    assert versao > versao_inicial
+    assert len(atualizado_em) == 19
+
+
+def test_pendentes_dashboard_e_posicao_caixa(db):
+    # CONSTRUCAO vence em 30 dias
+    db.inserir_nota(_nota('1', '2026-09-01', 1000))
+    db.inserir_nota(_nota('2', '2026-10-01', 500, valor_nominal_calculado=450))
+
+    pendentes = db.listar_pendentes(data_referencia='2026-10-11')
+    assert [(p['numero_nf'], p['situacao'], p['dias_diferenca']) for p in pendentes] == \
+        [('1', 'ATRASADO', 10), ('2', 'A_RECEBER', -20)]
+
+    dashboard = db.dashboard_recebimentos('2026-10-11')
+    assert dashboard['atrasado'] == {'qtd': 1, 'total': 1000}
+    assert dashboard['a_receber'] == {'qtd': 1, 'total': 450}
+
+    posicao = db.posicao_caixa('2026-11-30', data_referencia='2026-10-11', saldo_inicial=100)
+    assert posicao['atrasado'] == {'qtd': 1, 'total': 1000}
+    assert posicao['serie'] == [{'data': '2026-10-31', 'qtd': 1, 'entradas': 450, 'saldo': 550}]
+
+    planilha = db.exportar_para_excel('pendentes', '2026-10-11')
+    assert [linha['Dias'] for linha in planilha] == [10, -20]
+
+
+def test_busca_textual_sem_acentos_e_por_prefixo(db):
+    db.inserir_nota(_nota('4600.0'))
+    db.inserir_nota(_nota('4700', tomador='Equatorial Pará', localidade='Marabá'))
+    db.inserir_recebimento(_recebimento('4600', 1000, complemento='Depósito Equatorial'))
+
+    busca = BuscaTextual(db)
+    assert [n['numero_nf'] for n in busca.buscar('belem', escopo='notas')['notas']] == ['4600.0']
+    assert [n['numero_nf'] for n in busca.buscar('4600')['notas']] == ['4600.0']
+    assert [n['numero_nf'] for n in busca.buscar('equat para')['notas']] == ['4700']
+
+    extrato = busca.buscar('deposito', escopo='extrato')['extrato']
+    assert len(extrato) == 1
+    assert '[' in extrato[0]['trecho']
+
+    # Triggers mantêm o índice nas alterações e exclusões
+    conn = db._conectar()
+    conn.execute("UPDATE notas_fiscais SET tomador = 'Celpa' WHERE numero_nf = '4700'")
+    conn.commit()
+    conn.close()
+    assert [n['numero_nf'] for n in busca.buscar('celpa')['notas']] == ['4700']
+    assert busca.buscar('equatorial', escopo='notas')['notas'] == []
+
+
+def test_ledger_reconstroi_posicao_e_e_somente_inclusao(db):
+    db.inserir_nota(_nota('1', valor=800))
+    db.inserir_nota(_nota('2', valor=200))
+    db.inserir_recebimento(_recebimento('1', 800))
+
+    ledger = Ledger(db)
+    assert ledger.verificar() == []
+    posicao = ledger.posicao_em('9999-12-31')
+    assert posicao['por_status']['RECEBIDO'] == {'qtd': 1, 'esperado': 800, 'recebido': 800}
+    assert posicao['saldo_em_aberto'] == 200
+
+    snapshot = ledger.snapshot()
+    assert snapshot['notas'] == 2
+    assert ledger.snapshot()['seq'] == snapshot['seq']
+    assert ledger.posicao_em('9999-12-31')['saldo_em_aberto'] == 200
+
+    conn = db._conectar()
+    with pytest.raises(Exception, match='somente inclusão'):
+        conn.execute('DELETE FROM ledger_eventos')
+    conn.rollback()
+    conn.close()
+
+
+def test_idempotencia_devolve_o_resultado_gravado(db):
+    primeiro = db.inserir_nota(_nota('10'), chave_idempotencia='chave-1')
+    assert db.inserir_nota(_nota('10'), chave_idempotencia='chave-1') == primeiro
+    with pytest.raises(ChaveIdempotenciaReutilizada):
+        db.inserir_nota(_nota('11'), chave_idempotencia='chave-1')
+    assert len(db.listar_todas_notas()) == 1
+
+
+def test_adiantamento_gera_lancamento_e_resumo_de_custo(db):
+    nota_id = db.inserir_nota(_nota('20', '2026-09-01', 1000, valor_nominal_calculado=1000))
+    db.adiantar_nota(nota_id, {'valor_liquido_vinci': 980, 'pis_cofins_retido': False,
+                               'data_adiantamento': '2026-09-11'})
+
+    assert db.listar_pendentes(data_referencia='2026-09-12') == []
+    tendencia = CustoAdiantamentos(db).tendencia()
+    assert [(linha['mes'], linha['qtd'], linha['valor_retido']) for linha in tendencia] == [('2026-09', 1, 20)]
+    assert tendencia[0]['prazo_medio_dias'] == 20
+
+
+def test_importacao_de_extrato_em_lote(db):
+    db.inserir_nota(_nota('30'))
+    assert db.numeros_nf_existentes(['30.0', '31']) == {'30'}
+
+    lancamentos = [dict(_recebimento('30', 1000), documento='DOC-1'),
+                   dict(_recebimento('31', 50), documento='DOC-2')]
+    ids, duplicados = db.inserir_recebimentos_lote(lancamentos, arquivo='extrato.ofx')
+    assert (len(ids), duplicados) == (2, 0)
+    assert db.inserir_recebimentos_lote(lancamentos)[1] == 2
+    assert db.documentos_importados(['DOC-1', 'DOC-3']) == {'DOC-1'}
+
+
+def test_fila_de_escrita_com_varias_threads(db):
+    db.ativar_fila_escrita()
+    erros = []
+
+    def inserir(inicio):
+        try:
+            for numero in range(inicio, inicio + 10):
+                db.inserir_nota(_nota(str(numero)))
+        except Exception as e:
+            erros.append(e)
+
+    threads = [threading.Thread(target=inserir, args=(inicio,)) for inicio in (100, 200, 300)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    db.encerrar_fila_escrita()
+
+    assert erros == []
+    assert len(db.listar_todas_notas()) == 30
+    assert Ledger(db).verificar() == []
+
+
+def test_esquema_reaplicado_e_resumos_reconstruidos(db):
+    db.inserir_nota(_nota('40', valor=300))
+    db.init_database()
+    assert db.esquema_atualizado()
+
+    db.reconstruir_resumos()
+    assert db.posicao_caixa('2026-12-31', data_referencia='2026-09-01')['saldo_final'] == 300
+
+    notas = list(db.exportar_notas_completo())
+    assert [nota['numero_nf'] for nota in notas] == ['40']
+
+    pivot = Analises(db).pivot('tomador', periodo='ano')
+    assert pivot['total'] == 300
+    assert pivot['periodos'] == ['2026']
@@ -0,0 +1,48 @@
+from arquivo_pdf import ArquivoPDF
+
+
+def _envelhecer(db):
+    conn = db._conectar()
+    conn.execute("UPDATE arquivo_pdf SET criado_em = '2000-01-01 00:00:00'")
+    conn.commit()
+    conn.close()
+
+
+def test_reenvio_renova_o_pdf_orfao(db, tmp_path):
+    arquivo = ArquivoPDF(db, raiz=str(tmp_path / 'arquivo'))
+    pdf = tmp_path / 'nota.pdf'
+    pdf.write_bytes(b'%PDF-1.4 nota 4600' * 100)
+
+    sha256 = arquivo.guardar(str(pdf))
+    _envelhecer(db)
+    assert arquivo.guardar(str(pdf), nome_original='de novo.pdf') == sha256
+
+    # Reenviado agora: ainda dentro da retenção
+    assert arquivo.compactar(dias_retencao=30)['removidos'] == 0
+    assert arquivo.ler(sha256) == pdf.read_bytes()
+
+    _envelhecer(db)
+    assert arquivo.compactar(dias_retencao=30)['removidos'] == 1
+    assert not arquivo.existe(sha256)
+    assert arquivo.estatisticas()['arquivos'] == 0
+
+    # Depois da compactação o mesmo conteúdo é arquivado e registrado de novo
+    assert arquivo.guardar(str(pdf)) == sha256
+    assert arquivo.existe(sha256)
+    assert arquivo.estatisticas()['arquivos'] == 1
+
+
+def test_pdf_vinculado_a_nota_nao_e_orfao(db, tmp_path):
+    arquivo = ArquivoPDF(db, raiz=str(tmp_path / 'arquivo'))
+    pdf = tmp_path / 'nota.pdf'
+    pdf.write_bytes(b'%PDF-1.4 nota 4700')
+
+    sha256 = arquivo.guardar(str(pdf))
+    nota_id = db.inserir_nota({'data_emissao': '2026-09-01', 'numero_nf': '4700', 'tipo': 'CONSTRUCAO',
+                               'valor_bruto': 100})
+    db.aplicar_reextracao([(nota_id, {}, {'pdf_sha256': sha256})])
+    _envelhecer(db)
+
+    assert arquivo.compactar(dias_retencao=30)['removidos'] == 0
+    stats = arquivo.estatisticas()
+    assert (stats['arquivos'], stats['bytes_originais'], stats['sem_nota']) == (1, 18, 0)
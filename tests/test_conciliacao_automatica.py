@@ -0,0 +1,68 @@
+import random
+
+from conciliacao_automatica import sugerir_combinacoes, sugerir_nfs
+
+
+def _nota(id, valor, vencimento='2026-10-01', tomador='Celpa'):
+    return {'id': id, 'numero_nf': f'{id}.0', 'valor_liquido': valor, 'data_vencimento': vencimento,
+            'tomador': tomador}
+
+
+def test_combinacoes_exatas_com_menos_notas_primeiro():
+    notas = [_nota(1, 100), _nota(2, 250), _nota(3, 400), _nota(4, 650), _nota(5, 300, tomador='Vale')]
+
+    resultado = sugerir_combinacoes(notas, 650, data_recebimento='2026-10-05')
+
+    assert resultado['completo']
+    assert resultado['candidatos'] == 5
+    assert [c['nfs_referentes'] for c in resultado['combinacoes']] == ['4', '2, 3']
+    assert resultado['combinacoes'][1]['diferenca'] == 0
+
+
+def test_combinacao_nao_mistura_tomadores_nem_sai_da_janela():
+    notas = [_nota(1, 300), _nota(2, 200, tomador='Vale'),
+             _nota(3, 200, vencimento='2026-01-01'), _nota(4, 200, vencimento='2026-12-01')]
+
+    resultado = sugerir_combinacoes(notas, 500, data_recebimento='2026-10-05')
+    assert resultado['combinacoes'] == []
+    assert resultado['candidatos'] == 2
+
+    resultado = sugerir_combinacoes(notas, 200, data_recebimento='2026-10-05', tomador='Vale')
+    assert [c['nfs_referentes'] for c in resultado['combinacoes']] == ['2']
+
+
+def test_combinacao_de_cinco_ou_mais_notas_com_tolerancia():
+    notas = [_nota(id, 100 + id / 100) for id in range(1, 7)]
+
+    resultado = sugerir_combinacoes(notas, 500.17, data_recebimento='2026-10-05', tolerancia=0.05)
+    combinacao = resultado['combinacoes'][0]
+    assert len(combinacao['notas']) == 5
+    assert abs(combinacao['diferenca']) <= 0.05
+
+    assert sugerir_combinacoes(notas, 500.17, data_recebimento='2026-10-05', max_notas=4)['combinacoes'] == []
+
+
+def test_tempo_esgotado_devolve_resultado_parcial():
+    aleatorio = random.Random(42)
+    notas = [_nota(id, round(aleatorio.uniform(50, 5000), 2)) for id in range(1, 301)]
+
+    resultado = sugerir_combinacoes(notas, 9999.99, data_recebimento='2026-10-05', tempo_limite=0)
+
+    assert resultado['completo'] is False
+    assert resultado['tempo_ms'] < 1000
+    assert len(resultado['combinacoes']) <= 5
+
+
+def test_sugerir_nfs_referencia_no_texto_e_nota_usada_uma_vez():
+    notas = [_nota(4600, 1000), _nota(4601, 1000.02), _nota(4602, 500)]
+    lancamentos = [
+        {'valor_recebido': 1000, 'complemento': 'TED REF NF 4601'},
+        {'valor_recebido': 1000, 'complemento': 'TED'},
+        {'valor_recebido': 1000, 'complemento': 'TED'},
+    ]
+
+    sugerir_nfs(lancamentos, notas)
+
+    assert [l['nfs_referentes'] for l in lancamentos] == ['4601', '4600', '']
+    assert [l['sugestao']['motivo'] for l in lancamentos[:2]] == ['referencia', 'valor']
+    assert lancamentos[2]['sugestao'] is None
@@ -0,0 +1,28 @@
+from eventos import CanalEventos, canal
+
+
+def test_canal_limita_assinantes_e_forca_resync():
+    eventos = CanalEventos(tamanho_fila=2)
+    primeira = eventos.assinar(limite=1)
+    assert eventos.assinar(limite=1) is None
+
+    for numero in range(3):
+        eventos.publicar('delta', {'numero': numero})
+    assert primeira.get_nowait().startswith('event: resync')
+
+    eventos.cancelar(primeira)
+    assert eventos.assinar(limite=1) is not None
+
+
+def test_dashboard_stream_acima_do_limite_responde_503(cliente):
+    cliente.application.config['MAX_CONEXOES_SSE'] = 1
+
+    resposta = cliente.get('/api/dashboard-stream', buffered=False)
+    assert resposta.mimetype == 'text/event-stream'
+    assert next(resposta.response) == b'retry: 3000\n\n'
+
+    assert cliente.get('/api/dashboard-stream').status_code == 503
+
+    # Conexão encerrada libera a vaga
+    resposta.close()
+    assert not canal.tem_assinantes()
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+from fechamento import Fechamento
+
+
+def _dia(deslocamento):
+    return (datetime.now() + timedelta(days=deslocamento)).strftime('%Y-%m-%d')
+
+
+def test_fechamento_retroativo_usa_valor_da_data(db):
+    nota_id = db.inserir_nota({'data_emissao': _dia(-20), 'numero_nf': '124', 'tipo': 'CONSTRUCAO',
+                               'valor_bruto': 500, 'valor_nominal_calculado': 500})
+    # Adiantada hoje por 480: o ledger registra o evento com a data de hoje
+    db.adiantar_nota(nota_id, {'valor_liquido_vinci': 480, 'pis_cofins_retido': False,
+                               'data_adiantamento': _dia(0)})
+
+    fechamento = Fechamento(db)
+    ontem = fechamento.gerar(_dia(-1))
+    hoje = fechamento.gerar(_dia(0))
+
+    assert ontem['qtd_a_receber'] == 1
+    assert ontem['total_a_receber'] == 500
+    # Hoje o adiantamento já foi recebido (lançamento automático no extrato)
+    assert hoje['qtd_a_receber'] == 0
+
+
+def test_fechamento_de_nota_lancada_depois_da_data(db):
+    db.inserir_nota({'data_emissao': _dia(-40), 'numero_nf': '200', 'tipo': 'CONSTRUCAO', 'valor_bruto': 300})
+
+    cabecalho = Fechamento(db).gerar(_dia(-35))
+
+    # Emitida antes da data, lançada no sistema hoje: entra com os valores do lançamento
+    assert cabecalho['qtd_a_receber'] == 1
+    assert cabecalho['total_a_receber'] == 300
+
+
+def test_comparar_fechamentos(db, cliente):
+    # CONSTRUCAO vence em 30 dias
+    db.inserir_nota({'data_emissao': '2026-08-01', 'numero_nf': '1', 'tipo': 'CONSTRUCAO', 'valor_bruto': 1000})
+    db.inserir_nota({'data_emissao': '2026-08-20', 'numero_nf': '2', 'tipo': 'CONSTRUCAO', 'valor_bruto': 400})
+    db.inserir_nota({'data_emissao': '2026-09-15', 'numero_nf': '3', 'tipo': 'CONSTRUCAO', 'valor_bruto': 250})
+    db.inserir_recebimento({'data_recebimento': '2026-09-20', 'valor_recebido': 1000,
+                            'nfs_referentes': '1', 'tipo_recebimento': 'TED'})
+
+    fechamento = Fechamento(db)
+    fechamento.gerar('2026-09-10')
+    fechamento.gerar('2026-09-30')
+    comparacao = fechamento.comparar('2026-09-10', '2026-09-30')
+
+    assert {d['numero_nf']: d['mudanca'] for d in comparacao['notas']} == {'1': 'saiu', '2': 'venceu', '3': 'entrou'}
+    assert comparacao['resumo']['saiu'] == {'qtd': 1, 'variacao_saldo': -1000}
+    assert comparacao['totais']['total_atrasado'] == {'anterior': 1000, 'posterior': 400, 'variacao': -600}
+
+    resposta = cliente.get('/api/fechamentos/comparar?de=2026-09-10&ate=2026-09-30')
+    assert resposta.status_code == 200
+    assert resposta.get_json()['comparacao']['total_notas'] == 3
+
+
+def test_comparar_sem_datas_responde_400(cliente):
+    resposta = cliente.get('/api/fechamentos/comparar')
+    assert resposta.status_code == 400
+    assert 'YYYY-MM-DD' in resposta.get_json()['error']
+
+    resposta = cliente.get('/api/fechamentos/comparar?de=2026-09-10&ate=2026-09-30')
+    assert resposta.status_code == 400
+    assert 'inexistente' in resposta.get_json()['error']
@@ -0,0 +1,122 @@
+import threading
+
+import pytest
+
+from fila_escrita import FilaEscrita, PoolLeitura
+
+
+def _preparar(db):
+    conn = db._conectar()
+    conn.execute('CREATE TABLE teste_fila (valor INTEGER NOT NULL UNIQUE)')
+    conn.commit()
+    conn.close()
+
+
+def _valores(db):
+    conn = db._conectar()
+    valores = [row[0] for row in conn.execute('SELECT valor FROM teste_fila ORDER BY valor').fetchall()]
+    conn.close()
+    return valores
+
+
+def _inserir(valor):
+    def operacao(cursor):
+        cursor.execute('INSERT INTO teste_fila (valor) VALUES (?)', (valor,))
+        return valor
+    return operacao
+
+
+def _fila(db, **opcoes):
+    return FilaEscrita(lambda: db.armazenamento.conectar(check_same_thread=False), **opcoes)
+
+
+def test_operacoes_enviadas_juntas_gravam_em_um_lote(db):
+    _preparar(db)
+    fila = _fila(db, espera_lote=0.2)
+
+    futuros = [fila.enviar(_inserir(valor)) for valor in range(10)]
+    assert [futuro.result() for futuro in futuros] == list(range(10))
+    fila.fechar()
+
+    assert (fila.lotes, fila.operacoes) == (1, 10)
+    assert _valores(db) == list(range(10))
+
+
+def test_lote_respeita_o_maximo(db):
+    _preparar(db)
+    fila = _fila(db, max_lote=3, espera_lote=0.2)
+
+    futuros = [fila.enviar(_inserir(valor)) for valor in range(7)]
+    for futuro in futuros:
+        futuro.result()
+    fila.fechar()
+
+    assert fila.lotes == 3
+    assert _valores(db) == list(range(7))
+
+
+def test_erro_de_uma_operacao_so_desfaz_ela(db):
+    _preparar(db)
+    fila = _fila(db, espera_lote=0.2)
+
+    def falhar(cursor):
+        cursor.execute('INSERT INTO teste_fila (valor) VALUES (?)', (50,))
+        raise ValueError('operação inválida')
+
+    primeiro = fila.enviar(_inserir(1))
+    com_erro = fila.enviar(falhar)
+    duplicado = fila.enviar(_inserir(1))
+    ultimo = fila.enviar(_inserir(2))
+
+    assert primeiro.result() == 1 and ultimo.result() == 2
+    with pytest.raises(ValueError, match='operação inválida'):
+        com_erro.result()
+    with pytest.raises(Exception, match='UNIQUE|unique|duplicate'):
+        duplicado.result()
+    fila.fechar()
+
+    assert fila.lotes == 1
+    assert _valores(db) == [1, 2]
+
+
+def test_fila_do_database_propaga_o_erro_para_quem_escreveu(db):
+    _preparar(db)
+    db.ativar_fila_escrita()
+    erros = []
+
+    def escrever(valor):
+        try:
+            db._executar_escrita(_inserir(valor % 5))
+        except Exception as e:
+            erros.append(e)
+
+    threads = [threading.Thread(target=escrever, args=(valor,)) for valor in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    db.encerrar_fila_escrita()
+
+    # 5 valores distintos gravados; as outras 15 tentativas recebem o erro de unicidade
+    assert _valores(db) == [0, 1, 2, 3, 4]
+    assert len(erros) == 15
+
+
+def test_pool_de_leitura_reaproveita_conexoes(tmp_path):
+    import sqlite3
+
+    abertas = []
+
+    def conectar(**opcoes):
+        conn = sqlite3.connect(str(tmp_path / 'pool.db'), **opcoes)
+        abertas.append(conn)
+        return conn
+
+    pool = PoolLeitura(conectar, tamanho=1)
+    primeira, segunda = pool.obter(), pool.obter()
+    primeira.close()
+    segunda.close()
+
+    assert pool.obter() is primeira
+    assert len(abertas) == 2
+    pool.fechar()
@@ -0,0 +1,58 @@
+import pytest
+
+
+def _recebimento(valor=1000):
+    return {'data_recebimento': '01/10/2026', 'valor_recebido': valor, 'nfs_referentes': '10',
+            'tipo_recebimento': 'TED'}
+
+
+def _contar(db, tabela):
+    conn = db._conectar()
+    total = conn.execute(f'SELECT COUNT(*) FROM {tabela}').fetchone()[0]
+    conn.close()
+    return total
+
+
+def test_repeticao_devolve_o_mesmo_lancamento(db, cliente):
+    db.inserir_nota({'data_emissao': '2026-09-01', 'numero_nf': '10', 'tipo': 'CONSTRUCAO', 'valor_bruto': 1000})
+    cabecalhos = {'Idempotency-Key': 'rec-1'}
+
+    primeira = cliente.post('/api/registrar-recebimento', json=_recebimento(), headers=cabecalhos)
+    repetida = cliente.post('/api/registrar-recebimento', json=_recebimento(), headers=cabecalhos)
+
+    assert primeira.status_code == repetida.status_code == 200
+    assert primeira.get_json()['extrato_id'] == repetida.get_json()['extrato_id']
+    assert _contar(db, 'extrato') == 1
+    assert _contar(db, 'conciliacao') == 1
+
+
+def test_chave_reutilizada_responde_422(db, cliente):
+    db.inserir_nota({'data_emissao': '2026-09-01', 'numero_nf': '10', 'tipo': 'CONSTRUCAO', 'valor_bruto': 1000})
+    cabecalhos = {'Idempotency-Key': 'rec-2'}
+    assert cliente.post('/api/registrar-recebimento', json=_recebimento(), headers=cabecalhos).status_code == 200
+
+    # Outro conteúdo com a mesma chave
+    resposta = cliente.post('/api/registrar-recebimento', json=_recebimento(999), headers=cabecalhos)
+    assert resposta.status_code == 422
+    assert 'rec-2' in resposta.get_json()['error']
+
+    # Mesma chave em outra rota
+    resposta = cliente.post('/api/adiantar-nota', json={'nota_id': 1, 'valor_liquido_vinci': 980},
+                            headers=cabecalhos)
+    assert resposta.status_code == 422
+    assert _contar(db, 'extrato') == 1
+
+
+def test_chave_vencida_volta_a_escrever(db):
+    nota = {'data_emissao': '2026-09-01', 'numero_nf': '11', 'tipo': 'CONSTRUCAO', 'valor_bruto': 100}
+    db.inserir_nota(nota, chave_idempotencia='nota-1')
+
+    conn = db._conectar()
+    conn.execute("UPDATE requisicao_idempotente SET criado_em = '2000-01-01 00:00:00'")
+    conn.commit()
+    conn.close()
+
+    # A chave expirou: a segunda tentativa escreve de novo (e falha pela NF duplicada)
+    with pytest.raises(Exception, match='UNIQUE|unique|duplicate'):
+        db.inserir_nota(nota, chave_idempotencia='nota-1')
+    assert _contar(db, 'requisicao_idempotente') == 1
@@ -0,0 +1,136 @@
+from importar_extrato_bancario import (ExtratoBancarioImporter, detectar_formato, ler_cnab240,
+                                       ler_cnab400, ler_csv, ler_ofx)
+
+
+def _registro(tamanho, campos):
+    """Linha de largura fixa com cada texto na posição (0-based) indicada"""
+    linha = [' '] * tamanho
+    for inicio, texto in campos.items():
+        linha[inicio:inicio + len(texto)] = texto
+    return ''.join(linha)
+
+
+def _gravar(tmp_path, nome, linhas):
+    caminho = tmp_path / nome
+    caminho.write_text('\r\n'.join(linhas) + '\r\n', encoding='latin-1')
+    return str(caminho)
+
+
+def _cnab240(tmp_path, detalhes, data_geracao='15102026'):
+    linhas = [_registro(240, {0: '341', 7: '0', 143: data_geracao})]
+    for ocorrencia, nosso_numero, valor, data_ocorrencia, data_credito in detalhes:
+        linhas.append(_registro(240, {0: '341', 7: '3', 13: 'T', 15: ocorrencia,
+                                      37: nosso_numero.ljust(20), 58: f'NF{nosso_numero}'}))
+        linhas.append(_registro(240, {0: '341', 7: '3', 13: 'U', 77: f'{valor:015d}',
+                                      137: data_ocorrencia, 145: data_credito}))
+    return _gravar(tmp_path, 'retorno.ret', linhas)
+
+
+def _cnab400(tmp_path, detalhes, data_gravacao='151026'):
+    linhas = [_registro(400, {0: '0', 76: '237', 94: data_gravacao})]
+    for ocorrencia, nosso_numero, valor, data_ocorrencia, data_credito in detalhes:
+        linhas.append(_registro(400, {0: '1', 70: nosso_numero.ljust(12), 108: ocorrencia,
+                                      110: data_ocorrencia, 116: f'NF{nosso_numero}',
+                                      253: f'{valor:013d}', 295: data_credito}))
+    return _gravar(tmp_path, 'retorno.ret', linhas)
+
+
+def test_ofx_sgml_so_creditos(tmp_path):
+    caminho = _gravar(tmp_path, 'extrato.ofx', [
+        'OFXHEADER:100', 'DATA:OFXSGML', '',
+        '<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKACCTFROM><ACCTID>12345-6</BANKACCTFROM>',
+        '<BANKTRANLIST>',
+        '<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20261001120000[-3:BRT]<TRNAMT>1500,50',
+        '<FITID>A1<NAME>PREFEITURA<MEMO>TED NF 4600</STMTTRN>',
+        '<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20261002<TRNAMT>-80.00<FITID>A2</STMTTRN>',
+        '<STMTTRN><TRNTYPE>CREDIT<TRNAMT>10.00<FITID>A3</STMTTRN>',
+        '</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>',
+    ])
+    rejeitados = []
+    lancamentos = list(ler_ofx(caminho, rejeitados))
+
+    assert [(l['data_recebimento'], l['valor_recebido'], l['complemento'], l['documento'])
+            for l in lancamentos] == [('2026-10-01', 1500.5, 'PREFEITURA TED NF 4600', 'ofx:12345-6:A1')]
+    assert [r['motivo'] for r in rejeitados] == ['DTPOSTED ausente ou inválido']
+
+
+def test_ofx_xml(tmp_path):
+    caminho = _gravar(tmp_path, 'extrato.xml', [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<OFX><BANKACCTFROM><ACCTID>999</ACCTID></BANKACCTFROM><BANKTRANLIST>',
+        '<STMTTRN><DTPOSTED>20261003</DTPOSTED><TRNAMT>200.00</TRNAMT>'
+        '<FITID>X9</FITID><CHECKNUM>777</CHECKNUM><MEMO>DEP</MEMO></STMTTRN>',
+        '</BANKTRANLIST></OFX>',
+    ])
+    assert detectar_formato(caminho) == 'ofx'
+    lancamento, = ler_ofx(caminho)
+    assert (lancamento['documento_banco'], lancamento['documento']) == ('777', 'ofx:999:X9')
+
+
+def test_cnab240_usa_data_do_header_quando_datas_zeradas(tmp_path):
+    caminho = _cnab240(tmp_path, [
+        ('06', '111', 100050, '01102026', '02102026'),
+        ('02', '222', 5000, '01102026', '02102026'),   # entrada confirmada: não é liquidação
+        ('17', '333', 700, '00000000', '00000000'),
+    ])
+    assert detectar_formato(caminho) == 'cnab240'
+
+    lancamentos = list(ler_cnab240(caminho))
+    assert [(l['data_recebimento'], l['valor_recebido'], l['documento']) for l in lancamentos] == [
+        ('2026-10-02', 1000.5, 'cnab:341:111:06'),
+        ('2026-10-15', 7.0, 'cnab:341:333:17'),
+    ]
+
+
+def test_cnab240_sem_nenhuma_data_rejeita_a_linha(tmp_path):
+    caminho = _cnab240(tmp_path, [('06', '111', 700, '00000000', '00000000')], data_geracao='00000000')
+    rejeitados = []
+    assert list(ler_cnab240(caminho, rejeitados)) == []
+    assert [r['linha'] for r in rejeitados] == [3]
+
+
+def test_cnab400(tmp_path):
+    caminho = _cnab400(tmp_path, [
+        ('06', '111', 25000, '011026', '021026'),
+        ('09', '222', 100, '011026', '021026'),
+        ('15', '333', 300, '000000', '000000'),
+    ])
+    assert detectar_formato(caminho) == 'cnab400'
+
+    lancamentos = list(ler_cnab400(caminho))
+    assert [(l['data_recebimento'], l['valor_recebido'], l['documento']) for l in lancamentos] == [
+        ('2026-10-02', 250.0, 'cnab:237:111:06'),
+        ('2026-10-15', 3.0, 'cnab:237:333:15'),
+    ]
+
+
+def test_csv_brasileiro(tmp_path):
+    caminho = _gravar(tmp_path, 'extrato.csv', [
+        'Data;Histórico;Valor (R$)',
+        '01/10/2026;TED PREFEITURA;1.234,56',
+        '01/10/2026;TARIFA;-12,00',
+        '02/10/2026;PIX;50,00',
+        '02/10/2026;PIX;50,00',
+        'xx/10/2026;PIX;10,00',
+    ])
+    rejeitados = []
+    lancamentos = list(ler_csv(caminho, rejeitados))
+
+    assert [(l['data_recebimento'], l['valor_recebido']) for l in lancamentos] == \
+        [('2026-10-01', 1234.56), ('2026-10-02', 50.0), ('2026-10-02', 50.0)]
+    # Linhas idênticas sem documento continuam distintas
+    assert len({l['documento'] for l in lancamentos}) == 3
+    assert [r['linha'] for r in rejeitados] == [6]
+
+
+def test_importar_grava_e_informa_rejeitados(db, tmp_path):
+    db.inserir_nota({'data_emissao': '2026-09-01', 'numero_nf': '111', 'tipo': 'CONSTRUCAO',
+                     'valor_bruto': 1000.5})
+    caminho = _cnab240(tmp_path, [
+        ('06', '111', 100050, '01102026', '02102026'),
+        ('06', '222', 700, '00000000', '00000000'),
+    ], data_geracao='00000000')
+
+    resultado = ExtratoBancarioImporter(caminho, db=db).importar()
+    assert (resultado['lidos'], len(resultado['extrato_ids']), len(resultado['rejeitados'])) == (1, 1, 1)
+    assert ExtratoBancarioImporter(caminho, db=db).importar()['duplicados'] == 1
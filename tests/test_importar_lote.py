@@ -0,0 +1,55 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from importar_lote import importar_planilhas
+
+
+def _planilha(caminho, notas, recebimentos):
+    """Planilha regional com as abas NF'S (número, emissão, valor) e Extrato (data, valor, NFs)"""
+    with pd.ExcelWriter(caminho) as writer:
+        pd.DataFrame({
+            'Data Emissão': [datetime.strptime(emissao, '%Y-%m-%d') for _, emissao, _ in notas],
+            'Nº NF': [numero for numero, _, _ in notas],
+            'Tipo': ['CONSTRUCAO'] * len(notas),
+            'Valor Bruto': [valor for _, _, valor in notas],
+        }).to_excel(writer, sheet_name="NF'S", index=False)
+        pd.DataFrame({
+            'Data': [datetime.strptime(data, '%Y-%m-%d') for data, _, _ in recebimentos],
+            'Valor            ': [valor for _, valor, _ in recebimentos],
+            "NF'S": [nfs for _, _, nfs in recebimentos],
+        }).to_excel(writer, sheet_name='Extrato', index=False)
+    return str(caminho)
+
+
+@pytest.mark.parametrize('processos', [1, 2])
+def test_duplicadas_entre_arquivos_e_no_banco(db, tmp_path, processos):
+    db.inserir_nota({'data_emissao': '2024-01-02', 'numero_nf': '900', 'tipo': 'CONSTRUCAO', 'valor_bruto': 50})
+    norte = _planilha(tmp_path / 'norte.xlsx',
+                      [(1001, '2024-01-05', 100.0), (1002, '2024-01-06', 200.0)],
+                      [('2024-02-05', 100.0, '1001')])
+    sul = _planilha(tmp_path / 'sul.xlsx',
+                    [(1002, '2024-01-06', 200.0), (1003, '2024-01-07', 300.0), (900, '2024-01-02', 50.0)],
+                    [('2024-02-05', 100.0, '1001'), ('2024-02-06', 200.0, '1002')])
+
+    relatorio = importar_planilhas([norte, sul], db, processos=processos)
+
+    assert relatorio['processos'] == processos
+    assert (relatorio['notas_importadas'], relatorio['recebimentos_importados']) == (3, 2)
+    assert relatorio['rejeitadas'] == []
+    assert [(d['arquivo'], d['aba'], d['chave'], d['motivo'], d.get('primeira_em'))
+            for d in relatorio['duplicadas']] == [
+        ('sul.xlsx', "NF'S", '1002', 'repetida', 'norte.xlsx:3'),
+        ('sul.xlsx', "NF'S", '900', 'ja_no_banco', None),
+        ('sul.xlsx', 'Extrato', '2024-02-05 | 100.0 | 1001', 'repetida', 'norte.xlsx:2'),
+    ]
+    assert [a['notas_lidas'] for a in relatorio['arquivos']] == [2, 3]
+
+    status = {n['numero_nf']: n['status_recebimento'] for n in db.listar_todas_notas()}
+    assert status == {'900': 'PENDENTE', '1001': 'RECEBIDO', '1002': 'RECEBIDO', '1003': 'PENDENTE'}
+
+    # Importar de novo: o banco vence todas as linhas, inclusive as repetidas entre arquivos
+    relatorio = importar_planilhas([norte, sul], db, processos=1)
+    assert (relatorio['notas_importadas'], relatorio['recebimentos_importados']) == (0, 0)
+    assert [d['motivo'] for d in relatorio['duplicadas']] == ['ja_no_banco'] * 8
@@ -0,0 +1,39 @@
+import instrumentacao
+
+
+def _tres_consultas(cursor):
+    for _ in range(3):
+        cursor.execute('SELECT 1')
+    return 'ok'
+
+
+def test_escritas_da_fila_contam_na_requisicao_que_as_enviou(db):
+    db.ativar_fila_escrita()
+    try:
+        instrumentacao.iniciar_requisicao()
+        assert db._executar_escrita(_tres_consultas) == 'ok'
+        consultas, tempo = instrumentacao.finalizar_requisicao()
+    finally:
+        db.encerrar_fila_escrita()
+
+    # Só as da operação: BEGIN/SAVEPOINT/COMMIT do lote não são atribuídos
+    assert consultas == 3
+    assert tempo > 0
+
+    # Fora de uma requisição nada é somado
+    db._executar_escrita(_tres_consultas)
+    assert instrumentacao.finalizar_requisicao() == (0, 0.0)
+
+
+def test_metricas_do_banco_por_requisicao(db, cliente):
+    db.inserir_nota({'data_emissao': '2026-09-01', 'numero_nf': '1', 'tipo': 'CONSTRUCAO', 'valor_bruto': 100})
+    instrumentacao.registro.limpar()
+
+    resposta = cliente.post('/api/registrar-recebimento', json={
+        'data_recebimento': '01/10/2026', 'valor_recebido': 100, 'nfs_referentes': '1', 'tipo_recebimento': 'TED'})
+    assert resposta.status_code == 200
+    assert 'consultas' in resposta.headers['Server-Timing']
+
+    metricas = cliente.get('/metrics').get_data(as_text=True)
+    assert 'faturamento_db_consultas_por_requisicao_count{rota="/api/registrar-recebimento"} 1' in metricas
+    assert 'faturamento_sqlite' not in metricas
@@ -0,0 +1,83 @@
+import json
+
+import ledger
+from ledger import Ledger, aplicar, estado_vazio
+
+
+def _nota(numero, valor):
+    return {'data_emissao': '2026-09-01', 'numero_nf': numero, 'tipo': 'CONSTRUCAO', 'valor_bruto': valor,
+            'tomador': f'Tomador {numero}'}
+
+
+def _replay_completo(db):
+    """Projeção aplicando todos os eventos desde o início, sem snapshot"""
+    estado = estado_vazio()
+    conn = db._conectar()
+    for tipo, entidade, dados in conn.execute('SELECT tipo, entidade, dados FROM ledger_eventos ORDER BY seq'):
+        aplicar(estado, tipo, entidade, json.loads(dados) if dados else None)
+    conn.close()
+    return estado
+
+
+def _contar_snapshots(db):
+    conn = db._conectar()
+    total = conn.execute('SELECT COUNT(*) FROM ledger_snapshot').fetchone()[0]
+    conn.close()
+    return total
+
+
+def test_snapshot_mais_eventos_seguintes(db):
+    a = db.inserir_nota(_nota('1', 800))
+    b = db.inserir_nota(_nota('2', 200))
+    led = Ledger(db)
+    snapshot = led.snapshot()
+    assert snapshot['notas'] == 2
+
+    db.inserir_recebimento({'data_recebimento': '2026-10-01', 'valor_recebido': 500,
+                            'nfs_referentes': '1', 'tipo_recebimento': 'TED'})
+    db.inserir_nota(_nota('3', 300))
+    db.aplicar_reextracao([(b, {'valor_bruto': 250}, {})])
+
+    estado, seq = led.estado_em()
+    assert seq > snapshot['seq']
+    assert estado == _replay_completo(db)
+    assert estado['notas'][a][ledger.RECEBIDO] == 800
+    assert estado['notas'][b][5] == 250
+
+    # Na data do snapshot, os eventos seguintes ficam de fora
+    posicao = led.posicao_em(snapshot['registrado_em'])
+    assert (posicao['notas'], posicao['saldo_em_aberto'], posicao['recebimentos']['qtd']) == (2, 1000, 0)
+
+    posicao = led.posicao_em('9999-12-31', dimensao='tomador')
+    assert posicao['por_status']['RECEBIDO']['qtd'] == 1
+    assert [item['tomador'] for item in posicao['por_tomador']] == ['Tomador 3', 'Tomador 2']
+    assert led.verificar() == []
+
+
+def test_replay_longo_grava_snapshot(db, monkeypatch):
+    for numero in range(4):
+        db.inserir_nota(_nota(str(numero), 100))
+    monkeypatch.setattr(ledger, 'SNAPSHOT_A_CADA', 3)
+
+    led = Ledger(db)
+    estado, seq = led.estado_em()
+    assert _contar_snapshots(db) == 1
+
+    # A próxima consulta parte do snapshot e chega ao mesmo estado
+    assert led.estado_em() == (estado, seq)
+    assert _contar_snapshots(db) == 1
+
+
+def test_verificar_aponta_tabela_alterada_fora_do_ledger(db):
+    nota_id = db.inserir_nota(_nota('1', 800))
+    assert Ledger(db).verificar() == []
+
+    conn = db._conectar()
+    conn.execute("UPDATE notas_fiscais SET status_recebimento = 'RECEBIDO' WHERE id = ?", (nota_id,))
+    conn.commit()
+    conn.close()
+
+    assert Ledger(db).verificar() == [{'nota_id': nota_id, 'problema': 'status',
+                                       'tabela': 'RECEBIDO', 'ledger': 'PENDENTE'}]
+    # Mudar só o status não gera evento
+    assert [e['tipo'] for e in Ledger(db).historico_nota(nota_id)] == ['nota_criada']
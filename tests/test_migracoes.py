@@ -0,0 +1,83 @@
+import pytest
+
+import migracoes
+from adiantamentos import CustoAdiantamentos
+from armazenamento import dialeto
+from database import Database
+
+GATILHOS_CUSTO = ('trg_resumo_adiantamentos_insert', 'trg_resumo_adiantamentos_update',
+                  'trg_resumo_adiantamentos_delete')
+INDICES_MIGRACAO_2 = ('idx_conciliacao_nota', 'idx_conciliacao_extrato', 'idx_notas_vencimento',
+                      'idx_notas_status_vencimento', 'idx_notas_tomador', 'idx_notas_numero_normalizado',
+                      'idx_extrato_data_recebimento')
+
+
+def _rebaixar(db, versao):
+    """Deixa o banco como uma instalação antiga na `versao` (sem o que as migrações seguintes criam)"""
+    conn = db._conectar()
+    cursor = conn.cursor()
+    pg = dialeto(cursor) == 'postgresql'
+
+    for gatilho in GATILHOS_CUSTO:
+        cursor.execute(f'DROP TRIGGER IF EXISTS {gatilho}' + (' ON notas_fiscais' if pg else ''))
+    cursor.execute('DROP TABLE IF EXISTS resumo_adiantamentos')
+    for coluna in ('dias_antecipacao', 'taxa_efetiva_mensal', 'taxa_efetiva_anual'):
+        cursor.execute(f'ALTER TABLE notas_fiscais DROP COLUMN {coluna}')
+    if versao < 2:
+        for indice in INDICES_MIGRACAO_2:
+            cursor.execute(f'DROP INDEX IF EXISTS {indice}')
+
+    if pg and versao == 0:
+        cursor.execute('DROP TABLE esquema_versao')
+    elif pg:
+        cursor.execute('UPDATE esquema_versao SET versao = ?', (versao,))
+    else:
+        cursor.execute(f'PRAGMA user_version = {versao}')
+    conn.commit()
+    conn.close()
+
+
+def _indices(db):
+    conn = db._conectar()
+    if db.armazenamento.nome == 'postgresql':
+        sql = "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()"
+    else:
+        sql = "SELECT name FROM sqlite_master WHERE type = 'index'"
+    nomes = {row[0] for row in conn.execute(sql).fetchall()}
+    conn.close()
+    return nomes
+
+
+@pytest.mark.parametrize('versao_antiga, aplicadas', [(0, [2, 3]), (1, [2, 3]), (2, [3])])
+def test_migra_banco_antigo_preservando_os_dados(db, capsys, versao_antiga, aplicadas):
+    nota_id = db.inserir_nota({'data_emissao': '2026-09-01', 'numero_nf': '1', 'tipo': 'CONSTRUCAO',
+                               'valor_bruto': 1000, 'valor_nominal_calculado': 1000, 'tomador': 'Celpa'})
+    db.adiantar_nota(nota_id, {'valor_liquido_vinci': 980, 'pis_cofins_retido': False,
+                               'data_adiantamento': '2026-09-11'})
+    _rebaixar(db, versao_antiga)
+    assert not db.esquema_atualizado()
+    capsys.readouterr()
+
+    migrado = Database(db.db_path)
+    try:
+        assert migrado.esquema_atualizado()
+        assert [linha.split(':')[0].strip() for linha in capsys.readouterr().out.splitlines()
+                if 'Migração' in linha] == [f'🔧 Migração {numero}' for numero in aplicadas]
+        assert set(INDICES_MIGRACAO_2) <= _indices(migrado)
+
+        # Nota adiantada antes da migração 3: taxas calculadas e resumo reconstruído
+        tendencia = CustoAdiantamentos(migrado).tendencia()
+        assert [(linha['mes'], linha['qtd'], linha['valor_retido']) for linha in tendencia] == [('2026-09', 1, 20)]
+        assert [nota['numero_nf'] for nota in migrado.listar_todas_notas()] == ['1']
+    finally:
+        migrado.armazenamento.fechar()
+
+
+def test_banco_atualizado_nao_reaplica_migracoes(db):
+    conn = db._conectar()
+    cursor = conn.cursor()
+    assert migracoes.versao(cursor) == migracoes.VERSAO_ATUAL
+    assert migracoes.aplicar(cursor) == []
+    assert migracoes.adicionar_coluna(cursor, 'notas_fiscais', 'taxa_efetiva_anual', 'REAL') is False
+    conn.rollback()
+    conn.close()
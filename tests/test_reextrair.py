@@ -0,0 +1,20 @@
+from ledger import Ledger
+from reextrair import comparar, montar_alteracao
+
+
+def test_reextracao_recalcula_status_quando_o_valor_muda(db):
+    nota_id = db.inserir_nota({'data_emissao': '2026-09-01', 'numero_nf': '50', 'tipo': 'CONSTRUCAO',
+                               'valor_bruto': 1000, 'valor_nominal_calculado': 1000})
+    db.inserir_recebimento({'data_recebimento': '2026-10-01', 'valor_recebido': 1000,
+                            'nfs_referentes': '50', 'tipo_recebimento': 'TED'})
+
+    nota = next(n for n in db.notas_para_reextracao() if n['id'] == nota_id)
+    divergencias = comparar(nota, {'valor_bruto': '1200.00', 'tomador': ''})
+    assert divergencias == {'valor_bruto': [1000, 1200.0]}
+
+    _, campos_nota, _ = alteracao = montar_alteracao(nota, divergencias, None, db)
+    assert campos_nota['valor_nominal_calculado'] > 1000
+    db.aplicar_reextracao([alteracao])
+
+    assert [n['status_recebimento'] for n in db.listar_todas_notas()] == ['PARCIAL']
+    assert Ledger(db).verificar() == []
@@ -0,0 +1,32 @@
+from resumos import ResumoRecebiveis
+
+
+def _nota(numero, data_emissao, valor):
+    return {'data_emissao': data_emissao, 'numero_nf': numero, 'tipo': 'CONSTRUCAO', 'valor_bruto': valor}
+
+
+def test_previsao_mensal_nao_repete_o_atrasado_do_mes_atual(db):
+    # CONSTRUCAO vence em 30 dias: 2026-10-05 (atrasada em 10/10), 2026-10-20 e 2026-11-14
+    db.inserir_nota(_nota('1', '2026-09-05', 1000))
+    db.inserir_nota(_nota('2', '2026-09-20', 300))
+    db.inserir_nota(_nota('3', '2026-10-15', 200))
+
+    previsao = ResumoRecebiveis(db).previsao_mensal(meses=3, data_referencia='2026-10-10')
+
+    assert previsao['atrasado'] == {'qtd': 1, 'total': 1000}
+    assert previsao['meses'] == [
+        {'mes': '2026-10', 'qtd': 1, 'total': 300},
+        {'mes': '2026-11', 'qtd': 1, 'total': 200},
+    ]
+
+
+def test_previsao_mensal_por_dimensao_na_virada_do_ano(db):
+    db.inserir_nota(_nota('1', '2026-12-01', 100))
+    db.inserir_nota(_nota('2', '2026-12-10', 50))
+
+    previsao = ResumoRecebiveis(db).previsao_mensal(meses=2, dimensao='tipo', data_referencia='2026-12-20')
+
+    assert previsao['meses'] == [
+        {'mes': '2026-12', 'tipo': 'CONSTRUCAO', 'qtd': 1, 'total': 100},
+        {'mes': '2027-01', 'tipo': 'CONSTRUCAO', 'qtd': 1, 'total': 50},
+    ]
@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pandas as pd
+
+from database import Database
+from importar_planilha import PlanilhaImporter
+from validacao_planilha import converter_datas, validar_notas
+
+
+def _notas(**colunas):
+    base = {
+        'Data Emissão': [datetime(2024, 1, 5), datetime(2024, 1, 6)],
+        'Nº NF': [1001, 1002],
+        'Tipo': ['CONSTRUCAO', 'TRANSPORTE'],
+        'Valor Bruto': [100.0, 200.0],
+    }
+    base.update(colunas)
+    return pd.DataFrame(base)
+
+
+def test_data_do_adiantamento_vazia_na_planilha(tmp_path):
+    """Sem notas adiantadas a coluna chega do Excel como float64 toda NaN"""
+    caminho = tmp_path / 'planilha.xlsx'
+    with pd.ExcelWriter(caminho) as writer:
+        _notas(**{'Data do adiantamento': [None, None]}).to_excel(writer, sheet_name="NF'S", index=False)
+        pd.DataFrame({'Data': [], 'Valor            ': [], "NF'S": []}).to_excel(
+            writer, sheet_name='Extrato', index=False)
+
+    db = Database(str(tmp_path / 'teste.db'))
+    resultado = PlanilhaImporter(str(caminho), db=db).importar_tudo()
+
+    assert resultado['nfs'] == 2
+    assert resultado['problemas'] == []
+
+
+def test_coluna_de_datas_vazia_em_float64():
+    datas, invalidas = converter_datas(pd.Series([float('nan'), float('nan')]))
+
+    assert datas.isna().all()
+    assert not invalidas.any()
+
+
+def test_coluna_de_datas_numerica_recusa_linhas_sem_quebrar():
+    notas, problemas = validar_notas(_notas(**{'Data Emissão': [45296.0, 45297.0]}))
+
+    assert notas == []
+    assert [(p['linha'], p['coluna'], p['nivel']) for p in problemas] == [
+        (2, 'Data Emissão', 'erro'), (3, 'Data Emissão', 'erro')]
+
+
+def test_data_do_adiantamento_numerica_e_recusada():
+    notas, problemas = validar_notas(_notas(**{'Data do adiantamento': [45296.0, None]}))
+
+    assert [linha for linha, _ in notas] == [3]
+    assert problemas[0]['coluna'] == 'Data do adiantamento'
+    assert problemas[0]['valor'] == 45296.0
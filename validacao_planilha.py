@@ -0,0 +1,325 @@
+"""
+Validação da planilha - checagens por coluna (vetorizadas) antes de qualquer gravação
+Cada coluna é convertida de uma vez: datas com o formato adivinhado para a coluna
+inteira, números com pd.to_numeric. As regras viram máscaras sobre o DataFrame e o
+resultado é a lista de linhas válidas mais um relatório com um item por célula:
+
+    {'linha': 12, 'coluna': 'Valor Bruto', 'valor': 'abc', 'nivel': 'erro', 'mensagem': 'Valor não numérico'}
+
+Linhas com algum 'erro' não são importadas. Um 'aviso' (ex.: valor nominal que não
+confere com as retenções) só sinaliza: a linha entra com os valores da planilha.
+"""
+from datetime import date, datetime
+
+import pandas as pd
+
+from database import PRAZOS_RECEBIMENTO, normalizar_numero_nf
+
+# Formatos aceitos em datas digitadas como texto
+FORMATOS_DATA = ('%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y')
+
+# Textos da coluna usados para escolher o formato de data mais provável
+AMOSTRA_FORMATO = 200
+
+TIPOS_VALIDOS = tuple(PRAZOS_RECEBIMENTO)
+# Nota sem tipo na planilha entra como construção
+TIPO_PADRAO = 'CONSTRUCAO'
+
+# Diferença máxima (R$) entre valores que deveriam conferir; absorve o arredondamento das retenções
+TOLERANCIA_VALOR = 0.05
+
+# Linha da planilha da primeira linha do DataFrame (linha 1 = cabeçalho)
+PRIMEIRA_LINHA = 2
+
+# Nomes exatos das colunas da aba Extrato (com espaços à direita)
+COLUNA_VALOR_EXTRATO = 'Valor            '
+COLUNA_COMPLEMENTO_EXTRATO = 'Complemento' + ' ' * 139
+
+COLUNAS_NOTAS = ('Nº NF', 'Data Emissão', 'Tipo', 'Valor Bruto')
+COLUNAS_EXTRATO = ('Data', COLUNA_VALOR_EXTRATO, "NF'S")
+
+RETENCOES = ('Retenções Federais (INSS)', 'ISS', 'Retenção Equatorial', 'PIS/COFINS/CSLL')
+VALORES_NOTAS = ('Valor Bruto', *RETENCOES, 'Valor Nominal (Vinci)', 'Valor Nominal Conferência',
+                 'Valor Líquido Vinci', 'Valor retido Vinci', '% de Adiantamento')
+
+
+class RelatorioValidacao:
+    """Problemas encontrados nas linhas de um DataFrame e quais linhas ficam de fora"""
+
+    def __init__(self, df):
+        self.df = df
+        self.problemas = []
+        self.invalidas = pd.Series(False, index=df.index)
+
+    def registrar(self, mascara, coluna, mensagem, nivel='erro'):
+        """Um problema por linha marcada na máscara
+
+        Args:
+            mensagem: Texto único ou Série (mesmo índice do DataFrame) com o texto de cada linha
+        """
+        mascara = mascara.fillna(False).astype(bool)
+        if not mascara.any():
+            return
+        if nivel == 'erro':
+            self.invalidas |= mascara
+
+        indices = mascara.index[mascara]
+        valores = self.df.loc[indices, coluna] if coluna in self.df else [None] * len(indices)
+        mensagens = mensagem.loc[indices] if isinstance(mensagem, pd.Series) else [mensagem] * len(indices)
+        for indice, valor, texto in zip(indices, valores, mensagens):
+            self.problemas.append({
+                'linha': int(indice) + PRIMEIRA_LINHA,
+                'coluna': coluna,
+                'valor': _valor_relatorio(valor),
+                'nivel': nivel,
+                'mensagem': texto
+            })
+
+    def colunas_ausentes(self, obrigatorias):
+        """Registra (na linha do cabeçalho) as colunas obrigatórias que faltam; True se faltar alguma"""
+        ausentes = [coluna for coluna in obrigatorias if coluna not in self.df.columns]
+        for coluna in ausentes:
+            self.problemas.append({'linha': 1, 'coluna': coluna, 'valor': None, 'nivel': 'erro',
+                                   'mensagem': 'Coluna obrigatória ausente'})
+        return bool(ausentes)
+
+    def ordenados(self):
+        return sorted(self.problemas, key=lambda problema: problema['linha'])
+
+
+def _valor_relatorio(valor):
+    """Valor original da célula em um tipo que vai para JSON"""
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if hasattr(valor, 'item'):
+        return valor.item()
+    return valor if isinstance(valor, (int, float)) else str(valor)
+
+
+def _e_texto(serie):
+    return serie.map(lambda valor: isinstance(valor, str)).astype(bool)
+
+
+def _coluna(df, coluna):
+    """Coluna do DataFrame ou uma coluna vazia (colunas opcionais da planilha)"""
+    if coluna in df.columns:
+        return df[coluna]
+    return pd.Series(None, index=df.index, dtype=object)
+
+
+def _texto(serie, padrao=''):
+    """Texto sem espaços nas pontas; vazio/NaN vira `padrao`"""
+    textos = serie.map(lambda valor: str(valor).strip(), na_action='ignore').astype(object)
+    return textos.where(textos.notna() & (textos != ''), padrao)
+
+
+def _datas_de_texto(textos):
+    """Datas digitadas: o formato que mais acerta na amostra primeiro, os demais nas que sobrarem"""
+    amostra = textos.head(AMOSTRA_FORMATO)
+    formatos = sorted(FORMATOS_DATA,
+                      key=lambda formato: -pd.to_datetime(amostra, format=formato, errors='coerce').notna().sum())
+
+    datas = pd.to_datetime(textos, format=formatos[0], errors='coerce')
+    for formato in formatos[1:]:
+        pendentes = datas.isna()
+        if not pendentes.any():
+            break
+        datas = datas.fillna(pd.to_datetime(textos[pendentes], format=formato, errors='coerce'))
+    return datas
+
+
+def converter_datas(serie):
+    """Coluna de datas -> texto YYYY-MM-DD
+
+    Returns:
+        (datas, invalidas): Série de texto (NaN onde vazia ou inválida) e máscara das
+        células preenchidas que não são uma data
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.dt.strftime('%Y-%m-%d'), pd.Series(False, index=serie.index)
+
+    # Coluna toda vazia ou numérica chega como float64: sem object o .str abaixo não se aplica
+    serie = serie.astype(object)
+    # Datas do Excel chegam como datetime; texto usa os FORMATOS_DATA; números não são datas
+    e_data = serie.map(lambda valor: isinstance(valor, (datetime, date))).astype(bool)
+    e_texto = _e_texto(serie)
+    textos = serie[e_texto].str.strip()
+    textos = textos[textos != '']
+
+    datas = pd.to_datetime(serie.where(e_data), errors='coerce')
+    if len(textos):
+        datas = datas.fillna(_datas_de_texto(textos))
+
+    vazias = serie.isna() | (e_texto & (serie.where(e_texto).str.strip() == ''))
+    return datas.dt.strftime('%Y-%m-%d'), ~vazias & datas.isna()
+
+
+def converter_numeros(serie):
+    """Coluna de valores -> float (aceita texto com vírgula decimal: '1.234,56')
+
+    Returns:
+        (numeros, invalidas): Série float (NaN onde vazia ou inválida) e máscara das
+        células preenchidas que não são um número
+    """
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        return serie.astype(float), pd.Series(False, index=serie.index)
+
+    serie = serie.astype(object)
+    e_texto = _e_texto(serie)
+    numeros = pd.to_numeric(serie.where(~e_texto), errors='coerce').astype(float)
+    vazias = serie.isna()
+
+    if e_texto.any():
+        textos = serie[e_texto].str.replace('R$', '', regex=False).str.strip()
+        vazias |= (textos == '').reindex(serie.index, fill_value=False)
+        virgula = textos.str.contains(',', regex=False)
+        textos = textos.where(~virgula, textos.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+        numeros = numeros.fillna(pd.to_numeric(textos.where(textos != ''), errors='coerce'))
+
+    return numeros, ~vazias & numeros.isna()
+
+
+def normalizar_tipos(serie):
+    """'Construção ' -> 'CONSTRUCAO' (maiúsculas, sem acento); vazio vira TIPO_PADRAO"""
+    tipos = _texto(serie, padrao=TIPO_PADRAO).astype(str)
+    return tipos.str.upper().str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+
+
+def _difere(valor, esperado):
+    return (valor - esperado).abs() > TOLERANCIA_VALOR
+
+
+def _registros(frame):
+    """DataFrame -> [(linha da planilha, dict)] com None no lugar de NaN"""
+    registros = frame.astype(object).where(frame.notna(), None).to_dict('records')
+    return list(zip((frame.index + PRIMEIRA_LINHA).tolist(), registros))
+
+
+def validar_notas(df, db=None):
+    """Valida a aba NF'S inteira e monta os dados de inserir_nota das linhas válidas
+
+    Args:
+        df: DataFrame da aba (como lido por pd.read_excel)
+        db: Database para recusar NFs já cadastradas (uma consulta); None pula essa checagem
+
+    Returns:
+        (notas, problemas): [(linha, dados para inserir_nota)] e o relatório em ordem de linha
+    """
+    relatorio = RelatorioValidacao(df)
+    if relatorio.colunas_ausentes(COLUNAS_NOTAS):
+        return [], relatorio.ordenados()
+
+    # Linhas sem número são espaço em branco da planilha
+    df = df[df['Nº NF'].notna()]
+    relatorio = RelatorioValidacao(df)
+
+    numeros = _texto(df['Nº NF'])
+    relatorio.registrar(numeros == '', 'Nº NF', 'Número da NF vazio')
+
+    data_emissao, invalidas = converter_datas(df['Data Emissão'])
+    relatorio.registrar(invalidas, 'Data Emissão', 'Data inválida (use dd/mm/aaaa)')
+    relatorio.registrar(df['Data Emissão'].isna(), 'Data Emissão', 'Data de emissão vazia')
+
+    data_adiantamento, invalidas = converter_datas(_coluna(df, 'Data do adiantamento'))
+    relatorio.registrar(invalidas, 'Data do adiantamento', 'Data inválida (use dd/mm/aaaa)')
+
+    tipos = normalizar_tipos(df['Tipo'])
+    relatorio.registrar(~tipos.isin(TIPOS_VALIDOS), 'Tipo', f"Tipo desconhecido (use {', '.join(TIPOS_VALIDOS)})")
+
+    valores = {}
+    for coluna in VALORES_NOTAS:
+        valores[coluna], invalidas = converter_numeros(_coluna(df, coluna))
+        relatorio.registrar(invalidas, coluna, 'Valor não numérico')
+        relatorio.registrar(valores[coluna] < 0, coluna, 'Valor negativo')
+    relatorio.registrar(df['Valor Bruto'].isna(), 'Valor Bruto', 'Valor bruto vazio')
+
+    # Duplicadas pelo número normalizado ('123.0' = '123'): na própria planilha a primeira
+    # ocorrência vence; o banco vence todas
+    chaves = numeros.map(normalizar_numero_nf)
+    repetidas = chaves.duplicated(keep='first') & (chaves != '')
+    primeira = pd.Series(df.index + PRIMEIRA_LINHA, index=df.index).groupby(chaves).transform('first')
+    relatorio.registrar(repetidas, 'Nº NF', 'NF repetida na planilha (primeira na linha ' + primeira.astype(str) + ')')
+    if db is not None:
+        no_banco = db.numeros_nf_existentes(set(chaves[chaves != '']))
+        relatorio.registrar(chaves.isin(no_banco) & ~repetidas, 'Nº NF', 'NF já cadastrada')
+
+    bruto = valores['Valor Bruto'].fillna(0)
+    retencoes = {coluna: valores[coluna].fillna(0) for coluna in RETENCOES}
+    nominal = valores['Valor Nominal (Vinci)'].fillna(0)
+    conferencia = valores['Valor Nominal Conferência']
+    liquido = valores['Valor Líquido Vinci']
+    retido = valores['Valor retido Vinci']
+    foi_adiantado = (liquido > 0) | (retido > 0)
+
+    # Consistência: a planilha manda, mas valores que não conferem ficam no relatório
+    esperado = bruto - sum(retencoes.values())
+    relatorio.registrar((nominal > 0) & _difere(nominal, esperado), 'Valor Nominal (Vinci)',
+                        'Não confere com valor bruto - retenções (esperado ' + esperado.round(2).astype(str) + ')',
+                        nivel='aviso')
+    relatorio.registrar((conferencia > 0) & (nominal > 0) & _difere(conferencia, nominal), 'Valor Nominal Conferência',
+                        'Diferente do Valor Nominal (Vinci)', nivel='aviso')
+    relatorio.registrar((liquido > 0) & retido.notna() & (nominal > 0) & _difere(liquido + retido, nominal),
+                        'Valor Líquido Vinci', 'Líquido + retido Vinci diferente do valor nominal', nivel='aviso')
+    relatorio.registrar(foi_adiantado & data_adiantamento.isna(), 'Data do adiantamento',
+                        'Nota adiantada sem data do adiantamento (custo não calculado)', nivel='aviso')
+
+    frame = pd.DataFrame({
+        'data_emissao': data_emissao,
+        'numero_nf': numeros,
+        'tipo': tipos,
+        'valor_bruto': bruto,
+        'localidade': _texto(_coluna(df, 'Localidade')),
+        'tomador': _texto(_coluna(df, 'Tomador do Serviço')),
+        'inss': retencoes['Retenções Federais (INSS)'],
+        'iss': retencoes['ISS'],
+        'retencao_equatorial': retencoes['Retenção Equatorial'],
+        'pis_cofins_retido': retencoes['PIS/COFINS/CSLL'] > 0,
+        'pis_cofins_csll': retencoes['PIS/COFINS/CSLL'],
+        'valor_nominal_conferencia': conferencia,
+        'valor_nominal_calculado': nominal,  # Usa o da planilha!
+        'valor_liquido_vinci': liquido,
+        'foi_adiantado': foi_adiantado,
+        'data_adiantamento': data_adiantamento,
+        'valor_retido_vinci': retido,
+        'percentual_adiantamento': valores['% de Adiantamento'] * 100
+    }, index=df.index)
+
+    return _registros(frame[~relatorio.invalidas]), relatorio.ordenados()
+
+
+def validar_extrato(df):
+    """Valida a aba Extrato e monta os dados de inserir_recebimento das linhas válidas
+
+    Linhas sem data, com valor zero/negativo (saídas) ou sem NFs referentes não são
+    recebimentos e ficam de fora sem entrar no relatório.
+
+    Returns:
+        (recebimentos, problemas): [(linha, dados para inserir_recebimento)] e o relatório
+    """
+    relatorio = RelatorioValidacao(df)
+    if relatorio.colunas_ausentes(COLUNAS_EXTRATO):
+        return [], relatorio.ordenados()
+
+    df = df[df['Data'].notna()]
+    relatorio = RelatorioValidacao(df)
+
+    data_recebimento, invalidas = converter_datas(df['Data'])
+    relatorio.registrar(invalidas, 'Data', 'Data inválida (use dd/mm/aaaa)')
+
+    valor, invalidas = converter_numeros(df[COLUNA_VALOR_EXTRATO])
+    relatorio.registrar(invalidas, COLUNA_VALOR_EXTRATO, 'Valor não numérico')
+
+    nfs_referentes = _texto(df["NF'S"])
+    recebimento = (valor > 0) & (nfs_referentes != '')
+
+    frame = pd.DataFrame({
+        'data_recebimento': data_recebimento,
+        'valor_recebido': valor,
+        'nfs_referentes': nfs_referentes,
+        'tipo_recebimento': _texto(_coluna(df, 'Tipo'), padrao='Integral'),
+        'complemento': _texto(_coluna(df, COLUNA_COMPLEMENTO_EXTRATO))
+    }, index=df.index)
+
+    return _registros(frame[recebimento & ~relatorio.invalidas]), relatorio.ordenados()
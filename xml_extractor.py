@@ -0,0 +1,190 @@
+"""
+Extração de dados do XML de NF-e, CT-e e NFS-e (ABRASF e padrão nacional)
+Leitura em streaming (iterparse) e saída no mesmo formato de NFExtractor.extract()
+"""
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+from ocr_extractor import NFExtractor
+
+# Tags com texto livre (descrição do serviço, informações complementares):
+# alimentam a identificação do tipo e a busca de contrato/STM/requisição/folhas
+TAGS_DESCRICAO = ('natOp', 'xProd', 'infCpl', 'xObs', 'Discriminacao', 'xDescServ', 'xInfComp')
+
+# Quem é o tomador no CT-e (ide/toma3/toma ou toma03/toma)
+PAPEL_TOMADOR_CTE = {'0': 'rem', '1': 'exped', '2': 'receb', '3': 'dest'}
+
+# Campos por layout: lista de chaves 'pai/tag' (ou só 'tag') em ordem de preferência
+MAPA_CAMPOS = {
+    'NFE': {
+        'numero_nf': ('ide/nNF',),
+        'data_emissao': ('ide/dhEmi', 'ide/dEmi'),
+        'valor_bruto': ('ISSQNtot/vServ', 'ICMSTot/vNF'),
+        'localidade': ('enderDest/xMun', 'enderEmit/xMun'),
+        'tomador': ('dest/xNome',),
+        'inss': ('retTrib/vRetPrev',),
+        'iss': ('ISSQNtot/vISS',),
+    },
+    'CTE': {
+        'numero_nf': ('ide/nCT',),
+        'data_emissao': ('ide/dhEmi',),
+        'valor_bruto': ('vPrest/vTPrest',),
+        'localidade': ('ide/xMunIni', 'enderEmit/xMun'),
+        'tomador': ('toma4/xNome', 'toma/xNome'),
+        'inss': (),
+        'iss': (),
+    },
+    'NFSE': {
+        'numero_nf': ('InfNfse/Numero', 'infNFSe/nNFSe', 'Numero'),
+        'data_emissao': ('InfNfse/DataEmissao', 'infDPS/dhEmi', 'DataEmissao', 'dhEmi'),
+        'valor_bruto': ('Valores/ValorServicos', 'vServPrest/vServ', 'ValorServicos'),
+        'localidade': ('infNFSe/xLocPrestacao', 'infNFSe/xLocIncid', 'Endereco/Cidade', 'xMun'),
+        'tomador': ('TomadorServico/RazaoSocial', 'Tomador/RazaoSocial', 'toma/xNome'),
+        'inss': ('Valores/ValorInss', 'tribFed/vRetCP'),
+        'iss': ('Valores/ValorIss', 'tribMun/vISSQN'),
+    },
+}
+
+
+def eh_xml(nome=None, conteudo=None):
+    """Decide pelo nome do arquivo ou, sem extensão conhecida, pelo início do conteúdo"""
+    if nome and '.' in nome:
+        return nome.rsplit('.', 1)[1].lower() == 'xml'
+    return conteudo is not None and conteudo.lstrip()[:1] == b'<'
+
+
+def extrair_documento(origem, nome=None):
+    """Extrai os dados de um documento fiscal: XML quando disponível, texto do PDF como alternativa
+
+    Args:
+        origem: Caminho do arquivo ou objeto binário (BytesIO)
+        nome: Nome original do arquivo (usado para decidir XML x PDF)
+
+    Returns:
+        (dados, formato) com formato 'xml' ou 'pdf'
+    """
+    if nome is None and isinstance(origem, str):
+        nome = origem
+
+    if eh_xml(nome):
+        return XMLExtractor(origem).extract(), 'xml'
+    return NFExtractor(origem).extract(), 'pdf'
+
+
+class XMLExtractor:
+    def __init__(self, xml_path):
+        self.xml_path = xml_path
+        self.data = {}
+
+    def extract(self):
+        """Extrai dados do XML (NF-e, CT-e ou NFS-e)"""
+        campos, tags, descricao = self._ler(self.xml_path)
+        layout = self._identificar_layout(tags)
+        mapa = MAPA_CAMPOS[layout]
+
+        # Auxiliar de texto livre: mesmas regras do extractor de PDF
+        texto = NFExtractor(None)
+        descricao = '\n'.join(descricao)
+
+        self.data['tipo'] = 'TRANSPORTE_CTE' if layout == 'CTE' else texto._identify_type(descricao)
+
+        self.data['numero_nf'] = self._primeiro(campos, mapa['numero_nf'])
+        self.data['data_emissao'] = self._converter_data(self._primeiro(campos, mapa['data_emissao']))
+        self.data['valor_bruto'] = self._valor(campos, mapa['valor_bruto'])
+        self.data['localidade'] = self._primeiro(campos, mapa['localidade']).upper()
+
+        tomador = self._primeiro(campos, mapa['tomador'])
+        if layout == 'CTE' and not tomador:
+            papel = PAPEL_TOMADOR_CTE.get(self._primeiro(campos, ('toma3/toma', 'toma03/toma')))
+            tomador = campos.get(f'{papel}/xNome', '') if papel else ''
+        self.data['tomador'] = self._normalizar_tomador(tomador)
+
+        self.data['inss'] = self._valor(campos, mapa['inss'])
+        self.data['iss'] = self._valor(campos, mapa['iss'])
+
+        if self.data['tipo'] == 'CONSTRUCAO':
+            self.data['contrato'] = texto._extract_contrato(descricao)
+            self.data['folhas_registro'] = texto._extract_folhas(descricao)
+        elif self.data['tipo'] == 'TRANSPORTE':
+            self.data['stm'] = texto._extract_stm(descricao)
+            self.data['requisicao'] = texto._extract_requisicao(descricao)
+
+        return self.data
+
+    def _ler(self, origem):
+        """Percorre o XML uma vez, sem montar a árvore inteira
+
+        Returns:
+            campos: {'pai/tag': texto, 'tag': texto} com a primeira ocorrência de cada folha
+            tags: conjunto de tags vistas (para identificar o layout)
+            descricao: textos livres (TAGS_DESCRICAO) na ordem do documento
+        """
+        campos = {}
+        tags = set()
+        descricao = []
+        pilha = []
+
+        for evento, elemento in ET.iterparse(origem, events=('start', 'end')):
+            tag = elemento.tag.rsplit('}', 1)[-1]
+            if evento == 'start':
+                pilha.append(tag)
+                tags.add(tag)
+                continue
+
+            texto = (elemento.text or '').strip()
+            if texto and len(elemento) == 0:
+                if len(pilha) > 1:
+                    campos.setdefault(f'{pilha[-2]}/{tag}', texto)
+                campos.setdefault(tag, texto)
+                if tag in TAGS_DESCRICAO:
+                    descricao.append(texto)
+
+            pilha.pop()
+            elemento.clear()
+
+        return campos, tags, descricao
+
+    def _identificar_layout(self, tags):
+        if 'infNFe' in tags:
+            return 'NFE'
+        if 'infCte' in tags:
+            return 'CTE'
+        if tags & {'InfNfse', 'infNFSe', 'CompNfse', 'NFSe', 'infDPS'}:
+            return 'NFSE'
+        raise ValueError('XML não reconhecido como NF-e, CT-e ou NFS-e')
+
+    @staticmethod
+    def _primeiro(campos, chaves):
+        for chave in chaves:
+            if campos.get(chave):
+                return campos[chave]
+        return ""
+
+    def _valor(self, campos, chaves):
+        valor = self._primeiro(campos, chaves)
+        try:
+            return float(valor) if valor else 0.0
+        except ValueError:
+            return 0.0
+
+    @staticmethod
+    def _converter_data(valor):
+        """'2024-03-15T10:00:00-03:00' / '2024-03-15' -> '15/03/2024' (formato do extract())"""
+        if not valor:
+            return ""
+        try:
+            return datetime.strptime(valor[:10], '%Y-%m-%d').strftime('%d/%m/%Y')
+        except ValueError:
+            return ""
+
+    @staticmethod
+    def _normalizar_tomador(nome):
+        """Mesmos apelidos usados pelo extractor de PDF"""
+        nome_upper = nome.upper()
+        if 'CELPA' in nome_upper or 'CENTRAIS ELETRICAS' in nome_upper:
+            return 'CELPA'
+        elif 'EQUATORIAL' in nome_upper:
+            return 'EQUATORIAL'
+        elif 'CONECTA' in nome_upper:
+            return 'CONECTA'
+        return nome.strip()